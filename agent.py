@@ -1,5 +1,6 @@
 # agent.py - ChronoKen agent core (clean, robust, safe for missing SDK)
 import os
+import heapq
 import json
 import threading
 import time
@@ -34,24 +35,78 @@ except Exception:
     genai = None
     GENAI_AVAILABLE = False
 
+import llm_fake
+import llm_resilience
+import llm_schema
+import local_commands
+import metrics
+import model_router
+import semantic_cache
+import task_context
+import tracing
+
 # Tools (local)
-from tools import create_task, list_tasks, update_task_status, generate_plan, get_today_view
+from tools import list_tasks, generate_plan, get_today_view, search_tasks, apply_task_writes
 
 # Read config from env
 API_KEY = os.getenv("GOOGLE_API_KEY")
 MODEL_NAME = os.getenv("MODEL_NAME") or "models/gemini-2.5-pro"
+# Simple intents (commands, one-line task edits, small talk) go to this cheaper,
+# faster model; planning and anything ambiguous stay on MODEL_NAME. See model_router.py.
+MODEL_FAST_NAME = os.getenv("MODEL_FAST_NAME") or "models/gemini-2.5-flash"
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "1").lower() not in ("0", "false", "no")
+# Model backend. Anything with generate_content(prompt, request_options=..., **kwargs)
+# returning .text / .candidates / .usage_metadata works:
+#   gemini  google-generativeai (needs GOOGLE_API_KEY)
+#   fake    llm_fake.FakeModel, scripted/rule-based replies with simulated latency
+#           and errors, for offline load tests and profiling
+LLM_PROVIDER = (os.getenv("LLM_PROVIDER") or "gemini").lower()
+if LLM_PROVIDER not in ("gemini", "fake"):
+    print("AGENT: unknown LLM_PROVIDER", LLM_PROVIDER, "- using gemini")
+    LLM_PROVIDER = "gemini"
+# Chat replies list at most this many tasks / plan sessions ("...and K more");
+# the structured `tasks` / `plan` fields always carry everything for clients to page.
+REPLY_MAX_TASKS = int(os.getenv("REPLY_MAX_TASKS", "10"))
+REPLY_MAX_PLAN_ITEMS = int(os.getenv("REPLY_MAX_PLAN_ITEMS", "21"))
+# How the model is asked for its {action, params, assistant_message} reply:
+#   json   response_mime_type=application/json with a response schema (default)
+#   tools  native function calling, one declaration per action
+#   prose  JSON requested in the prompt text and cut out of the reply
+LLM_OUTPUT_MODE = (os.getenv("LLM_OUTPUT_MODE") or "json").lower()
+if LLM_OUTPUT_MODE not in ("json", "tools", "prose"):
+    print("AGENT: unknown LLM_OUTPUT_MODE", LLM_OUTPUT_MODE, "- using json")
+    LLM_OUTPUT_MODE = "json"
+
+
+def _make_model(name: str, tier: str):
+    if LLM_PROVIDER == "fake":
+        return llm_fake.FakeModel(name, tier=tier)
+    return genai.GenerativeModel(name)
+
 
 # Configure SDK if possible
 model = None
-if GENAI_AVAILABLE and API_KEY:
+if LLM_PROVIDER == "fake":
+    model = _make_model(MODEL_NAME, model_router.LARGE)
+    print("AGENT: using the fake LLM provider (llm_fake.py) for", MODEL_NAME)
+elif GENAI_AVAILABLE and API_KEY:
     try:
         genai.configure(api_key=API_KEY)
-        model = genai.GenerativeModel(MODEL_NAME)
+        model = _make_model(MODEL_NAME, model_router.LARGE)
         print("AGENT: GenAI initialized with model:", MODEL_NAME)
     except Exception as e:
         print("AGENT: GenAI configure/instantiate failed:", type(e).__name__, e)
         model = None
-else:
+
+fast_model = None
+if model is not None and MODEL_ROUTING and MODEL_FAST_NAME != MODEL_NAME:
+    try:
+        fast_model = _make_model(MODEL_FAST_NAME, model_router.FAST)
+        print("AGENT: fast tier model:", MODEL_FAST_NAME)
+    except Exception as e:
+        print("AGENT: fast tier disabled:", type(e).__name__, e)
+        fast_model = None
+elif model is None:
     if not GENAI_AVAILABLE:
         print("AGENT: google.generativeai SDK not installed.")
     if not API_KEY:
@@ -60,14 +115,17 @@ else:
 
 # Small caches used to reduce repeated LLM calls
 class LRUCache:
-    def __init__(self, capacity: int = 128):
+    def __init__(self, capacity: int = 128, name: Optional[str] = None):
         self.capacity = capacity
+        self.name = name
         self.data = OrderedDict()
 
     def get(self, key):
         v = self.data.get(key)
         if v is not None:
             self.data.move_to_end(key)
+        if self.name:
+            metrics.record_cache(self.name, v is not None)
         return v
 
     def set(self, key, value):
@@ -79,36 +137,56 @@ class LRUCache:
 
 
 class TTLCache:
-    def __init__(self, ttl: int = 300):
+    def __init__(self, ttl: int = 300, name: Optional[str] = None):
         self.ttl = ttl
+        # named caches report hits/misses to /metrics (cache_requests_total)
+        self.name = name
         self.store = {}
         self.lock = threading.Lock()
 
-    def get(self, key):
+    def peek(self, key):
+        """Like get() but not counted in the hit/miss metrics."""
         with self.lock:
             v = self.store.get(key)
-            if not v:
-                return None
-            value, exp = v
-            if time.time() > exp:
+            if v and time.time() > v[1]:
                 del self.store[key]
-                return None
-            return value
+                v = None
+        return v[0] if v else None
+
+    def get(self, key):
+        value = self.peek(key)
+        if self.name:
+            metrics.record_cache(self.name, value is not None)
+        return value
 
     def set(self, key, value, ttl: Optional[int] = None):
         with self.lock:
             exp = time.time() + (ttl if ttl is not None else self.ttl)
             self.store[key] = (value, exp)
 
+    def delete(self, key):
+        with self.lock:
+            self.store.pop(key, None)
 
-RESPONSE_CACHE = TTLCache(ttl=300)
-_CACHE = LRUCache(capacity=256)
+
+RESPONSE_CACHE = TTLCache(ttl=300, name='agent_response')
+# paraphrase hits for chat_only replies, scoped per user (see semantic_cache.py)
+SEMANTIC_CACHE = semantic_cache.SemanticCache()
+# only self-contained questions and small talk; commands, task edits, plans and
+# follow-ups that refer back into the conversation always reach the model
+SEMANTIC_ROUTES = ("small_talk", "unclassified")
+# open-task digest added to the prompt so task references resolve in one call
+# (see task_context.py); skipped where it can't help
+TASK_CONTEXT = task_context.TaskContext()
+TASK_CONTEXT_SKIP = ("small_talk", "command")
+_CACHE = LRUCache(capacity=256, name='agent_stream')
 
 
 def _history_to_key(user_message: str, history: List[Dict[str, str]]) -> str:
     import hashlib
     last = history[-6:] if history else []
-    s = user_message + "||" + "::".join(f"{t.get('user','')}->{t.get('assistant','')}" for t in last)
+    # replies depend on the task digest in the prompt, so a task write starts a fresh key
+    s = f"v{TASK_CONTEXT.version()}||" + user_message + "||" + "::".join(f"{t.get('user','')}->{t.get('assistant','')}" for t in last)
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
 
@@ -125,7 +203,7 @@ def _truncate_history_by_chars(history: List[Dict[str, str]], max_chars: int = 4
     return out
 
 
-SYSTEM_PROMPT = """
+ACTIONS_PROMPT = """
 You are a Smart Study & Productivity Concierge Agent for students.
 
 You have access to the following ACTIONS (these are not function calls, just logical actions):
@@ -144,7 +222,8 @@ You have access to the following ACTIONS (these are not function calls, just log
      - status (optional string: 'pending' | 'in_progress' | 'done')
 
 3. update_task_status
-   Use when the user marks a task as started/completed/etc.
+   Use when the user marks a task as started/completed/etc. If they name the
+   task instead of giving its id, take the id from the open-tasks list below.
    Parameters:
      - task_id (integer)
      - new_status (string: 'pending' | 'in_progress' | 'done')
@@ -155,30 +234,101 @@ You have access to the following ACTIONS (these are not function calls, just log
      - daily_hours (number, default 3)
      - num_days (integer, default 7)
 
-5. chat_only
+5. search_tasks
+   Use when the user wants to find specific tasks by words in their title or
+   details (e.g. "find my DBMS tasks").
+   Parameters:
+     - query (string: the keywords only, e.g. 'DBMS')
+     - status (optional string: 'pending' | 'in_progress' | 'done')
+     - limit (optional integer, default 10)
+     - offset (optional integer, default 0)
+
+6. chat_only
    Use when the user is just chatting, asking for motivation, or questions
    that do not require modifying tasks or generating a plan.
 
+A request may need several actions (e.g. "add my three exams and then show me a
+plan"). Return all of them, in order, in one reply: task changes are saved
+together and plans are generated after them.
+"""
+
+JSON_FORMAT_PROMPT = """
 IMPORTANT:
 - ALWAYS respond in VALID JSON ONLY.
 - NO extra text, no commentary outside JSON.
 - JSON format:
 
 {
-  "action": "create_task | list_tasks | update_task_status | generate_plan | chat_only",
+  "action": "create_task | list_tasks | update_task_status | generate_plan | search_tasks | chat_only",
   "params": { ... appropriate parameters ... },
   "assistant_message": "Natural language reply to the user."
 }
+
+For several actions, replace "action"/"params" with
+  "actions": [{"action": "...", "params": {...}}, ...]
 """
 
+SYSTEM_PROMPTS = {
+    "prose": ACTIONS_PROMPT + JSON_FORMAT_PROMPT,
+    "json": ACTIONS_PROMPT + "\nReply with one JSON object: the action and its params (or an ordered `actions` list) and assistant_message.\n",
+    "tools": ACTIONS_PROMPT + "\nAlways call the functions: one call per action, in order. Put your reply to the user in assistant_message.\n",
+}
+SYSTEM_PROMPT = SYSTEM_PROMPTS[LLM_OUTPUT_MODE]
+
 
+def _generate_kwargs(mode: str) -> Dict[str, Any]:
+    """Extra generate_content() arguments for structured output."""
+    if mode == "json":
+        return {"generation_config": {
+            "response_mime_type": "application/json",
+            "response_schema": llm_schema.response_schema(),
+        }}
+    if mode == "tools":
+        return {
+            "tools": [{"function_declarations": llm_schema.function_declarations()}],
+            "tool_config": {"function_calling_config": {"mode": "ANY"}},
+        }
+    return {}
+
+
+_GENERATE_KWARGS = _generate_kwargs(LLM_OUTPUT_MODE)
+
+# timeouts, retries, optional hedging and the circuit breaker (see llm_resilience.py);
+# one per tier so a struggling fast model doesn't trip the breaker for the large one
+LLM_CALLER = llm_resilience.ResilientCaller()
+LLM_CALLERS = {model_router.LARGE: LLM_CALLER, model_router.FAST: llm_resilience.ResilientCaller()}
+
+
+def _route(user_message: str, history: List[Dict[str, str]]):
+    """(tier, reason); falls back to the large tier when routing is off or no fast model exists."""
+    if not MODEL_ROUTING:
+        return model_router.LARGE, "routing_off"
+    tier, reason = model_router.classify(user_message, history)
+    if tier == model_router.FAST and fast_model is None:
+        return model_router.LARGE, reason
+    return tier, reason
+
+
+def _tier_model(tier: str):
+    if tier == model_router.FAST:
+        return fast_model, MODEL_FAST_NAME
+    return model, MODEL_NAME
+
+
+@tracing.traced("agent.call_llm")
 def _call_llm(user_message: str, history: List[Dict[str, str]]) -> Dict[str, Any]:
     # prepare prompt
-    history_trunc = _truncate_history_by_chars(history, max_chars=4000)
-    conv = ""
-    for turn in history_trunc:
-        conv += f"User: {turn['user']}\nAssistant: {turn['assistant']}\n"
-    prompt = SYSTEM_PROMPT + "\n\n" + conv + f"User: {user_message}\nAssistant:"
+    with tracing.span("llm.build_prompt", history_turns=len(history or [])) as sp:
+        history_trunc = _truncate_history_by_chars(history, max_chars=4000)
+        conv = ""
+        for turn in history_trunc:
+            conv += f"User: {turn['user']}\nAssistant: {turn['assistant']}\n"
+        digest = ""
+        if model_router.classify(user_message, history)[1] not in TASK_CONTEXT_SKIP:
+            digest = TASK_CONTEXT.get()
+        prompt = SYSTEM_PROMPT + "\n\n" + (digest + "\n\n" if digest else "") + conv + f"User: {user_message}\nAssistant:"
+        if sp:
+            sp.set(kept_turns=len(history_trunc or []), prompt_chars=len(prompt), task_context_chars=len(digest))
 
     # If GenAI not available, return helpful fallback
     if model is None:
@@ -188,30 +338,107 @@ def _call_llm(user_message: str, history: List[Dict[str, str]]) -> Dict[str, Any
         if not API_KEY:
             reasons.append("GOOGLE_API_KEY not set in .env or environment")
         reason_text = "; ".join(reasons) if reasons else "GenAI client not available"
-        return {
-            "action": "chat_only",
-            "params": {},
-            "assistant_message": (
-                f"LLM unavailable: {reason_text}\n\n"
-                "You can still use me with explicit commands like:\n"
-                "- add task: title=DBMS assignment, deadline=2025-11-25, hours=3, priority=high\n"
-                "- list tasks\n"
-                "- plan: daily_hours=2 num_days=3\n"
-            ),
-        }
+        metrics.LLM_REQUESTS.inc(action="none", outcome="unavailable")
+        return _local_fallback(user_message, "unavailable", f"LLM unavailable: {reason_text}")
+
+    tier, reason = _route(user_message, history)
+    metrics.LLM_ROUTES.inc(tier=tier, reason=reason)
+    tracing.annotate(tier=tier, route=reason)
+    data, failure, error = _generate_and_parse(prompt, tier)
+    if failure and tier == model_router.FAST:
+        # the cheap model couldn't produce a usable reply: spend the big one rather than fail
+        metrics.LLM_ROUTES.inc(tier=model_router.LARGE, reason="escalated")
+        data, failure, error = _generate_and_parse(prompt, model_router.LARGE)
+    if data is None:
+        if failure == "circuit_open":
+            return _local_fallback(user_message, failure, "The assistant model is temporarily unavailable.")
+        return _local_fallback(user_message, failure, f"LLM request failed: {error}")
+    if failure:
+        # 'unparsed' / 'invalid': the model may do better on the next identical message
+        data["parse_failure"] = failure
+    return data
 
-    try:
+
+def _generate_and_parse(prompt: str, tier: str):
+    """
+    One resilient model call on `tier` -> (data, failure, error).
+
+    data is None when the call itself failed (failure is 'timeout', 'error' or
+    'circuit_open'); otherwise failure is None, 'unparsed' or 'invalid'.
+    """
+    tier_model, model_name = _tier_model(tier)
+
+    def generate(timeout):
         # Use the high-level model object (works with google-generativeai)
-        resp = model.generate_content(prompt)
-        raw = getattr(resp, "text", None) or str(resp)
-        raw = raw.strip()
+        return tier_model.generate_content(prompt, request_options={"timeout": timeout}, **_GENERATE_KWARGS)
+
+    t0 = time.perf_counter()
+    try:
+        with tracing.span("llm.generate_content", model=model_name, tier=tier, mode=LLM_OUTPUT_MODE):
+            resp = LLM_CALLERS[tier](generate)
+    except llm_resilience.CircuitOpen as e:
+        metrics.LLM_REQUESTS.inc(action="none", outcome="circuit_open")
+        return None, "circuit_open", e
     except Exception as e:
-        return {
-            "action": "chat_only",
-            "params": {},
-            "assistant_message": f"LLM request failed: {e}\n\nYou can still use explicit commands (add/list/plan).",
+        outcome = "timeout" if isinstance(e, llm_resilience.LLMTimeout) else "error"
+        seconds = time.perf_counter() - t0
+        metrics.LLM_LATENCY.observe(seconds, action="none")
+        metrics.LLM_TIER_LATENCY.observe(seconds, tier=tier, outcome=outcome)
+        metrics.LLM_REQUESTS.inc(action="none", outcome=outcome)
+        return None, outcome, e
+
+    with tracing.span("llm.parse", mode=LLM_OUTPUT_MODE) as sp:
+        data, failure = _parse_reply(resp, LLM_OUTPUT_MODE)
+        if sp and failure:
+            sp.set(parse_failure=failure)
+    seconds = time.perf_counter() - t0
+    if failure:
+        # the round-trip produced nothing we can act on
+        metrics.LLM_PARSE_FAILURES.inc(mode=LLM_OUTPUT_MODE, reason=failure)
+        metrics.LLM_WASTED_SECONDS.inc(seconds, mode=LLM_OUTPUT_MODE)
+    metrics.LLM_TIER_LATENCY.observe(seconds, tier=tier, outcome=failure or "ok")
+    _record_llm_call(resp, data["action"], seconds, failure or "ok", tier)
+    return data, failure, None
+
+
+def _local_fallback(user_message: str, reason: str, headline: str) -> Dict[str, Any]:
+    """Answer from local_commands when the model can't be used; help text if it isn't a command."""
+    step = local_commands.parse_command(user_message)
+    metrics.LLM_FALLBACKS.inc(reason=reason, matched="yes" if step else "no")
+    if step is None:
+        reply = _chat_reply(f"{headline}\n\n{local_commands.HELP_TEXT}")
+    else:
+        reply = {
+            "action": step["action"],
+            "params": step["params"],
+            "actions": [step],
+            "assistant_message": "(The assistant model is unavailable; handled as a command.)",
         }
+    # not cached: the model may be back for the next identical message
+    reply["fallback"] = reason
+    return reply
+
+
+def _response_text(resp: Any) -> str:
+    try:
+        return (getattr(resp, "text", None) or "").strip()
+    except (ValueError, AttributeError):
+        # .text raises when the candidate holds only function calls or was blocked
+        return ""
+
+
+def _function_calls(resp: Any) -> List[tuple]:
+    """[(name, args)] for every function call in the reply, in order."""
+    calls = []
+    for cand in (getattr(resp, "candidates", None) or [])[:1]:
+        for part in getattr(getattr(cand, "content", None), "parts", None) or []:
+            fc = getattr(part, "function_call", None)
+            if fc is not None and getattr(fc, "name", ""):
+                calls.append((fc.name, dict(fc.args or {})))
+    return calls
+
 
+def _extract_json(raw: str) -> Optional[Dict[str, Any]]:
     # If model returns fenced JSON, remove fences
     if raw.startswith("```"):
         raw = raw.strip("`")
@@ -221,98 +448,287 @@ def _call_llm(user_message: str, history: List[Dict[str, str]]) -> Dict[str, Any
     # Try to extract JSON blob
     start = raw.find("{")
     end = raw.rfind("}")
-    json_str = raw[start:end + 1] if start != -1 and end != -1 else ""
-
+    if start == -1 or end == -1:
+        return None
     try:
-        data = json.loads(json_str) if json_str else {"action": "chat_only", "params": {}, "assistant_message": raw}
+        data = json.loads(raw[start:end + 1])
     except (json.JSONDecodeError, ValueError):
-        data = {"action": "chat_only", "params": {}, "assistant_message": raw}
+        return None
+    return data if isinstance(data, dict) else None
 
-    data.setdefault("action", "chat_only")
-    data.setdefault("params", {})
-    data.setdefault("assistant_message", "")
-    return data
 
+def _parse_reply(resp: Any, mode: str):
+    """
+    The model reply as {action, params, actions, assistant_message}, plus a
+    failure reason ('unparsed' or 'invalid') when it can't be acted on.
 
-def handle_user_message(user_message: str, history: List[Dict[str, str]]) -> str:
+    `actions` is the ordered list of {action, params} steps (one for simple
+    requests); `action` is that step's name or "batch" for several. Failed
+    replies come back as chat_only so nothing runs on bad params.
+    """
+    if mode == "tools":
+        calls = _function_calls(resp)
+        if not calls:
+            text = _response_text(resp) or "Sorry, I didn't catch that. Could you rephrase?"
+            return _chat_reply(text), "unparsed"
+        # parallel calls usually repeat the reply text; keep each distinct one once
+        texts = [str(args.pop("assistant_message", "") or "") for _, args in calls]
+        message = " ".join(dict.fromkeys(t for t in texts if t))
+        steps = [{"action": name, "params": args} for name, args in calls]
+    else:
+        raw = _response_text(resp)
+        data = _extract_json(raw)
+        if data is None:
+            return _chat_reply(raw), "unparsed"
+        message = str(data.get("assistant_message") or "")
+        steps = data.get("actions")
+        if not steps:
+            steps = [{"action": data.get("action") or "chat_only", "params": data.get("params") or {}}]
+
+    steps, errors = llm_schema.check_actions(steps)
+    if errors:
+        what = steps[0]["action"].replace("_", " ") if len(steps) == 1 else "that"
+        reply = _chat_reply(f"{message}\n\n[I couldn't run {what}: {errors[0]}. Please rephrase with the details.]".strip())
+        reply["validation_errors"] = errors
+        return reply, "invalid"
+    first = steps[0]
+    return {
+        "action": first["action"] if len(steps) == 1 else "batch",
+        "params": first["params"] if len(steps) == 1 else {},
+        "actions": steps,
+        "assistant_message": message,
+    }, None
+
+
+def _chat_reply(text: str) -> Dict[str, Any]:
+    return {"action": "chat_only", "params": {}, "actions": [], "assistant_message": text}
+
+
+def _record_llm_call(resp: Any, action: Any, seconds: float, outcome: str, tier: str = model_router.LARGE) -> None:
+    action = action if isinstance(action, str) and action.isidentifier() else "other"
+    metrics.LLM_LATENCY.observe(seconds, action=action)
+    metrics.LLM_REQUESTS.inc(action=action, outcome=outcome)
+    usage = getattr(resp, "usage_metadata", None)
+    for kind, attr in (("prompt", "prompt_token_count"), ("completion", "candidates_token_count")):
+        n = getattr(usage, attr, None) if usage is not None else None
+        if isinstance(n, int) and n > 0:
+            metrics.LLM_TOKENS.inc(n, action=action, kind=kind, tier=tier)
+
+
+def _semantic_scope(user_message: str, history: List[Dict[str, str]], user: Optional[str]) -> Optional[str]:
+    """The semantic-cache scope for this message, or None when the cache must not be used."""
+    if user is None or not SEMANTIC_CACHE.enabled:
+        return None
+    # a follow-up ("what about tomorrow?") means something different in every conversation
+    if history:
+        return None
+    reason = model_router.classify(user_message, history)[1]
+    if reason not in SEMANTIC_ROUTES:
+        return None
+    # a reply written with the task digest only holds for that version of the task list
+    return user if reason in TASK_CONTEXT_SKIP else f"{user}|v{TASK_CONTEXT.version()}"
+
+
+def needs_llm(user_message: str, history: List[Dict[str, str]], user: Optional[str] = None) -> bool:
+    """True when process_user_message would call the model (configured and no cached reply).
+
+    Lets callers charge rate limits to the right bucket before doing the work.
+    """
+    if model is None:
+        return False
+    if not LLM_CALLERS[_route(user_message, history)[0]].breaker.would_allow():
+        return False
+    if RESPONSE_CACHE.peek(_history_to_key(user_message, history)) is not None:
+        return False
+    scope = _semantic_scope(user_message, history, user)
+    return scope is None or SEMANTIC_CACHE.peek(scope, user_message) is None
+
+
+def handle_user_message(user_message: str, history: List[Dict[str, str]], user: Optional[str] = None) -> str:
     # Delegate to structured processor and return assistant_message for backward compatibility
-    res = process_user_message(user_message, history)
+    res = process_user_message(user_message, history, user=user)
     return res.get('assistant_message', '')
 
 
-def process_user_message(user_message: str, history: List[Dict[str, str]]) -> Dict[str, Any]:
+WRITE_ACTIONS = ("create_task", "update_task_status")
+
+
+def _run_actions(steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Execute an ordered list of {action, params} steps from one model reply.
+
+    Task writes run first, together in one transaction; reads run next and
+    see those writes; generate_plan runs last so the plan includes new tasks.
+    Results come back in the steps' order as {action, params, ...output}.
+    """
+    results = [{"action": st["action"], "params": st.get("params") or {}} for st in steps]
+    writes = [i for i, st in enumerate(steps) if st["action"] in WRITE_ACTIONS]
+    if writes:
+        with tracing.span("agent.action", action="task_writes", count=len(writes)):
+            outcomes = apply_task_writes([steps[i] for i in writes])
+        for i, out in zip(writes, outcomes):
+            results[i]["task" if steps[i]["action"] == "create_task" else "updated"] = out
+
+    reads = [i for i, st in enumerate(steps) if st["action"] not in WRITE_ACTIONS]
+    reads.sort(key=lambda i: steps[i]["action"] == "generate_plan")
+    for i in reads:
+        with tracing.span("agent.action", action=str(steps[i]["action"])):
+            results[i].update(_run_read(steps[i]["action"], results[i]["params"]))
+    return results
+
+
+def _run_read(action: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    if action == "list_tasks":
+        return {"tasks": list_tasks(status=params.get("status"))}
+    if action == "search_tasks":
+        return search_tasks(
+            query=params.get("query", ""),
+            limit=params.get("limit", 10),
+            offset=params.get("offset", 0),
+            status=params.get("status"),
+        )
+    if action == "generate_plan":
+        return {"plan": generate_plan(daily_hours=params.get("daily_hours", 3), num_days=params.get("num_days", 7))}
+    return {}
+
+
+def _task_lines(tasks: List[Dict[str, Any]], line, limit: int) -> List[str]:
+    """`line(task)` for at most `limit` tasks, the most urgent ones when cut, plus an "and K more" note."""
+    if len(tasks) <= limit:
+        return [line(t) for t in tasks]
+    lines = [line(t) for t in heapq.nsmallest(limit, tasks, key=task_context.urgency)]
+    lines.append(f"…and {len(tasks) - limit} more (showing the {limit} most urgent).")
+    return lines
+
+
+def _plan_lines(plan: Dict[str, List[Dict[str, Any]]], limit: int) -> List[str]:
+    """The plan day by day, stopping after `limit` sessions (empty days count as one)."""
+    lines: List[str] = []
+    shown = 0
+    rest_sessions = rest_days = 0
+    for date, slots in plan.items():
+        if shown >= limit:
+            if slots:
+                rest_sessions += len(slots)
+                rest_days += 1
+            continue
+        lines.append(f"\n📅 {date}")
+        if not slots:
+            lines.append("  - No tasks scheduled.")
+            shown += 1
+            continue
+        take = slots[:limit - shown]
+        lines.extend(f"  - {s['title']} ({s['hours']} hours) [Task ID {s['task_id']}]" for s in take)
+        shown += len(take)
+        if len(take) < len(slots):
+            rest_sessions += len(slots) - len(take)
+            rest_days += 1
+    if rest_sessions:
+        lines.append(f"\n…and {rest_sessions} more sessions on {rest_days} more day{'s' if rest_days != 1 else ''}.")
+    return lines
+
+
+def _describe_result(res: Dict[str, Any]) -> str:
+    """
+    The text appended to the assistant message for one executed action.
+
+    Lists and plans are cut at REPLY_MAX_TASKS / REPLY_MAX_PLAN_ITEMS entries so
+    the reply (and what is cached and streamed) stays small; the full data is in
+    the structured `tasks` / `plan` fields.
+    """
+    action = res["action"]
+    if action == "create_task":
+        return f"\n\n[Task created with ID {res['task']['id']}]"
+
+    if action == "list_tasks":
+        tasks = res["tasks"]
+        if not tasks:
+            return "\n\nYou currently have no tasks matching that filter."
+        lines = _task_lines(tasks, lambda t: (
+            f"- ID {t['id']}: {t['title']} "
+            f"(deadline: {t['deadline']}, "
+            f"hours: {t['estimated_hours']}, "
+            f"priority: {t['priority']}, "
+            f"status: {t['status']})"
+        ), REPLY_MAX_TASKS)
+        return "\n\nHere are your tasks:\n" + "\n".join(lines) + "\n"
+
+    if action == "search_tasks":
+        tasks = res["tasks"]
+        if not tasks:
+            return "\n\nI couldn't find any tasks matching that search."
+        lines = _task_lines(tasks, lambda t: (
+            f"- ID {t['id']}: {t['title']} (deadline: {t['deadline']}, status: {t['status']})"
+        ), REPLY_MAX_TASKS)
+        if res["has_more"]:
+            lines.append("(more results available)")
+        return "\n\nMatching tasks:\n" + "\n".join(lines) + "\n"
+
+    if action == "update_task_status":
+        if res["updated"]:
+            return "\n\n[Task status updated successfully.]"
+        return "\n\n[I couldn’t find that task ID. Please check and try again.]"
+
+    if action == "generate_plan":
+        return "\n\nHere’s your study plan:\n" + "\n".join(_plan_lines(res["plan"], REPLY_MAX_PLAN_ITEMS)) + "\n"
+    return ""
+
+
+@tracing.traced("agent.process_user_message")
+def process_user_message(user_message: str, history: List[Dict[str, str]], user: Optional[str] = None) -> Dict[str, Any]:
     """Process a user message and return a structured result:
     { action, params, assistant_message, plan? }
     This executes actions (create_task, update_task_status, generate_plan) like
     `handle_user_message` used to, but returns structured data useful for APIs.
+    When the model returns several actions, `action` is "batch" and
+    `results` holds one {action, params, ...output} entry per step.
+    `user` scopes the semantic cache; without it only exact repeats are cached.
     """
     key = _history_to_key(user_message, history)
     cached = RESPONSE_CACHE.get(key)
+    tracing.annotate(cache_hit=cached is not None)
     if cached is not None:
         return {"action": "chat_only", "params": {}, "assistant_message": cached}
+    scope = _semantic_scope(user_message, history, user)
+    if scope is not None:
+        similar = SEMANTIC_CACHE.get(scope, user_message)
+        tracing.annotate(semantic_hit=similar is not None)
+        if similar is not None:
+            return {"action": "chat_only", "params": {}, "assistant_message": similar, "cached": "semantic"}
 
     llm_output = _call_llm(user_message, history)
     action = llm_output.get("action", "chat_only")
     params = llm_output.get("params", {}) or {}
     assistant_message = llm_output.get("assistant_message", "")
+    steps = llm_output.get("actions")
+    if steps is None:
+        steps = [{"action": action, "params": params}]
+    steps = [st for st in steps if st.get("action") != "chat_only"]
 
     structured = {"action": action, "params": params, "assistant_message": assistant_message}
-
-    if action == "create_task":
-        task = create_task(
-            title=params.get("title", "Untitled task"),
-            deadline=params.get("deadline", "2099-12-31"),
-            estimated_hours=params.get("estimated_hours", 1),
-            priority=params.get("priority", "medium"),
-        )
-        structured["task"] = task
-        structured["assistant_message"] += f"\n\n[Task created with ID {task['id']}]"
-
-    elif action == "list_tasks":
-        tasks = list_tasks(status=params.get("status"))
-        structured["tasks"] = tasks
-        if not tasks:
-            structured["assistant_message"] += "\n\nYou currently have no tasks matching that filter."
-        else:
-            structured["assistant_message"] += "\n\nHere are your tasks:\n"
-            for t in tasks:
-                structured["assistant_message"] += (
-                    f"- ID {t['id']}: {t['title']} "
-                    f"(deadline: {t['deadline']}, "
-                    f"hours: {t['estimated_hours']}, "
-                    f"priority: {t['priority']}, "
-                    f"status: {t['status']})\n"
-                )
-
-    elif action == "update_task_status":
-        ok = update_task_status(
-            task_id=params.get("task_id"),
-            new_status=params.get("new_status", "pending"),
-        )
-        structured["updated"] = ok
-        if ok:
-            structured["assistant_message"] += "\n\n[Task status updated successfully.]"
-        else:
-            structured["assistant_message"] += "\n\n[I couldn’t find that task ID. Please check and try again.]"
-
-    elif action == "generate_plan":
-        daily_hours = params.get("daily_hours", 3)
-        num_days = params.get("num_days", 7)
-        plan = generate_plan(daily_hours=daily_hours, num_days=num_days)
-        structured["plan"] = plan
-
-        structured["assistant_message"] += "\n\nHere’s your study plan:\n"
-        for date, slots in plan.items():
-            structured["assistant_message"] += f"\n📅 {date}\n"
-            if not slots:
-                structured["assistant_message"] += "  - No tasks scheduled.\n"
-                continue
-            for s in slots:
-                structured["assistant_message"] += f"  - {s['title']} ({s['hours']} hours) [Task ID {s['task_id']}]\n"
-
-    # cache reply text for performance
+    if llm_output.get("fallback"):
+        structured["fallback"] = llm_output["fallback"]
+    if llm_output.get("validation_errors"):
+        structured["validation_errors"] = llm_output["validation_errors"]
+
+    results = _run_actions(steps)
+    if results:
+        structured["assistant_message"] = assistant_message + "".join(_describe_result(res) for res in results)
+    if len(results) == 1:
+        # single action: keep the flat shape (task / tasks / plan / updated) callers already read
+        structured.update({k: v for k, v in results[0].items() if k not in ("action", "params")})
+    elif results:
+        structured["results"] = results
+
+    # cache reply text for performance; never a fallback or a reply the model got wrong
+    cacheable = not structured.get("fallback") and not structured.get("validation_errors") \
+        and llm_output.get("parse_failure") is None
     try:
-        RESPONSE_CACHE.set(key, structured.get('assistant_message', ''))
+        if cacheable:
+            RESPONSE_CACHE.set(key, structured.get('assistant_message', ''))
+        # paraphrase cache: plain chat replies only, never anything that ran an action
+        if cacheable and scope is not None and action == "chat_only" and not steps:
+            SEMANTIC_CACHE.put(scope, user_message, structured["assistant_message"])
     except Exception:
         pass
 
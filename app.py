@@ -4,11 +4,23 @@ from flask import request, jsonify, session, g
 from pathlib import Path
 from dotenv import load_dotenv
 from tools import create_task, list_tasks, update_task_status, generate_plan
+from storage import get_tasks_version, start_archive_compactor
+import appdb
+from serialization import init_flask
+import static_assets
+import avatars
+import uilog
+import ratelimit
+import metrics
+import tracing
+import wsmanager
 import json
+import hashlib
 from flask import request
 import sqlite3
 import time
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask import send_file, abort
 from google_auth_oauthlib.flow import Flow
 from google.oauth2.credentials import Credentials
@@ -27,36 +39,49 @@ else:
     load_dotenv(override=True)
 
 # Import agent AFTER env loaded
-from agent import handle_user_message
+from agent import handle_user_message, needs_llm, TTLCache
 
 # Create Flask app with an absolute static folder path so the server
 # serves the frontend regardless of current working directory.
 app = Flask(
     "chronoken_api",
-    static_folder=str(project_root / "web"),
+    static_folder=str(static_assets.static_root(project_root / "web")),
     static_url_path="",
 )
 # Allow cookies for same-origin sessions in dev; client should use same origin.
 CORS(app, supports_credentials=True)
+# orjson-backed jsonify (stdlib fallback) + gzip/brotli for large JSON bodies
+init_flask(app)
+# precompressed .br/.gz variants + immutable caching for fingerprinted web/dist files
+static_assets.init_flask(app)
+# per-route latency / in-flight gauges for /metrics
+metrics.init_flask(app)
+# root span per request when TRACE_EXPORT is set (see tracing.py)
+tracing.init_flask(app)
 
 # Secret key for session cookies (use .env SECRET_KEY in production)
 import os
 app.secret_key = os.environ.get("SECRET_KEY") or "dev-secret-chronoken"
+# hard cap on any request body, chunked uploads included (an avatar plus multipart overhead)
+app.config['MAX_CONTENT_LENGTH'] = avatars.AVATAR_MAX_BYTES + 64 * 1024
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    return jsonify({'error':'file_too_large', 'max_bytes': avatars.AVATAR_MAX_BYTES}), 413
 # ==== Print Registered Routes (for debugging) ====
 print("\n=== Registered Flask Routes ===")
 for rule in app.url_map.iter_rules():
     print(f"{list(rule.methods)} -> {rule.rule}")
 print("=== END Routes ===\n")
 # ===================================================
-from flask import send_from_directory
 
-# Serve index page using the absolute `web` directory next to this file.
-WEB_DIR = project_root / "web"
+# Serve index page from the built web/dist when present, else the raw `web` directory.
+WEB_DIR = Path(app.static_folder)
 
 @app.route("/", methods=["GET"])
 def index():
     try:
-        return send_from_directory(str(WEB_DIR), "index.html")
+        return static_assets.send_flask(WEB_DIR, "index.html")
     except Exception:
         # fallback minimal page while you debug frontend
         return "<h1>ChronoKen</h1><p>Server running. No frontend found in /web.</p>"
@@ -67,6 +92,31 @@ def health():
     mlow = user_message.strip().lower()
     # list tasks
     return jsonify({"status": "ok", "service": "ChronoKen"}), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    # Prometheus scrape target (see metrics.py); includes the FastAPI side when served via asgi.py
+    return app.response_class(metrics.REGISTRY.render(), mimetype=None, content_type=metrics.CONTENT_TYPE)
+
+
+def _client_ident():
+    """Rate-limit and semantic-cache key: the signed-in user, else the client address."""
+    return session.get('user_email') or ('ip:' + (request.remote_addr or 'unknown'))
+
+
+def _rate_limited(message, history):
+    """Charge the caller's 'llm' or 'local' bucket; a 429 response when it is empty, else None."""
+    ident = _client_ident()
+    bucket = 'llm' if needs_llm(message, history, ident) else 'local'
+    allowed, retry_after = ratelimit.LIMITER.take(bucket, ident)
+    if allowed:
+        return None
+    resp = jsonify({'error': 'rate_limited', 'bucket': bucket, 'retry_after': retry_after})
+    resp.headers['Retry-After'] = str(retry_after)
+    return resp, 429
+
+
 @app.route("/api/message", methods=["POST"])
 def api_message():
     """Unified API proxy endpoint for the agent.
@@ -87,9 +137,12 @@ def api_message():
 
     if not user_message:
         return jsonify({"error": "missing message body (expected 'message'|'text'|'user')"}), 400
+    limited = _rate_limited(user_message, history)
+    if limited:
+        return limited
 
     try:
-        reply = handle_user_message(user_message, history)
+        reply = handle_user_message(user_message, history, user=_client_ident())
     except Exception as e:
         return jsonify({"error": "agent failed", "detail": str(e)}), 500
 
@@ -108,10 +161,13 @@ def api_chat():
     history = data.get('history') or []
     if not user_message:
         return jsonify({'error':'missing message'}), 400
+    limited = _rate_limited(user_message, history)
+    if limited:
+        return limited
     try:
         # Use the new structured processor in agent.py
         from agent import process_user_message
-        res = process_user_message(user_message, history)
+        res = process_user_message(user_message, history, user=_client_ident())
         # Keep backward-compatibility: include `reply` key for clients expecting it
         out = dict(res)
         if 'assistant_message' in res and 'reply' not in res:
@@ -122,49 +178,58 @@ def api_chat():
         return jsonify({'error':'agent failed', 'detail': str(e)}), 500
 
 
-# ---- Simple tasks storage API (file-backed) ----
-DATA_DIR = project_root / 'data'
-DATA_DIR.mkdir(exist_ok=True)
-DB_PATH = DATA_DIR / 'chronoken.db'
+# ---- Simple tasks storage API (SQLite, see appdb.py) ----
+DATA_DIR = appdb.DATA_DIR
+DB_PATH = appdb.DB_PATH
 
 def get_db():
+    # borrowed from the process-wide pool (shared with web/server.py when both run in asgi.py)
     if 'db' not in g:
-        g.db = sqlite3.connect(str(DB_PATH), detect_types=sqlite3.PARSE_DECLTYPES)
-        g.db.row_factory = sqlite3.Row
+        g.db = metrics.timed_connection(appdb.get_pool().acquire(), 'app')
     return g.db
 
-@app.teardown_appcontext
-def close_db(e=None):
+def release_db():
+    """Hand this request's connection back early, before slow external I/O (get_db() re-borrows)."""
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        appdb.get_pool().release(db.raw)
+
+@app.teardown_appcontext
+def close_db(e=None):
+    release_db()
+
+@app.errorhandler(appdb.PoolExhausted)
+def db_pool_exhausted(e):
+    # appdb.ConnectionPool.acquire gave up waiting: busy, not broken
+    return jsonify({'error': 'busy', 'detail': str(e)}), 503, {'Retry-After': '1'}
 
 def init_db():
-    db = get_db()
-    with db:
-        db.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY,
-                email TEXT UNIQUE NOT NULL,
-                name TEXT,
-                password_hash TEXT,
-                avatar TEXT,
-                calendar_tokens TEXT,
-                created_at INTEGER
-            )
-        ''')
-        db.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY,
-                user_email TEXT NOT NULL,
-                title TEXT,
-                detail TEXT,
-                priority TEXT,
-                hours REAL,
-                status TEXT,
-                created_at INTEGER
-            )
-        ''')
+    appdb.init_schema(get_db())
+
+
+def _resource_version(user_email, resource):
+    """Return the current version counter for `resource` ('tasks' | 'profile')."""
+    return appdb.resource_version(get_db(), user_email, resource)
+
+
+def _make_etag(*parts):
+    return hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()[:24]
+
+
+def _conditional_json(etag, build):
+    """Answer 304 when the client already holds `etag`, otherwise jsonify(build()).
+
+    `build` is only called on a miss, so unchanged resources skip both the
+    query and the JSON encoding.
+    """
+    if request.if_none_match.contains_weak(etag):
+        resp = app.response_class(status=304)
+    else:
+        resp = jsonify(build())
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    resp.vary.add('Cookie')
+    return resp
 
 def migrate_from_json():
     # If JSON files exist from previous demo, import their contents once
@@ -195,7 +260,11 @@ def serve_avatar(filename):
     file_path = AVATAR_DIR / safe
     if not file_path.exists():
         abort(404)
-    return send_file(str(file_path))
+    hashed = avatars.is_hashed(safe)
+    # content-hashed names never change content: the digest is the ETag and clients may cache forever
+    resp = send_file(str(file_path), conditional=True, etag=Path(safe).stem if hashed else True)
+    resp.headers['Cache-Control'] = static_assets.IMMUTABLE_CACHE if hashed else static_assets.REVALIDATE_CACHE
+    return resp
 
 # Initialize DB and migrate any existing JSON data into SQLite
 with app.app_context():
@@ -225,19 +294,52 @@ with app.app_context():
             except Exception:
                 pass
 
+
 from werkzeug.security import generate_password_hash, check_password_hash
 
+# Columns needed for auth/profile; calendar_tokens is only read where it's used.
+USER_COLUMNS = 'id, email, name, password_hash, avatar, created_at'
+
+# Short-TTL per-process cache of user rows, invalidated on profile/avatar/token writes.
+USER_CACHE = TTLCache(ttl=int(os.environ.get('USER_CACHE_TTL', '30')), name='user')
+
+
+def _normalize_email(email):
+    return (email or '').strip().lower()
+
+
 def _find_user_by_email(email):
+    email = _normalize_email(email)
     if not email:
         return None
-    db = get_db()
-    row = db.execute('SELECT * FROM users WHERE LOWER(email)=LOWER(?)', (email,)).fetchone()
-    return dict(row) if row else None
+    # per-request memo first, then the process cache, then one indexed lookup
+    memo = g.setdefault('users_by_email', {})
+    user = memo.get(email) or USER_CACHE.get(email)
+    if user is None:
+        db = get_db()
+        row = db.execute(f'SELECT {USER_COLUMNS} FROM users WHERE email = ? COLLATE NOCASE', (email,)).fetchone()
+        if not row:
+            return None
+        user = dict(row)
+        USER_CACHE.set(email, user)
+    memo[email] = user
+    # hand out a copy so callers can't mutate the cached row
+    return dict(user)
+
+
+def _invalidate_user(email):
+    email = _normalize_email(email)
+    USER_CACHE.delete(email)
+    g.get('users_by_email', {}).pop(email, None)
 
 def _user_public(u):
     if not u:
         return None
     out = {k: v for k, v in u.items() if k != 'password_hash'}
+    a = out.get('avatar')
+    if a and not a.startswith('http') and not a.startswith('/avatars'):
+        # {size: url} so clients can pick a thumbnail instead of the largest file
+        out['avatar_urls'] = avatars.avatar_urls(a)
     return out
 
 # Google OAuth config (require these in .env)
@@ -286,17 +388,16 @@ def _save_calendar_tokens_for_user(email, creds: Credentials):
     }
     db = get_db()
     with db:
-        db.execute('UPDATE users SET calendar_tokens = ? WHERE LOWER(email)=LOWER(?)', (json.dumps(data), email))
+        db.execute('UPDATE users SET calendar_tokens = ? WHERE email = ? COLLATE NOCASE', (json.dumps(data), _normalize_email(email)))
+    _invalidate_user(email)
     return True
 
 
 def _load_calendar_credentials_for_user(email):
     if not email:
         return None
-    u = _find_user_by_email(email)
-    if not u:
-        return None
-    tok = u.get('calendar_tokens')
+    row = get_db().execute('SELECT calendar_tokens FROM users WHERE email = ? COLLATE NOCASE', (_normalize_email(email),)).fetchone()
+    tok = row['calendar_tokens'] if row else None
     if not tok:
         return None
     try:
@@ -330,8 +431,8 @@ def api_signup():
     try:
         with db:
             db.execute('INSERT INTO users (email,name,password_hash,avatar,created_at) VALUES (?,?,?,?,?)', (email, name or email.split('@')[0], pwd_hash, None, created_at))
-            row = db.execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
-            user = dict(row) if row else None
+        _invalidate_user(email)
+        user = _find_user_by_email(email)
     except sqlite3.IntegrityError:
         return jsonify({'error':'user_exists'}), 409
     except Exception as e:
@@ -400,15 +501,20 @@ def api_me():
     email = session.get('user_email')
     if not email:
         return jsonify({'user': None}), 200
-    user = _find_user_by_email(email)
-    # If avatar is stored as a filename, turn into a URL
-    u = _user_public(user)
-    if u and u.get('avatar'):
-        a = u.get('avatar')
-        # if it's already a full URL, leave it; otherwise prefix with /avatars/
-        if not a.startswith('http') and not a.startswith('/avatars'):
-            u['avatar'] = '/avatars/' + a
-    return jsonify({'user': u})
+
+    def build():
+        user = _find_user_by_email(email)
+        # If avatar is stored as a filename, turn into a URL
+        u = _user_public(user)
+        if u and u.get('avatar'):
+            a = u.get('avatar')
+            # if it's already a full URL, leave it; otherwise prefix with /avatars/
+            if not a.startswith('http') and not a.startswith('/avatars'):
+                u['avatar'] = '/avatars/' + a
+        return {'user': u}
+
+    etag = _make_etag('me', email, _resource_version(email, 'profile'))
+    return _conditional_json(etag, build)
 
 
 @app.route('/api/avatar', methods=['POST'])
@@ -417,57 +523,59 @@ def api_avatar():
     email = session.get('user_email')
     if not email:
         return jsonify({'error':'not_authenticated'}), 401
+    # bodies over MAX_CONTENT_LENGTH (with or without Content-Length) end in request_too_large's 413
     if 'avatar' not in request.files:
         return jsonify({'error':'missing_file'}), 400
     f = request.files['avatar']
     if f.filename == '':
         return jsonify({'error':'empty_filename'}), 400
-    filename = secure_filename(f.filename)
-    # build a unique filename using email and timestamp
-    ext = Path(filename).suffix or '.png'
-    safe_email = secure_filename(email.replace('@','_at_'))
-    out_name = f"{safe_email}_{int(time.time()*1000)}{ext}"
-    out_path = AVATAR_DIR / out_name
     try:
-        f.save(str(out_path))
+        data = avatars.read_capped(f.stream)
+        out_name = avatars.process_avatar(data, AVATAR_DIR)
+    except avatars.AvatarError as e:
+        return jsonify({'error': e.code, 'max_bytes': avatars.AVATAR_MAX_BYTES}), e.status
     except Exception as e:
         return jsonify({'error':'save_failed','detail':str(e)}), 500
+    previous = (_find_user_by_email(email) or {}).get('avatar')
     # update user avatar path in DB
     db = get_db()
     with db:
-        db.execute('UPDATE users SET avatar = ? WHERE LOWER(email)=LOWER(?)', (out_name, email))
-        row = db.execute('SELECT * FROM users WHERE LOWER(email)=LOWER(?)', (email,)).fetchone()
-    user = dict(row) if row else None
+        db.execute('UPDATE users SET avatar = ? WHERE email = ? COLLATE NOCASE', (out_name, _normalize_email(email)))
+    # drop the replaced files unless another account uploaded the same image
+    if previous and previous != out_name:
+        still_used = db.execute('SELECT 1 FROM users WHERE avatar = ? LIMIT 1', (previous,)).fetchone()
+        if not still_used:
+            avatars.remove_avatar(AVATAR_DIR, previous)
+    _invalidate_user(email)
+    user = _find_user_by_email(email)
     u = _user_public(user)
     if u and u.get('avatar'):
         u['avatar'] = '/avatars/' + u['avatar']
     return jsonify({'user': u})
 
 
+# Frontend error reports: rate-limited, deduplicated and flushed to disk off the request thread
+UI_ERROR_LOG = uilog.UIErrorLog(DATA_DIR / 'ui_errors.log')
+
+
 @app.route('/api/log', methods=['POST'])
 def api_log():
-    """Development-only UI error logger. Accepts JSON {message, stack, url, extra} and appends to data/ui_errors.log"""
+    """Development-only UI error logger. Accepts JSON {message, stack, url, extra}; see uilog.py"""
+    if request.content_length and request.content_length > 64 * 1024:
+        return jsonify({'ok': False, 'error': 'payload_too_large'}), 413
     try:
         payload = request.get_json(force=True, silent=True) or {}
     except Exception:
         payload = {}
-    entry = {
-        'when': int(time.time()*1000),
-        'remote': request.remote_addr,
-        'payload': payload
-    }
-    try:
-        log_file = DATA_DIR / 'ui_errors.log'
-        with open(log_file, 'a', encoding='utf-8') as fh:
-            fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
-    except Exception as e:
-        print('failed to write ui error log', e)
-    # also print to console for developer visibility
-    try:
-        print('UI ERROR LOG:', json.dumps(entry))
-    except Exception:
-        pass
-    return jsonify({'ok': True}), 200
+    if not isinstance(payload, dict):
+        payload = {'message': str(payload)}
+    client = session.get('user_email') or request.remote_addr or 'anon'
+    status = UI_ERROR_LOG.submit(client, payload, remote=request.remote_addr)
+    if status == 'rate_limited':
+        resp = jsonify({'ok': False, 'status': status})
+        resp.headers['Retry-After'] = str(UI_ERROR_LOG.retry_after(client))
+        return resp, 429
+    return jsonify({'ok': True, 'status': status}), 200
 
 
 @app.route('/api/calendar/oauth_start', methods=['GET'])
@@ -569,12 +677,18 @@ def calendar_sync_today():
     creds = _load_calendar_credentials_for_user(email)
     if not creds:
         return jsonify({'error':'no_calendar_connected'}), 400
+    # load user's tasks, then give the connection back: one Google call per task follows
+    db = get_db()
+    rows = db.execute('SELECT * FROM tasks WHERE user_email = ? AND status != ?', (email, 'done')).fetchall()
+    tasks = [dict(r) for r in rows]
+    release_db()
     # refresh if needed
     try:
         if creds.expired and creds.refresh_token:
             creds.refresh(GoogleRequest())
             # persist refreshed token
             _save_calendar_tokens_for_user(email, creds)
+            release_db()
     except Exception as e:
         return jsonify({'error':'token_refresh_failed', 'detail': str(e)}), 500
     # Build service and insert events from user's tasks
@@ -582,10 +696,6 @@ def calendar_sync_today():
         service = build('calendar', 'v3', credentials=creds, cache_discovery=False)
     except Exception as e:
         return jsonify({'error':'google_client_init_failed', 'detail': str(e)}), 500
-    # load user's tasks
-    db = get_db()
-    rows = db.execute('SELECT * FROM tasks WHERE user_email = ? AND status != ?', (email, 'done')).fetchall()
-    tasks = [dict(r) for r in rows]
     from datetime import datetime, timedelta
     now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
     created = 0
@@ -625,10 +735,12 @@ def calendar_add_event():
     creds = _load_calendar_credentials_for_user(email)
     if not creds:
         return jsonify({'error': 'no_calendar_connected'}), 400
+    release_db()
     try:
         if creds.expired and creds.refresh_token:
             creds.refresh(GoogleRequest())
             _save_calendar_tokens_for_user(email, creds)
+            release_db()
     except Exception as e:
         return jsonify({'error': 'token_refresh_failed', 'detail': str(e)}), 500
 
@@ -652,7 +764,7 @@ def calendar_add_event():
 @app.route('/api/tasks', methods=['GET', 'POST'])
 def api_tasks():
     """GET: /api/tasks?user=USER -> returns list
-       POST: {user, title, detail, priority, hours} -> saves task and returns it
+       POST: {user, title, detail, priority, hours, deadline?} -> saves task and returns it
     """
     db = get_db()
     if request.method == 'GET':
@@ -664,9 +776,19 @@ def api_tasks():
         if not user:
             # no user specified and no session — return empty list
             return jsonify({'tasks': []})
-        rows = db.execute('SELECT * FROM tasks WHERE user_email = ? ORDER BY created_at DESC', (user,)).fetchall()
-        tasks = [dict(r) for r in rows]
-        return jsonify({'tasks': tasks})
+        # ?archived=1 reads finished tasks from cold storage (paged)
+        archived = request.args.get('archived') in ('1', 'true', 'yes')
+        try:
+            limit = max(1, min(int(request.args.get('limit', 100)), 1000))
+            offset = max(0, int(request.args.get('offset', 0)))
+        except ValueError:
+            return jsonify({'error': 'invalid_paging'}), 400
+
+        def build():
+            return {'tasks': appdb.list_user_tasks(db, user, archived=archived, limit=limit, offset=offset)}
+
+        etag = _make_etag('tasks', user, _resource_version(user, 'tasks'), archived, limit if archived else '', offset if archived else '')
+        return _conditional_json(etag, build)
 
     # POST
     body = request.get_json() or {}
@@ -677,46 +799,108 @@ def api_tasks():
     title = body.get('title') or body.get('message') or 'Untitled'
     detail = body.get('detail') or ''
     priority = body.get('priority') or 'medium'
+    deadline = body.get('deadline') or None
     try:
         hours = float(body.get('hours') or 1)
     except Exception:
         hours = 1
-    created_at = int(time.time()*1000)
-    with db:
-        cur = db.execute('INSERT INTO tasks (user_email,title,detail,priority,hours,status,created_at) VALUES (?,?,?,?,?,?,?)', (user, title, detail, priority, hours, 'pending', created_at))
-        task_id = cur.lastrowid
-        row = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
-    return jsonify({'task': dict(row)})
+    task = appdb.create_user_task(db, user, title=title, detail=detail, priority=priority, hours=hours, deadline=deadline)
+    # same tasks_changed push as web/server.py, so /ws/chat sockets hear about Flask-side writes under asgi.py
+    wsmanager.notify(task['user_email'], {'type': 'tasks_changed', 'task': task})
+    return jsonify({'task': task})
+
+
+@app.route('/api/stats', methods=['GET'])
+def api_stats():
+    """GET /api/stats[?user=...] -> {stats: {total, by_status, by_priority, total_hours,
+    remaining_hours, overdue, completion_pct, as_of}} read from the task_stats aggregates.
+    """
+    user = request.args.get('user') or session.get('user_email')
+    if user == 'me':
+        user = session.get('user_email')
+    if not user:
+        return jsonify({'stats': None})
+    from datetime import date
+    today = date.today().isoformat()
+    etag = _make_etag('stats', user, _resource_version(user, 'tasks'), today)
+    return _conditional_json(etag, lambda: {'stats': appdb.read_task_stats(get_db(), user, today)})
+
+
+@app.route('/api/tasks/search', methods=['GET'])
+def api_search_tasks():
+    """GET /api/tasks/search?q=dbms&limit=20&offset=0[&user=...]
+
+    Prefix full-text search over title/detail via the FTS5 index, best
+    matches first. Returns {tasks, has_more} for paging.
+    """
+    user = request.args.get('user') or session.get('user_email')
+    if user == 'me':
+        user = session.get('user_email')
+    if not user:
+        return jsonify({'tasks': [], 'has_more': False})
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({'error': 'invalid_paging'}), 400
+    tasks, has_more = appdb.search_user_tasks(get_db(), user, request.args.get('q'), limit, offset)
+    return jsonify({'tasks': tasks, 'has_more': has_more})
+
+
+@app.route('/api/plan', methods=['GET'])
+@app.route('/api/generate_timetable', methods=['GET', 'POST'])
+def api_plan():
+    """Study plan from the server-side planner (tools.generate_plan).
+
+    Params (query string or JSON body): daily_hours, num_days.
+    GET responses carry an ETag derived from the task store version and
+    today's date, so unchanged plans come back as 304.
+    """
+    args = request.args if request.method == 'GET' else (request.get_json(force=True, silent=True) or {})
+    try:
+        daily_hours = float(args.get('daily_hours', 3.0))
+    except Exception:
+        daily_hours = 3.0
+    try:
+        num_days = int(args.get('num_days', 7))
+    except Exception:
+        num_days = 7
+
+    def build():
+        return {'ok': True, 'plan': generate_plan(daily_hours=daily_hours, num_days=num_days)}
+
+    try:
+        if request.method != 'GET':
+            return jsonify(build())
+        from datetime import date
+        etag = _make_etag('plan', get_tasks_version(), date.today().isoformat(), daily_hours, num_days)
+        return _conditional_json(etag, build)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/tasks/<int:task_id>', methods=['PUT', 'PATCH'])
 def api_update_task(task_id):
-    """Update task fields: title, detail, priority, hours, status
+    """Update task fields: title, detail, priority, hours, status, deadline
     Returns updated task or 404.
     """
     db = get_db()
     body = request.get_json() or {}
-    # Build update set
-    allowed = ['title', 'detail', 'priority', 'hours', 'status']
-    updates = {}
-    for k in allowed:
-        if k in body:
-            updates[k] = body[k]
+    updates = {k: body[k] for k in appdb.TASK_FIELDS if k in body}
     if not updates:
         return jsonify({'error':'no_fields'}), 400
-    # Prepare SQL
-    set_clause = ', '.join([f"{k} = ?" for k in updates.keys()])
-    params = list(updates.values())
-    params.append(task_id)
     try:
-        with db:
-            db.execute(f'UPDATE tasks SET {set_clause} WHERE id = ?', params)
-            row = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
-        if not row:
+        task = appdb.update_user_task(db, task_id, updates)
+        if not task:
             return jsonify({'error':'not_found'}), 404
-        return jsonify({'task': dict(row)})
+        wsmanager.notify(task['user_email'], {'type': 'tasks_changed', 'task': task})
+        return jsonify({'task': task})
     except Exception as e:
         return jsonify({'error':'update_failed', 'detail': str(e)}), 500
 
 if __name__ == "__main__":
+    # Periodically move old done tasks out of the hot tables (both task stores);
+    # only in the reloader's serving child, not the file-watching parent
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_archive_compactor(extra_jobs=[appdb.compact_archive])
     app.run(host="127.0.0.1", port=8000, debug=True)
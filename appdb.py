@@ -0,0 +1,373 @@
+# appdb.py - SQLite layer for data/chronoken.db (users, tasks, stats) shared by both servers
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import metrics
+from storage import (
+    ensure_task_fts, build_fts_query,
+    ensure_task_archive, archive_done_tasks,
+    NEXT_TASK_ID_SQL, ARCHIVE_RETENTION_DAYS,
+)
+
+project_root = Path(__file__).resolve().parent
+DATA_DIR = project_root / 'data'
+DATA_DIR.mkdir(exist_ok=True)
+DB_PATH = DATA_DIR / 'chronoken.db'
+
+# Worker threads dedicated to SQLite work coming from async code (web/server.py)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '4'))
+
+
+def connect(path=DB_PATH, check_same_thread=True):
+    db = sqlite3.connect(str(path), detect_types=sqlite3.PARSE_DECLTYPES, timeout=5, check_same_thread=check_same_thread)
+    db.row_factory = sqlite3.Row
+    return db
+
+
+class PoolExhausted(TimeoutError):
+    """No pooled connection became free within acquire()'s timeout."""
+
+
+class ConnectionPool:
+    """
+    Process-wide pool of SQLite connections shared by the Flask request
+    handlers (acquire in get_db, release on teardown) and DBPool workers.
+    At most `max_size` connections are ever open; extra callers wait.
+    """
+
+    def __init__(self, path=DB_PATH, max_size=DB_POOL_SIZE * 2):
+        self.path = path
+        self.max_size = max_size
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=10):
+        with self._cond:
+            while not self._idle and self._created >= self.max_size:
+                if not self._cond.wait(timeout):
+                    raise PoolExhausted('appdb: connection pool exhausted')
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return connect(self.path, check_same_thread=False)
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, db):
+        if db.in_transaction:
+            db.rollback()
+        with self._cond:
+            self._idle.append(db)
+            self._cond.notify()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=DB_PATH):
+    """The shared ConnectionPool for `path` (one per database file per process)."""
+    with _pools_lock:
+        pool = _pools.get(str(path))
+        if pool is None:
+            pool = _pools[str(path)] = ConnectionPool(path)
+        return pool
+
+
+def init_schema(db):
+    """Create/upgrade users, tasks and their derived tables (idempotent)."""
+    with db:
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY,
+                email TEXT UNIQUE NOT NULL COLLATE NOCASE,
+                name TEXT,
+                password_hash TEXT,
+                avatar TEXT,
+                calendar_tokens TEXT,
+                created_at INTEGER
+            )
+        ''')
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                user_email TEXT NOT NULL,
+                title TEXT,
+                detail TEXT,
+                priority TEXT,
+                hours REAL,
+                status TEXT,
+                created_at INTEGER,
+                deadline TEXT
+            )
+        ''')
+        # Emails are stored trimmed + lowercased; the NOCASE unique index lets lookups
+        # use an index seek instead of scanning with LOWER(email).
+        try:
+            db.execute("UPDATE users SET email = LOWER(TRIM(email)) WHERE email != LOWER(TRIM(email))")
+        except sqlite3.IntegrityError:
+            print('users: could not normalize emails (case-duplicate accounts exist)')
+        try:
+            db.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email_nocase ON users(email COLLATE NOCASE)')
+        except sqlite3.IntegrityError:
+            print('users: NOCASE email index not created (case-duplicate accounts exist)')
+        task_cols = [r['name'] for r in db.execute("PRAGMA table_info(tasks)").fetchall()]
+        if 'deadline' not in task_cols:
+            db.execute('ALTER TABLE tasks ADD COLUMN deadline TEXT')
+        db.execute('CREATE INDEX IF NOT EXISTS idx_tasks_user_created ON tasks(user_email, created_at)')
+        # done tasks are moved to tasks_archive so hot-path queries only see active work
+        ensure_task_archive(db)
+        db.execute('CREATE INDEX IF NOT EXISTS idx_tasks_archive_user ON tasks_archive(user_email, archived_at)')
+        # Per-user version counters used as ETags for conditional GETs.
+        # Bumped by triggers so every writer (API, migrations) keeps them current.
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS user_versions (
+                user_email TEXT PRIMARY KEY,
+                tasks INTEGER NOT NULL DEFAULT 0,
+                profile INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        for op, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            db.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS tasks_bump_version_{op.lower()} AFTER {op} ON tasks
+                BEGIN
+                    INSERT INTO user_versions (user_email, tasks) VALUES ({row}.user_email, 1)
+                    ON CONFLICT(user_email) DO UPDATE SET tasks = tasks + 1;
+                END
+            ''')
+        db.execute('''
+            CREATE TRIGGER IF NOT EXISTS users_bump_version_update AFTER UPDATE ON users
+            BEGIN
+                INSERT INTO user_versions (user_email, profile) VALUES (NEW.email, 1)
+                ON CONFLICT(user_email) DO UPDATE SET profile = profile + 1;
+            END
+        ''')
+        # full-text index over tasks(title, detail), kept in sync by triggers
+        ensure_task_fts(db)
+        _init_task_stats(db)
+
+
+# Aggregates kept per (user, dimension, key) by triggers so analytics never scan tasks:
+#   ('all', '')          -> every task
+#   ('status', <status>) -> per status      ('priority', <priority>) -> per priority
+#   ('due', <deadline>)  -> open (not done) tasks per deadline day, for the overdue count
+_TASK_STATS_DIMS = (
+    ("'all'", "''", "1"),
+    ("'status'", "COALESCE({r}.status, 'pending')", "1"),
+    ("'priority'", "COALESCE({r}.priority, 'medium')", "1"),
+    ("'due'", "{r}.deadline", "{r}.deadline IS NOT NULL AND {r}.deadline != '' AND COALESCE({r}.status, 'pending') != 'done'"),
+)
+
+
+def _task_stats_sql(row, sign):
+    """Statements adding (sign='+') or removing (sign='-') trigger row `row` from task_stats."""
+    out = []
+    for dim, key, cond in _TASK_STATS_DIMS:
+        out.append(f'''
+            INSERT INTO task_stats (user_email, dim, key, count, hours)
+            SELECT {row}.user_email, {dim}, {key.format(r=row)}, {sign}1, {sign}COALESCE({row}.hours, 0)
+            WHERE {cond.format(r=row)}
+            ON CONFLICT(user_email, dim, key) DO UPDATE
+            SET count = count + excluded.count, hours = hours + excluded.hours;''')
+    return ''.join(out)
+
+
+def _init_task_stats(db):
+    exists = db.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='task_stats'").fetchone()
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS task_stats (
+            user_email TEXT NOT NULL,
+            dim TEXT NOT NULL,
+            key TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            hours REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_email, dim, key)
+        ) WITHOUT ROWID
+    ''')
+    db.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS task_stats_insert AFTER INSERT ON tasks
+        BEGIN {_task_stats_sql('NEW', '+')}
+        END
+    ''')
+    db.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS task_stats_delete AFTER DELETE ON tasks
+        BEGIN {_task_stats_sql('OLD', '-')}
+        END
+    ''')
+    db.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS task_stats_update
+        AFTER UPDATE OF user_email, status, priority, hours, deadline ON tasks
+        BEGIN {_task_stats_sql('OLD', '-')}{_task_stats_sql('NEW', '+')}
+        END
+    ''')
+    # archived tasks still count: moving a row tasks -> tasks_archive nets to zero
+    db.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS task_stats_archive_insert AFTER INSERT ON tasks_archive
+        BEGIN {_task_stats_sql('NEW', '+')}
+        END
+    ''')
+    db.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS task_stats_archive_delete AFTER DELETE ON tasks_archive
+        BEGIN {_task_stats_sql('OLD', '-')}
+        END
+    ''')
+    if not exists:
+        # one-time backfill from rows written before the triggers existed
+        for dim, key, cond in _TASK_STATS_DIMS:
+            db.execute(f'''
+                INSERT INTO task_stats (user_email, dim, key, count, hours)
+                SELECT t.user_email, {dim}, {key.format(r='t')}, COUNT(*), COALESCE(SUM(t.hours), 0)
+                FROM (SELECT user_email, status, priority, hours, deadline FROM tasks
+                      UNION ALL
+                      SELECT user_email, status, priority, hours, deadline FROM tasks_archive) t
+                WHERE {cond.format(r='t')}
+                GROUP BY t.user_email, {key.format(r='t')}
+            ''')
+
+
+def read_task_stats(db, user_email, today):
+    """Assemble the analytics summary for one user from task_stats (no task scan)."""
+    rows = db.execute(
+        "SELECT dim, key, count, hours FROM task_stats WHERE user_email = ? AND dim != 'due' AND count > 0",
+        (user_email,),
+    ).fetchall()
+    overdue = db.execute(
+        "SELECT COALESCE(SUM(count), 0) AS n FROM task_stats WHERE user_email = ? AND dim = 'due' AND key < ? AND count > 0",
+        (user_email, today),
+    ).fetchone()['n']
+    total, total_hours = 0, 0.0
+    by_status, by_priority, status_hours = {}, {}, {}
+    for r in rows:
+        if r['dim'] == 'all':
+            total, total_hours = r['count'], r['hours']
+        elif r['dim'] == 'status':
+            by_status[r['key']] = r['count']
+            status_hours[r['key']] = r['hours']
+        elif r['dim'] == 'priority':
+            by_priority[r['key']] = r['count']
+    done = by_status.get('done', 0)
+    return {
+        'total': total,
+        'by_status': by_status,
+        'by_priority': by_priority,
+        'total_hours': round(total_hours, 2),
+        'remaining_hours': round(total_hours - status_hours.get('done', 0.0), 2),
+        'overdue': overdue,
+        'completion_pct': round(100 * done / total) if total else 0,
+        'as_of': today,
+    }
+
+
+def resource_version(db, user_email, resource):
+    """Return the current version counter for `resource` ('tasks' | 'profile')."""
+    if resource not in ('tasks', 'profile'):
+        raise ValueError(resource)
+    row = db.execute(f'SELECT {resource} FROM user_versions WHERE user_email = ?', (user_email,)).fetchone()
+    return row[0] if row else 0
+
+
+# ---- tasks ----
+
+TASK_FIELDS = ('title', 'detail', 'priority', 'hours', 'status', 'deadline')
+
+
+def list_user_tasks(db, user_email, archived=False, limit=100, offset=0):
+    """Active tasks (newest first), or a page of archived tasks when `archived`."""
+    if archived:
+        rows = db.execute('SELECT * FROM tasks_archive WHERE user_email = ? ORDER BY archived_at DESC LIMIT ? OFFSET ?', (user_email, limit, offset)).fetchall()
+    else:
+        rows = db.execute('SELECT * FROM tasks WHERE user_email = ? ORDER BY created_at DESC', (user_email,)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def create_user_task(db, user_email, title='Untitled', detail='', priority='medium', hours=1.0, deadline=None):
+    created_at = int(time.time()*1000)
+    with db:
+        cur = db.execute(f'INSERT INTO tasks (id,user_email,title,detail,priority,hours,status,created_at,deadline) VALUES ({NEXT_TASK_ID_SQL},?,?,?,?,?,?,?,?)', (user_email, title, detail, priority, hours, 'pending', created_at, deadline))
+        row = db.execute('SELECT * FROM tasks WHERE id = ?', (cur.lastrowid,)).fetchone()
+    return dict(row)
+
+
+def update_user_task(db, task_id, updates):
+    """Apply `updates` (subset of TASK_FIELDS) to one task; returns the updated row or None."""
+    updates = {k: v for k, v in updates.items() if k in TASK_FIELDS}
+    if not updates:
+        raise ValueError('no_fields')
+    set_clause = ', '.join([f"{k} = ?" for k in updates.keys()])
+    params = list(updates.values())
+    params.append(task_id)
+    with db:
+        db.execute(f'UPDATE tasks SET {set_clause} WHERE id = ?', params)
+        row = db.execute('SELECT * FROM tasks WHERE id = ?', (task_id,)).fetchone()
+    if not row:
+        return None
+    if updates.get('status') == 'done' and ARCHIVE_RETENTION_DAYS <= 0:
+        # immediate mode: the finished task leaves the working set right away
+        with db:
+            archive_done_tasks(db, retention_days=0)
+    return dict(row)
+
+
+def search_user_tasks(db, user_email, q, limit=20, offset=0):
+    """Prefix full-text search over title/detail, best matches first. Returns (rows, has_more)."""
+    match = build_fts_query(q)
+    if not match:
+        return [], False
+    rows = db.execute(
+        '''SELECT t.* FROM tasks_fts JOIN tasks t ON t.id = tasks_fts.rowid
+           WHERE tasks_fts MATCH ? AND t.user_email = ?
+           ORDER BY bm25(tasks_fts, 10.0, 1.0) LIMIT ? OFFSET ?''',
+        (match, user_email, limit + 1, offset),
+    ).fetchall()
+    return [dict(r) for r in rows[:limit]], len(rows) > limit
+
+
+def compact_archive():
+    """Background job: archive old done tasks in data/chronoken.db."""
+    conn = connect()
+    try:
+        return archive_done_tasks(conn)
+    finally:
+        conn.close()
+
+
+# ---- async access ----
+
+class DBPool:
+    """
+    Bounded thread pool for SQLite work issued from async code. Jobs borrow a
+    connection from the shared ConnectionPool, so the event loop never blocks
+    on disk and concurrency against the database stays capped at `max_workers`.
+    """
+
+    def __init__(self, max_workers=DB_POOL_SIZE, path=DB_PATH):
+        self.pool = get_pool(path)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='appdb')
+
+    def _with_conn(self, fn, args, kwargs):
+        db = self.pool.acquire()
+        try:
+            return fn(metrics.timed_connection(db, 'app'), *args, **kwargs)
+        finally:
+            self.pool.release(db)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(db, *args, **kwargs) on a pool thread with a pooled connection."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._with_conn, fn, args, kwargs)
+
+    async def call(self, fn, *args, **kwargs):
+        """Run a blocking callable that does its own I/O (e.g. tools.generate_plan) on the pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
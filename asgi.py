@@ -0,0 +1,43 @@
+# asgi.py - single ASGI entrypoint serving both the Flask app and web/server.py
+#
+#   uvicorn asgi:app --host 127.0.0.1 --port 8000
+#
+# One process, one port: the Flask app (sessions, auth, tasks, calendar, chat)
+# and the FastAPI app (WebSocket chat, Gmail OAuth, welcome email) share the
+# same agent module (model client + response caches), the appdb connection
+# pool and the storage archive compactor instead of each running its own copy.
+import os
+
+from app import app as flask_app
+from web.server import app as fastapi_app
+
+# a2wsgi (in requirements.txt) runs the WSGI app on a bounded thread pool.
+# Without it Starlette's adapter is used: deprecated upstream (it warns on
+# import) and with no pool bound of its own.
+try:
+    from a2wsgi import WSGIMiddleware
+    A2WSGI_AVAILABLE = True
+except Exception:
+    from starlette.middleware.wsgi import WSGIMiddleware
+    A2WSGI_AVAILABLE = False
+
+# Paths only the FastAPI app serves. Everything else (including the routes
+# both apps define, e.g. /api/tasks and /api/chat) goes to Flask, whose
+# handlers resolve the signed-in user from the session cookie.
+ASGI_PREFIXES = ('/ws/', '/auth/', '/static/', '/api/send_welcome')
+
+flask_asgi = WSGIMiddleware(flask_app)
+
+
+async def app(scope, receive, send):
+    # websockets and lifespan (startup hooks) always belong to FastAPI
+    if scope['type'] != 'http' or scope.get('path', '').startswith(ASGI_PREFIXES):
+        await fastapi_app(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    port = int(os.environ.get('PORT', 8000))
+    uvicorn.run('asgi:app', host='127.0.0.1', port=port)
@@ -0,0 +1,140 @@
+# avatars.py - decode, resize and store uploaded avatars as content-hashed WebP files
+#
+# Each upload is decoded server-side, squared (centre crop) and written as
+# <digest>-<size>.webp for every size in AVATAR_SIZES. The digest covers the
+# encoded output, so identical uploads share files and a name never changes
+# content -> the files can be served with immutable caching.
+import hashlib
+import io
+import os
+import re
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except Exception:
+    Image = ImageOps = None
+    PIL_AVAILABLE = False
+
+AVATAR_MAX_BYTES = int(os.getenv('AVATAR_MAX_BYTES', str(5 * 1024 * 1024)))
+# refuse to decode anything larger than this many pixels (decompression bombs)
+AVATAR_MAX_PIXELS = int(os.getenv('AVATAR_MAX_PIXELS', str(40_000_000)))
+AVATAR_SIZES = (64, 128, 256)
+AVATAR_QUALITY = 82
+CHUNK_SIZE = 64 * 1024
+
+HASHED_NAME_RE = re.compile(r'^(?P<digest>[0-9a-f]{20})-(?P<size>\d+)\.(?P<ext>webp|png|jpg|gif)$')
+
+# magic bytes of the formats accepted when Pillow is not installed
+_SNIFF = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+class AvatarError(ValueError):
+    """Upload rejected; `code` is the error string returned to the client."""
+
+    def __init__(self, code, status=400):
+        super().__init__(code)
+        self.code = code
+        self.status = status
+
+
+def read_capped(stream, limit=AVATAR_MAX_BYTES):
+    """Read `stream` in chunks, failing as soon as more than `limit` bytes arrive."""
+    buf = io.BytesIO()
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            return buf.getvalue()
+        if buf.tell() + len(chunk) > limit:
+            raise AvatarError('file_too_large', 413)
+        buf.write(chunk)
+
+
+def _sniff(data):
+    for magic, ext in _SNIFF:
+        if data.startswith(magic):
+            return ext
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def _store(out_dir, name, data):
+    path = Path(out_dir) / name
+    if not path.exists():
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+
+def process_avatar(data, out_dir):
+    """
+    Validate and store an uploaded image. Returns the stored name for the
+    largest size (what goes into users.avatar), e.g. '<digest>-256.webp'.
+    """
+    if not PIL_AVAILABLE:
+        # no decoder: keep the original bytes, but only for known image types
+        ext = _sniff(data)
+        if not ext:
+            raise AvatarError('unsupported_image')
+        name = f"{hashlib.sha256(data).hexdigest()[:20]}-0.{ext}"
+        _store(out_dir, name, data)
+        return name
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        if img.format not in ('JPEG', 'PNG', 'GIF', 'WEBP'):
+            raise AvatarError('unsupported_image')
+        if img.width * img.height > AVATAR_MAX_PIXELS:
+            raise AvatarError('image_too_large', 413)
+        img = ImageOps.exif_transpose(img)
+        img = img.convert('RGBA') if img.mode in ('P', 'LA', 'RGBA', 'PA') else img.convert('RGB')
+    except AvatarError:
+        raise
+    except Exception:
+        raise AvatarError('invalid_image')
+
+    largest = max(AVATAR_SIZES)
+    square = ImageOps.fit(img, (largest, largest), Image.LANCZOS)
+    encoded = {}
+    for size in AVATAR_SIZES:
+        out = square if size == largest else square.resize((size, size), Image.LANCZOS)
+        buf = io.BytesIO()
+        out.save(buf, 'WEBP', quality=AVATAR_QUALITY, method=6)
+        encoded[size] = buf.getvalue()
+    digest = hashlib.sha256(encoded[largest]).hexdigest()[:20]
+    for size, blob in encoded.items():
+        _store(out_dir, f"{digest}-{size}.webp", blob)
+    return f"{digest}-{largest}.webp"
+
+
+def avatar_urls(name, prefix='/avatars/'):
+    """{size: url} for a stored avatar name; legacy (unhashed) names map to a single URL."""
+    m = HASHED_NAME_RE.match(name or '')
+    if not m or m.group('size') == '0':
+        return {'default': prefix + name} if name else {}
+    return {str(size): f"{prefix}{m.group('digest')}-{size}.webp" for size in AVATAR_SIZES}
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME_RE.match(name or ''))
+
+
+def remove_avatar(out_dir, name):
+    """Delete every stored size of `name` (no-op for missing files)."""
+    m = HASHED_NAME_RE.match(name or '')
+    if m:
+        names = [f"{m.group('digest')}-{s}.webp" for s in AVATAR_SIZES] if m.group('ext') == 'webp' else [name]
+    else:
+        names = [name] if name and '/' not in name and '\\' not in name else []
+    for n in names:
+        try:
+            (Path(out_dir) / n).unlink()
+        except FileNotFoundError:
+            pass
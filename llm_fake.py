@@ -0,0 +1,242 @@
+# llm_fake.py - offline stand-in for the Gemini model (LLM_PROVIDER=fake)
+#
+# FakeModel implements the part of genai.GenerativeModel the agent uses:
+# generate_content(prompt, request_options={"timeout": s}, stream=False, **kwargs).
+# It returns objects with .text, .candidates (function-call parts when `tools`
+# are passed) and .usage_metadata. Routing, resilience, schema parsing and the
+# caches therefore run unchanged, with no network and no API key.
+#
+# Where replies come from, in order:
+#   FAKE_LLM_SCRIPT   JSON file {"sequence": [reply, ...], "rules": [{"match": regex, "reply": reply}]}
+#                     sequence replies are used once each, in order; then the first matching rule
+#                     (each tier's FakeModel reads its own copy, so set MODEL_ROUTING=0 for exact scripts)
+#   built-in rules    explicit commands (local_commands), "mark the DBMS assignment done"
+#                     resolved against the task digest in the prompt (task_context.py),
+#                     planning -> generate_plan, small talk, anything else a short chat_only reply
+# A reply is {action, params, assistant_message} or {actions: [...], assistant_message}.
+# It may instead be {"text": "..."} (raw, unparseable output) or {"error": "unavailable" | "timeout"}.
+# "{message}" in assistant_message is replaced with the user's message.
+#
+# Timing and faults, so load tests see realistic behaviour:
+#   FAKE_LLM_LATENCY       fixed:0.4 | uniform:0.2,1.5 | normal:0.8,0.2 | lognormal:0.8,0.5 (median, sigma)
+#   FAKE_LLM_FAST_LATENCY  the same for the fast tier (default FAKE_LLM_LATENCY)
+#   FAKE_LLM_ERROR_RATE    share of calls failing with a retryable ServiceUnavailable
+#   FAKE_LLM_TIMEOUT_RATE  share of calls that hang until the request timeout
+#   FAKE_LLM_CHUNK_CHARS   chunk size for stream=True
+#   FAKE_LLM_SEED          make latency and fault draws repeatable
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+import local_commands
+import model_router
+
+FAKE_LLM_SCRIPT = os.getenv('FAKE_LLM_SCRIPT', '')
+FAKE_LLM_LATENCY = os.getenv('FAKE_LLM_LATENCY', 'lognormal:0.8,0.4')
+FAKE_LLM_FAST_LATENCY = os.getenv('FAKE_LLM_FAST_LATENCY', '') or FAKE_LLM_LATENCY
+FAKE_LLM_ERROR_RATE = float(os.getenv('FAKE_LLM_ERROR_RATE', '0'))
+FAKE_LLM_TIMEOUT_RATE = float(os.getenv('FAKE_LLM_TIMEOUT_RATE', '0'))
+FAKE_LLM_CHUNK_CHARS = int(os.getenv('FAKE_LLM_CHUNK_CHARS', '40'))
+FAKE_LLM_SEED = os.getenv('FAKE_LLM_SEED', '')
+
+
+# named like the google.api_core errors so llm_resilience treats them the same way
+class ServiceUnavailable(Exception):
+    code = 503
+
+
+class DeadlineExceeded(Exception):
+    code = 504
+
+
+def parse_latency(spec):
+    """'kind:a,b' -> callable(rng) returning seconds; raises ValueError on a bad spec."""
+    kind, _, args = (spec or 'fixed:0').partition(':')
+    nums = [float(x) for x in args.split(',') if x.strip()]
+    kind = kind.strip().lower()
+    if kind == 'fixed' and len(nums) == 1:
+        return lambda rng: nums[0]
+    if kind == 'uniform' and len(nums) == 2:
+        return lambda rng: rng.uniform(nums[0], nums[1])
+    if kind == 'normal' and len(nums) == 2:
+        return lambda rng: max(0.0, rng.gauss(nums[0], nums[1]))
+    if kind == 'lognormal' and len(nums) == 2:
+        mu = math.log(nums[0]) if nums[0] > 0 else 0.0
+        return lambda rng: rng.lognormvariate(mu, nums[1])
+    raise ValueError(f'bad latency spec {spec!r}')
+
+
+def load_script(path):
+    """(sequence, rules) from a FAKE_LLM_SCRIPT file; rules are (compiled regex, reply)."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {'sequence': data}
+    rules = [(re.compile(r.get('match') or '.*', re.I | re.S), r['reply']) for r in data.get('rules', [])]
+    return list(data.get('sequence', [])), rules
+
+
+_DAYS_RE = re.compile(r'(\d+)\s*-?\s*days?\b', re.I)
+_HOURS_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:hours?|hrs?|h)\b', re.I)
+# "12 | DBMS assignment | 2025-11-25 | pending" lines of the prompt's task digest
+_DIGEST_LINE_RE = re.compile(r'^(\d+) \| (.+?) \| [^|\n]* \| \w+$', re.M)
+_MARK_RE = re.compile(r'\b(done|finished|completed|complete|finish|started|start|in progress)\b', re.I)
+_WORD_RE = re.compile(r'[a-z0-9]{3,}')
+_ACK = {
+    'create_task': 'Adding that task.',
+    'list_tasks': 'Sure.',
+    'update_task_status': 'Updating that task.',
+    'generate_plan': 'Sure, planning that now.',
+    'search_tasks': 'Let me look.',
+}
+
+
+def _resolve_task(message, prompt):
+    """The id of the digest task whose title shares the most words with `message`, or None."""
+    words = set(_WORD_RE.findall(message.lower()))
+    best, best_overlap = None, 0
+    for task_id, title in _DIGEST_LINE_RE.findall(prompt):
+        overlap = len(words & set(_WORD_RE.findall(title.lower())))
+        if overlap > best_overlap:
+            best, best_overlap = int(task_id), overlap
+    return best
+
+
+def default_reply(message, prompt=''):
+    """Built-in rule set: a plausible {action, params, assistant_message} for `message`."""
+    step = local_commands.parse_command(message)
+    if step is not None:
+        return dict(step, assistant_message=_ACK.get(step['action'], 'OK.'))
+    m = _MARK_RE.search(message)
+    task_id = _resolve_task(message, prompt) if m else None
+    if task_id is not None:
+        status = 'in_progress' if m.group(1).lower().startswith(('start', 'in')) else 'done'
+        return {'action': 'update_task_status', 'params': {'task_id': task_id, 'new_status': status},
+                'assistant_message': _ACK['update_task_status']}
+    if model_router._PLANNING_RE.search(message):
+        params = {}
+        m = _DAYS_RE.search(message)
+        if m:
+            params['num_days'] = int(m.group(1))
+        m = _HOURS_RE.search(message)
+        if m:
+            params['daily_hours'] = float(m.group(1))
+        return {'action': 'generate_plan', 'params': params, 'assistant_message': _ACK['generate_plan']}
+    if model_router._SMALL_TALK_RE.match(message):
+        return {'action': 'chat_only', 'params': {},
+                'assistant_message': 'Hi! I can add tasks, list them or plan your study time.'}
+    return {'action': 'chat_only', 'params': {},
+            'assistant_message': f'(fake model) You asked: {message[:200]}'}
+
+
+def _user_message(prompt):
+    # the agent's prompt ends with "User: <message>\nAssistant:"
+    tail = prompt.rsplit('User: ', 1)[-1]
+    return tail[:-len('\nAssistant:')] if tail.endswith('\nAssistant:') else tail
+
+
+def _tokens(text):
+    return max(1, len(text) // 4)
+
+
+class FakeResponse:
+    def __init__(self, text='', calls=(), prompt_tokens=0):
+        self._text = text
+        parts = [SimpleNamespace(function_call=SimpleNamespace(name=n, args=a)) for n, a in calls]
+        self.candidates = [SimpleNamespace(content=SimpleNamespace(parts=parts))]
+        completion = _tokens(text or json.dumps([a for _, a in calls]))
+        self.usage_metadata = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=completion)
+
+    @property
+    def text(self):
+        if self._text == '' and self.candidates[0].content.parts:
+            # same as the SDK: no text accessor on a function-call-only reply
+            raise ValueError('response has no text part')
+        return self._text
+
+
+class FakeStream:
+    """Iterable of FakeResponse chunks, like generate_content(stream=True)."""
+
+    def __init__(self, text, first_delay, per_chunk, chunk_chars, prompt_tokens):
+        self._chunks = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or ['']
+        self._first_delay = first_delay
+        self._per_chunk = per_chunk
+        self._prompt_tokens = prompt_tokens
+        self.text = text
+
+    def __iter__(self):
+        time.sleep(self._first_delay)
+        for i, chunk in enumerate(self._chunks):
+            if i:
+                time.sleep(self._per_chunk)
+            yield FakeResponse(chunk, prompt_tokens=self._prompt_tokens if i == 0 else 0)
+
+
+class FakeModel:
+    def __init__(self, model_name='fake', tier=model_router.LARGE, script=FAKE_LLM_SCRIPT,
+                 latency=None, error_rate=FAKE_LLM_ERROR_RATE, timeout_rate=FAKE_LLM_TIMEOUT_RATE,
+                 chunk_chars=FAKE_LLM_CHUNK_CHARS, seed=FAKE_LLM_SEED, sleep=time.sleep):
+        self.model_name = model_name
+        spec = latency or (FAKE_LLM_FAST_LATENCY if tier == model_router.FAST else FAKE_LLM_LATENCY)
+        self.latency = parse_latency(spec)
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.chunk_chars = chunk_chars
+        self.sleep = sleep
+        self.rng = random.Random(int(seed) if str(seed).strip() else None)
+        self.sequence, self.rules = load_script(script) if script else ([], [])
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def _next_reply(self, message, prompt):
+        with self.lock:
+            self.calls += 1
+            if self.sequence:
+                return self.sequence.pop(0)
+        for pattern, reply in self.rules:
+            if pattern.search(message):
+                return reply
+        return default_reply(message, prompt)
+
+    def _draw(self):
+        with self.lock:
+            return self.latency(self.rng), self.rng.random(), self.rng.random()
+
+    def generate_content(self, prompt, request_options=None, stream=False, **kwargs):
+        timeout = (request_options or {}).get('timeout')
+        message = _user_message(prompt)
+        reply = self._next_reply(message, prompt)
+        delay, fault, hang = self._draw()
+
+        if reply.get('error') == 'timeout' or hang < self.timeout_rate or (timeout is not None and delay > timeout):
+            self.sleep(timeout if timeout is not None else delay)
+            raise DeadlineExceeded('fake model: deadline exceeded')
+        if reply.get('error') or fault < self.error_rate:
+            # overloaded backends tend to refuse quickly
+            self.sleep(delay * 0.2)
+            raise ServiceUnavailable('fake model: service unavailable')
+
+        prompt_tokens = _tokens(prompt)
+        if 'text' in reply:
+            text, calls = str(reply['text']), []
+        else:
+            body = json.loads(json.dumps(reply).replace('{message}', json.dumps(message)[1:-1]))
+            if 'tools' in kwargs:
+                steps = body.get('actions') or [{'action': body.get('action', 'chat_only'), 'params': body.get('params', {})}]
+                msg = body.get('assistant_message', '')
+                text, calls = '', [(s['action'], dict(s.get('params') or {}, assistant_message=msg)) for s in steps]
+            else:
+                text, calls = json.dumps(body), []
+
+        if stream:
+            chunks = max(1, math.ceil(len(text) / self.chunk_chars))
+            # roughly a third of the latency before the first token, the rest spread over the chunks
+            return FakeStream(text, delay * 0.3, delay * 0.7 / chunks, self.chunk_chars, prompt_tokens)
+        self.sleep(delay)
+        return FakeResponse(text, calls, prompt_tokens)
@@ -0,0 +1,239 @@
+# llm_resilience.py - deadlines, retries, hedging and a circuit breaker for model calls
+#
+# ResilientCaller wraps a blocking `call(timeout)` (the agent passes a closure
+# around model.generate_content). Each attempt runs on a small dedicated thread
+# pool and is abandoned after LLM_TIMEOUT seconds; the timeout is also handed to
+# the SDK so the worker thread is released. Retryable failures (timeouts,
+# connection errors, 429/5xx) are retried with full-jitter exponential backoff
+# inside an overall LLM_DEADLINE. With LLM_HEDGE=1 a duplicate request is sent
+# when the first hasn't answered after the observed p95 latency, and whichever
+# finishes first wins.
+#
+# The CircuitBreaker opens when the error rate over the last LLM_BREAKER_WINDOW
+# seconds reaches LLM_BREAKER_ERROR_RATE (with at least LLM_BREAKER_MIN_CALLS
+# calls); while open, calls fail fast with CircuitOpen so the agent can answer
+# from local_commands instead. After LLM_BREAKER_COOLDOWN one probe is let
+# through (half-open) and its result closes or re-opens the circuit.
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '30'))
+LLM_DEADLINE = float(os.getenv('LLM_DEADLINE', '60'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+LLM_RETRY_BASE = float(os.getenv('LLM_RETRY_BASE', '0.5'))
+LLM_RETRY_MAX = float(os.getenv('LLM_RETRY_MAX', '4'))
+LLM_HEDGE = os.getenv('LLM_HEDGE', '0').lower() in ('1', 'true', 'yes')
+# fixed hedge delay in seconds; empty = p95 of recent successful calls
+LLM_HEDGE_DELAY = os.getenv('LLM_HEDGE_DELAY', '')
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+LLM_BREAKER_ERROR_RATE = float(os.getenv('LLM_BREAKER_ERROR_RATE', '0.5'))
+LLM_BREAKER_MIN_CALLS = int(os.getenv('LLM_BREAKER_MIN_CALLS', '10'))
+LLM_BREAKER_WINDOW = float(os.getenv('LLM_BREAKER_WINDOW', '60'))
+LLM_BREAKER_COOLDOWN = float(os.getenv('LLM_BREAKER_COOLDOWN', '30'))
+
+# exception class names (google.api_core and friends) worth another attempt
+RETRYABLE_NAMES = {
+    'DeadlineExceeded', 'ServiceUnavailable', 'TooManyRequests', 'ResourceExhausted',
+    'InternalServerError', 'GatewayTimeout', 'BadGateway', 'Aborted', 'RetryError',
+}
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMTimeout(Exception):
+    pass
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+def is_retryable(exc):
+    if isinstance(exc, (LLMTimeout, TimeoutError, ConnectionError)):
+        return True
+    if type(exc).__name__ in RETRYABLE_NAMES:
+        return True
+    code = getattr(exc, 'code', None)
+    code = getattr(code, 'value', code)
+    return isinstance(code, int) and code in RETRYABLE_STATUS
+
+
+class LatencyTracker:
+    """Recent successful call latencies, for the adaptive hedge delay."""
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def quantile(self, q, default=None):
+        with self.lock:
+            data = sorted(self.samples)
+        if len(data) < 20:
+            return default
+        return data[min(len(data) - 1, int(len(data) * q))]
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+    _GAUGE = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+    def __init__(self, error_rate=LLM_BREAKER_ERROR_RATE, min_calls=LLM_BREAKER_MIN_CALLS,
+                 window=LLM_BREAKER_WINDOW, cooldown=LLM_BREAKER_COOLDOWN, clock=time.monotonic):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.calls = deque()  # (timestamp, ok)
+        self.lock = threading.Lock()
+        self._probe = False
+
+    def _set(self, state):
+        self.state = state
+        metrics.LLM_CIRCUIT_STATE.set(self._GAUGE[state])
+
+    def allow(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.cooldown:
+                self._set(self.HALF_OPEN)
+                self._probe = False
+            if self.state == self.HALF_OPEN and not self._probe:
+                self._probe = True
+                return True
+            return False
+
+    def would_allow(self):
+        """Whether allow() would let a call through now, without taking the half-open probe."""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                return self.clock() - self.opened_at >= self.cooldown
+            return not self._probe
+
+    def record(self, ok):
+        now = self.clock()
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                if ok:
+                    self._set(self.CLOSED)
+                    self.calls.clear()
+                else:
+                    self._set(self.OPEN)
+                    self.opened_at = now
+                self._probe = False
+                return
+            self.calls.append((now, ok))
+            while self.calls and now - self.calls[0][0] > self.window:
+                self.calls.popleft()
+            if self.state == self.CLOSED and len(self.calls) >= self.min_calls:
+                errors = sum(1 for _, good in self.calls if not good)
+                if errors / len(self.calls) >= self.error_rate:
+                    self._set(self.OPEN)
+                    self.opened_at = now
+
+
+class ResilientCaller:
+    def __init__(self, timeout=LLM_TIMEOUT, deadline=LLM_DEADLINE, retries=LLM_MAX_RETRIES,
+                 retry_base=LLM_RETRY_BASE, retry_max=LLM_RETRY_MAX, hedge=LLM_HEDGE,
+                 hedge_delay=LLM_HEDGE_DELAY, breaker=None, max_concurrency=LLM_MAX_CONCURRENCY,
+                 sleep=time.sleep, clock=time.monotonic):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.hedge = hedge
+        self.hedge_delay = float(hedge_delay) if hedge_delay not in ('', None) else None
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm-call')
+        self.sleep = sleep
+        # deadline accounting; swap both for a fake clock in tests (scripts/test_resilience.py)
+        self.clock = clock
+
+    def _hedge_after(self, budget):
+        if not self.hedge:
+            return None
+        delay = self.hedge_delay if self.hedge_delay is not None else self.latency.quantile(0.95)
+        return delay if delay is not None and delay < budget else None
+
+    def _attempt(self, call, budget):
+        """One logical attempt (plus an optional hedge), bounded by `budget` seconds."""
+        t0 = self.clock()
+        first = self.pool.submit(call, budget)
+        pending = {first}
+        hedge_after = self._hedge_after(budget)
+        if hedge_after is not None:
+            done, _ = wait(pending, timeout=hedge_after)
+            if not done:
+                metrics.LLM_HEDGED.inc(result='sent')
+                pending.add(self.pool.submit(call, budget - hedge_after))
+        error = None
+        while pending:
+            remaining = budget - (self.clock() - t0)
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is None:
+                    if fut is not first:
+                        metrics.LLM_HEDGED.inc(result='won')
+                    for other in pending:
+                        other.cancel()
+                    self.latency.add(self.clock() - t0)
+                    return fut.result()
+                error = fut.exception()
+        for fut in pending:
+            fut.cancel()
+        if error is not None and not pending:
+            raise error
+        raise LLMTimeout(f'model call exceeded {budget:.1f}s')
+
+    def __call__(self, call):
+        """
+        Run `call(timeout)` with the configured deadline, retries and hedging.
+
+        Raises CircuitOpen without calling when the breaker is open, otherwise the
+        last error once retries or the overall deadline are exhausted.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen('model circuit open')
+        start = self.clock()
+        attempt = 0
+        while True:
+            budget = min(self.timeout, self.deadline - (self.clock() - start))
+            if budget <= 0:
+                raise LLMTimeout(f'model call deadline of {self.deadline:.1f}s exhausted')
+            try:
+                result = self._attempt(call, budget)
+            except Exception as e:
+                self.breaker.record(False)
+                retryable = is_retryable(e)
+                if not retryable or attempt >= self.retries:
+                    raise
+                # full jitter: uniform over [0, min(cap, base * 2^attempt)]
+                backoff = random.uniform(0, min(self.retry_max, self.retry_base * (2 ** attempt)))
+                if self.clock() - start + backoff >= self.deadline:
+                    raise
+                metrics.LLM_RETRIES.inc(reason='timeout' if isinstance(e, LLMTimeout) else type(e).__name__)
+                self.sleep(backoff)
+                attempt += 1
+                if not self.breaker.allow():
+                    raise CircuitOpen('model circuit open') from e
+                continue
+            self.breaker.record(True)
+            return result
@@ -0,0 +1,234 @@
+# llm_schema.py - typed schemas for the agent's actions
+#
+# One JSON-schema (subset) per action's params. The same definitions are used to
+#   - declare the actions as Gemini function declarations (LLM_OUTPUT_MODE=tools),
+#   - build the response_schema for JSON output mode (LLM_OUTPUT_MODE=json),
+#   - validate whatever the model returned, in every mode, before a tool runs.
+# The validator covers the keywords used here (type, enum, required, properties,
+# minimum/maximum, minLength, pattern); no jsonschema dependency.
+import re
+from typing import Any, Dict, List, Tuple
+
+STATUS = ['pending', 'in_progress', 'done']
+
+ACTION_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    'create_task': {
+        'description': 'Add a new task, assignment, exam or study item.',
+        'type': 'object',
+        'properties': {
+            'title': {'type': 'string', 'minLength': 1, 'description': 'Short task title'},
+            'deadline': {'type': 'string', 'pattern': r'^\d{4}-\d{2}-\d{2}$', 'description': 'Due date, YYYY-MM-DD'},
+            'estimated_hours': {'type': 'number', 'minimum': 0, 'maximum': 1000, 'description': 'Estimated effort in hours'},
+            'priority': {'type': 'string', 'enum': ['low', 'medium', 'high']},
+        },
+        'required': ['title'],
+    },
+    'list_tasks': {
+        'description': 'Show the existing tasks, optionally only those with one status.',
+        'type': 'object',
+        'properties': {
+            'status': {'type': 'string', 'enum': STATUS},
+        },
+        'required': [],
+    },
+    'update_task_status': {
+        'description': 'Mark a task as started, completed or pending again.',
+        'type': 'object',
+        'properties': {
+            'task_id': {'type': 'integer', 'minimum': 1},
+            'new_status': {'type': 'string', 'enum': STATUS},
+        },
+        'required': ['task_id', 'new_status'],
+    },
+    'generate_plan': {
+        'description': 'Build a day-by-day study plan from the open tasks.',
+        'type': 'object',
+        'properties': {
+            'daily_hours': {'type': 'number', 'minimum': 0.25, 'maximum': 24, 'description': 'Study hours per day (default 3)'},
+            'num_days': {'type': 'integer', 'minimum': 1, 'maximum': 60, 'description': 'Days to plan (default 7)'},
+        },
+        'required': [],
+    },
+    'search_tasks': {
+        'description': 'Find tasks by words in their title or details.',
+        'type': 'object',
+        'properties': {
+            'query': {'type': 'string', 'minLength': 1, 'description': 'Keywords only, e.g. DBMS'},
+            'status': {'type': 'string', 'enum': STATUS},
+            'limit': {'type': 'integer', 'minimum': 1, 'maximum': 50},
+            'offset': {'type': 'integer', 'minimum': 0},
+        },
+        'required': ['query'],
+    },
+    'chat_only': {
+        'description': 'Just chatting, motivation or questions that need no task changes or plan.',
+        'type': 'object',
+        'properties': {},
+        'required': [],
+    },
+}
+
+ACTIONS = list(ACTION_SCHEMAS)
+# longest ordered list of actions accepted from one reply
+MAX_ACTIONS = 8
+
+_PY_TYPES = {
+    'string': str,
+    'number': (int, float),
+    'integer': int,
+    'boolean': bool,
+    'object': dict,
+    'array': list,
+}
+
+
+def validate(schema: Dict[str, Any], value: Any, path: str = 'params') -> List[str]:
+    """Errors for `value` against `schema` ([] when valid)."""
+    errors = []
+    typ = schema.get('type')
+    if typ:
+        expected = _PY_TYPES[typ]
+        # bool is an int subclass; never accept it for numbers
+        if not isinstance(value, expected) or (typ in ('number', 'integer') and isinstance(value, bool)):
+            return [f'{path}: expected {typ}']
+    if 'enum' in schema and value not in schema['enum']:
+        errors.append(f'{path}: must be one of {schema["enum"]}')
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if 'minimum' in schema and value < schema['minimum']:
+            errors.append(f'{path}: must be >= {schema["minimum"]}')
+        if 'maximum' in schema and value > schema['maximum']:
+            errors.append(f'{path}: must be <= {schema["maximum"]}')
+    if isinstance(value, str):
+        if len(value.strip()) < schema.get('minLength', 0):
+            errors.append(f'{path}: must not be empty')
+        if 'pattern' in schema and not re.match(schema['pattern'], value):
+            errors.append(f'{path}: does not match {schema["pattern"]}')
+    if isinstance(value, dict):
+        for name in schema.get('required', []):
+            if value.get(name) is None:
+                errors.append(f'{path}.{name}: required')
+        for name, sub in schema.get('properties', {}).items():
+            if value.get(name) is not None:
+                errors.extend(validate(sub, value[name], f'{path}.{name}'))
+    return errors
+
+
+def _coerce(schema: Dict[str, Any], value: Any) -> Any:
+    """Lossless fixes for common model slips: "3" -> 3.0, 3.0 -> 3 for integers, "High" -> "high"."""
+    typ = schema.get('type')
+    if value is None:
+        return None
+    if typ in ('number', 'integer') and isinstance(value, str):
+        try:
+            value = float(value.strip())
+        except ValueError:
+            return value
+    if typ == 'integer' and isinstance(value, float) and value.is_integer():
+        return int(value)
+    if typ == 'string' and 'enum' in schema and isinstance(value, str):
+        v = value.strip().lower().replace(' ', '_').replace('-', '_')
+        return v if v in schema['enum'] else value
+    return value
+
+
+def check_action(action: Any, params: Any) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Coerce and validate the params for `action`.
+
+    Returns (clean_params, errors). Unknown keys and nulls are dropped.
+    """
+    schema = ACTION_SCHEMAS.get(action) if isinstance(action, str) else None
+    if schema is None:
+        return {}, [f'action: unknown action {action!r}']
+    if not isinstance(params, dict):
+        return {}, ['params: expected object']
+    clean = {}
+    for name, sub in schema['properties'].items():
+        v = _coerce(sub, params.get(name))
+        if v is not None:
+            clean[name] = v
+    return clean, validate(schema, clean)
+
+
+def check_actions(steps: Any) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """check_action() for an ordered list of {action, params} steps."""
+    if not isinstance(steps, list) or not steps:
+        return [], ['actions: expected a non-empty list']
+    if len(steps) > MAX_ACTIONS:
+        return [], [f'actions: at most {MAX_ACTIONS} steps per reply']
+    clean, errors = [], []
+    for i, step in enumerate(steps):
+        if not isinstance(step, dict):
+            errors.append(f'actions[{i}]: expected object')
+            continue
+        action = step.get('action') or 'chat_only'
+        params, errs = check_action(action, step.get('params') or {})
+        errors.extend(f'actions[{i}].{e}' for e in errs)
+        clean.append({'action': action, 'params': params})
+    return clean, errors
+
+
+# ---- Gemini request shapes ----
+
+# keys the Gemini Schema proto understands; the rest are checked locally by validate()
+_GENAI_KEYS = ('description', 'enum', 'format', 'nullable')
+
+
+def _to_genai_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    out = {'type': schema['type'].upper()}
+    for key in _GENAI_KEYS:
+        if key in schema:
+            out[key] = schema[key]
+    if schema.get('properties'):
+        out['properties'] = {k: _to_genai_schema(v) for k, v in schema['properties'].items()}
+        if schema.get('required'):
+            out['required'] = list(schema['required'])
+    if 'items' in schema:
+        out['items'] = _to_genai_schema(schema['items'])
+    return out
+
+
+_MESSAGE_PROP = {'type': 'string', 'description': 'Natural language reply to the user'}
+
+
+def function_declarations() -> List[Dict[str, Any]]:
+    """One declaration per action; each also carries the reply text as `assistant_message`."""
+    decls = []
+    for name, schema in ACTION_SCHEMAS.items():
+        params = {
+            'type': 'object',
+            'properties': {**schema['properties'], 'assistant_message': _MESSAGE_PROP},
+            'required': list(schema['required']) + ['assistant_message'],
+        }
+        decls.append({'name': name, 'description': schema['description'], 'parameters': _to_genai_schema(params)})
+    return decls
+
+
+def response_schema() -> Dict[str, Any]:
+    """
+    {action, params, actions?, assistant_message} for JSON output mode.
+
+    Gemini response schemas have no oneOf, so `params` lists every action's
+    fields as optional; check_action() applies the per-action rules afterwards.
+    `actions` carries an ordered list of steps for compound requests.
+    """
+    union = {}
+    for schema in ACTION_SCHEMAS.values():
+        for name, sub in schema['properties'].items():
+            union.setdefault(name, sub)
+    action = {'type': 'string', 'enum': ACTIONS}
+    params = {'type': 'object', 'properties': union}
+    return _to_genai_schema({
+        'type': 'object',
+        'properties': {
+            'action': action,
+            'params': params,
+            'actions': {
+                'type': 'array',
+                'description': f'Several steps in order (at most {MAX_ACTIONS}) instead of action/params',
+                'items': {'type': 'object', 'properties': {'action': action, 'params': params}, 'required': ['action']},
+            },
+            'assistant_message': _MESSAGE_PROP,
+        },
+        'required': ['assistant_message'],
+    })
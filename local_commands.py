@@ -0,0 +1,98 @@
+# local_commands.py - explicit chat commands understood without the model
+#
+# Used when the model is unavailable: not configured, timing out, or the circuit
+# breaker in llm_resilience.py is open. Recognises the commands the agent
+# advertises in that case and returns the same {action, params} shape the model
+# would, already checked against llm_schema:
+#   add task: title=DBMS assignment, deadline=2025-11-25, hours=3, priority=high
+#   list tasks | list done tasks | show pending tasks
+#   plan | plan: daily_hours=2 num_days=3
+#   done 3 | start 3 | mark task 3 as done
+#   find dbms | search DBMS notes
+import re
+from typing import Any, Dict, Optional
+
+import llm_schema
+
+_ADD_RE = re.compile(r'^\s*(?:add|create|new)\s+task\b\s*[:\-]?\s*(.*)$', re.I | re.S)
+_LIST_RE = re.compile(r'^\s*(?:list|show)\s+(?:my\s+|all\s+)?(pending|in[ _-]progress|done|completed)?\s*tasks?\s*$', re.I)
+_PLAN_RE = re.compile(r'^\s*(?:generate\s+|make\s+|study\s+)?(?:a\s+)?(?:plan|schedule|timetable)\b\s*[:\-]?\s*(.*)$', re.I)
+_STATUS_RE = re.compile(
+    r'^\s*(?:mark\s+)?(?:task\s*)?#?(\d+)\s+(?:as\s+)?(done|completed|finished|started|in[ _-]progress|pending)\s*$'
+    r'|^\s*(done|complete|finish|start|reopen)\s+(?:task\s*)?#?(\d+)\s*$',
+    re.I,
+)
+_SEARCH_RE = re.compile(r'^\s*(?:find|search(?:\s+for)?)\s+(?:my\s+)?(.+?)(?:\s+tasks?)?\s*$', re.I)
+_KV_RE = re.compile(r'([a-z_ ]+?)\s*[=:]\s*([^,;]+?)(?=\s*(?:[,;]|\s[a-z_]+\s*=|$))', re.I)
+
+_STATUS_WORDS = {
+    'done': 'done', 'completed': 'done', 'finished': 'done', 'complete': 'done', 'finish': 'done',
+    'started': 'in_progress', 'start': 'in_progress', 'in_progress': 'in_progress',
+    'pending': 'pending', 'reopen': 'pending',
+}
+_KEY_ALIASES = {'hours': 'estimated_hours', 'estimated hours': 'estimated_hours', 'due': 'deadline', 'name': 'title',
+                'days': 'num_days', 'hours_per_day': 'daily_hours', 'daily hours': 'daily_hours'}
+
+
+def _pairs(text: str) -> Dict[str, str]:
+    out = {}
+    for k, v in _KV_RE.findall(text or ''):
+        k = k.strip().lower()
+        out[_KEY_ALIASES.get(k, k.replace(' ', '_'))] = v.strip()
+    return out
+
+
+def _status(word: str) -> str:
+    return _STATUS_WORDS.get(word.lower().replace(' ', '_').replace('-', '_'), 'pending')
+
+
+def parse_command(text: str) -> Optional[Dict[str, Any]]:
+    """{action, params} for an explicit command, or None when `text` isn't one (or its params are invalid)."""
+    text = (text or '').strip()
+    if not text:
+        return None
+    step = None
+
+    m = _ADD_RE.match(text)
+    if m:
+        rest = m.group(1).strip()
+        params = _pairs(rest) if '=' in rest else ({'title': rest} if rest else {})
+        step = {'action': 'create_task', 'params': params}
+
+    if step is None:
+        m = _LIST_RE.match(text)
+        if m:
+            step = {'action': 'list_tasks', 'params': {'status': _status(m.group(1))} if m.group(1) else {}}
+
+    if step is None:
+        m = _PLAN_RE.match(text)
+        if m:
+            step = {'action': 'generate_plan', 'params': _pairs(m.group(1))}
+
+    if step is None:
+        m = _STATUS_RE.match(text)
+        if m:
+            task_id, word = (m.group(1), m.group(2)) if m.group(1) else (m.group(4), m.group(3))
+            step = {'action': 'update_task_status', 'params': {'task_id': task_id, 'new_status': _status(word)}}
+
+    if step is None:
+        m = _SEARCH_RE.match(text)
+        if m:
+            step = {'action': 'search_tasks', 'params': {'query': m.group(1)}}
+
+    if step is None:
+        return None
+    params, errors = llm_schema.check_action(step['action'], step['params'])
+    if errors:
+        return None
+    return {'action': step['action'], 'params': params}
+
+
+HELP_TEXT = (
+    "You can still use me with explicit commands like:\n"
+    "- add task: title=DBMS assignment, deadline=2025-11-25, hours=3, priority=high\n"
+    "- list tasks\n"
+    "- plan: daily_hours=2 num_days=3\n"
+    "- done 3\n"
+    "- find DBMS\n"
+)
@@ -0,0 +1,405 @@
+# metrics.py - in-process Prometheus metrics (text exposition format 0.0.4)
+#
+# A tiny thread-safe registry (counters, gauges, histograms with labels) so the
+# servers can expose /metrics without extra dependencies. Each process keeps
+# its own registry: with several uvicorn/gunicorn workers, scrape each worker
+# (or run the single-process asgi.py service).
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# seconds; HTTP/SQLite defaults and a wider set for model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _num(v):
+    if v == float('inf'):
+        return '+Inf'
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name}: expected labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_items(items))
+        return lines
+
+    def _render_items(self, items):
+        return [f'{self.name}{_labels(self.labelnames, key)} {_num(v)}' for key, v in items]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def _render_items(self, items):
+        lines = []
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float('inf'),), counts):
+                cumulative += c
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, [("le", _num(bound))])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_num(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {n}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, fn):
+        """Register fn() called before each render (e.g. to refresh derived gauges)."""
+        self._collectors.append(fn)
+
+    def render(self):
+        for fn in list(self._collectors):
+            try:
+                fn()
+            except Exception as e:
+                print('metrics: collector failed:', e)
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for m in metrics:
+            lines.extend(m.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# ---- shared metric families ----
+
+HTTP_LATENCY = REGISTRY.histogram('http_request_duration_seconds', 'HTTP request latency by route', ('app', 'method', 'route', 'status'))
+HTTP_IN_FLIGHT = REGISTRY.gauge('http_requests_in_flight', 'HTTP requests currently being served', ('app',))
+WS_CONNECTIONS = REGISTRY.gauge('websocket_connections', 'Open WebSocket connections', ('app', 'path'))
+WS_MESSAGES = REGISTRY.counter('websocket_messages_total', 'WebSocket messages by direction', ('app', 'path', 'direction'))
+WS_INFLIGHT = REGISTRY.gauge('websocket_requests_in_flight', 'Chat requests running on WebSocket connections')
+WS_REJECTED = REGISTRY.counter('websocket_rejected_total', 'WebSocket connections or requests refused', ('reason',))
+
+LLM_LATENCY = REGISTRY.histogram('llm_request_duration_seconds', 'Model call latency by resulting action', ('action',), LLM_BUCKETS)
+LLM_REQUESTS = REGISTRY.counter('llm_requests_total', 'Model calls by resulting action and outcome', ('action', 'outcome'))
+LLM_TOKENS = REGISTRY.counter('llm_tokens_total', 'Tokens reported by the model API', ('action', 'kind', 'tier'))
+LLM_ROUTES = REGISTRY.counter('llm_routes_total', 'Routing decisions by model tier and reason', ('tier', 'reason'))
+LLM_TIER_LATENCY = REGISTRY.histogram('llm_tier_request_duration_seconds', 'Model call latency by tier and outcome', ('tier', 'outcome'), LLM_BUCKETS)
+LLM_PARSE_FAILURES = REGISTRY.counter('llm_parse_failures_total', 'Model replies rejected before any tool ran', ('mode', 'reason'))
+LLM_WASTED_SECONDS = REGISTRY.counter('llm_wasted_seconds_total', 'Model call time spent on replies that were discarded', ('mode',))
+LLM_RETRIES = REGISTRY.counter('llm_retries_total', 'Model call attempts retried, by error', ('reason',))
+LLM_HEDGED = REGISTRY.counter('llm_hedged_requests_total', 'Hedged duplicate model requests sent / that answered first', ('result',))
+LLM_CIRCUIT_STATE = REGISTRY.gauge('llm_circuit_state', 'Model circuit breaker: 0 closed, 1 open, 2 half-open')
+LLM_FALLBACKS = REGISTRY.counter('llm_fallbacks_total', 'Messages answered by the local command parser instead of the model', ('reason', 'matched'))
+
+CACHE_REQUESTS = REGISTRY.counter('cache_requests_total', 'Cache lookups by result', ('cache', 'result'))
+CACHE_HIT_RATIO = REGISTRY.gauge('cache_hit_ratio', 'Hits / lookups since process start', ('cache',))
+
+SQLITE_LATENCY = REGISTRY.histogram('sqlite_query_duration_seconds', 'SQLite statement execution time', ('db', 'op'))
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def _refresh_cache_ratios():
+    with CACHE_REQUESTS._lock:
+        totals = {}
+        for (cache, result), n in CACHE_REQUESTS._values.items():
+            hits, lookups = totals.get(cache, (0, 0))
+            totals[cache] = (hits + (n if result == 'hit' else 0), lookups + n)
+    for cache, (hits, lookups) in totals.items():
+        CACHE_HIT_RATIO.set(round(hits / lookups, 6) if lookups else 0.0, cache=cache)
+
+
+REGISTRY.add_collector(_refresh_cache_ratios)
+
+
+# ---- SQLite ----
+
+def _op(sql):
+    head = sql.lstrip().split(None, 1)
+    return head[0].upper() if head else 'EMPTY'
+
+
+class TimedCursor:
+    __slots__ = ('_cur', '_db')
+
+    def __init__(self, cur, db):
+        self._cur = cur
+        self._db = db
+
+    def execute(self, sql, *args):
+        t0 = time.perf_counter()
+        try:
+            self._cur.execute(sql, *args)
+            return self
+        finally:
+            SQLITE_LATENCY.observe(time.perf_counter() - t0, db=self._db, op=_op(sql))
+
+    def executemany(self, sql, *args):
+        t0 = time.perf_counter()
+        try:
+            self._cur.executemany(sql, *args)
+            return self
+        finally:
+            SQLITE_LATENCY.observe(time.perf_counter() - t0, db=self._db, op=_op(sql))
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+
+class TimedConnection:
+    """
+    Thin proxy over sqlite3.Connection that records statement timings.
+
+    Everything else (row_factory, in_transaction, commit, `with conn:`) is
+    delegated. `raw` is the wrapped connection.
+    """
+    __slots__ = ('raw', '_db')
+
+    def __init__(self, conn, db):
+        object.__setattr__(self, 'raw', conn)
+        object.__setattr__(self, '_db', db)
+
+    def _timed(self, method, sql, *args):
+        t0 = time.perf_counter()
+        try:
+            return TimedCursor(method(sql, *args), self._db)
+        finally:
+            SQLITE_LATENCY.observe(time.perf_counter() - t0, db=self._db, op=_op(sql))
+
+    def execute(self, sql, *args):
+        return self._timed(self.raw.execute, sql, *args)
+
+    def executemany(self, sql, *args):
+        return self._timed(self.raw.executemany, sql, *args)
+
+    def executescript(self, sql):
+        return self._timed(self.raw.executescript, sql)
+
+    def cursor(self, *args):
+        return TimedCursor(self.raw.cursor(*args), self._db)
+
+    def __enter__(self):
+        self.raw.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self.raw.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.raw, name, value)
+
+
+def timed_connection(conn, db):
+    return TimedConnection(conn, db)
+
+
+# ---- ASGI integration ----
+
+class ASGIMetricsMiddleware:
+    """Per-route latency, in-flight requests and WebSocket connection counts for an ASGI app."""
+
+    def __init__(self, app, app_name='fastapi'):
+        self.app = app
+        self.app_name = app_name
+
+    def _route(self, scope):
+        route = scope.get('route')
+        if route is not None and getattr(route, 'path', None):
+            return route.path
+        # Starlette versions that don't set scope['route']: find the first full match
+        router = getattr(scope.get('app'), 'router', None)
+        try:
+            from starlette.routing import Match
+            for r in getattr(router, 'routes', ()):
+                if r.matches(scope)[0] == Match.FULL:
+                    return getattr(r, 'path', None) or 'unmatched'
+        except Exception:
+            pass
+        return 'unmatched'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'websocket':
+            path = self._route(scope)
+            WS_CONNECTIONS.inc(app=self.app_name, path=path)
+
+            async def counting_receive():
+                message = await receive()
+                if message['type'] == 'websocket.receive':
+                    WS_MESSAGES.inc(app=self.app_name, path=path, direction='in')
+                return message
+
+            async def counting_send(message):
+                if message['type'] == 'websocket.send':
+                    WS_MESSAGES.inc(app=self.app_name, path=path, direction='out')
+                await send(message)
+
+            try:
+                await self.app(scope, counting_receive, counting_send)
+            finally:
+                WS_CONNECTIONS.dec(app=self.app_name, path=path)
+            return
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = {'code': 500}
+
+        async def status_send(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        t0 = time.perf_counter()
+        HTTP_IN_FLIGHT.inc(app=self.app_name)
+        try:
+            await self.app(scope, receive, status_send)
+        finally:
+            HTTP_IN_FLIGHT.dec(app=self.app_name)
+            HTTP_LATENCY.observe(time.perf_counter() - t0, app=self.app_name, method=scope.get('method', ''),
+                                 route=self._route(scope), status=status['code'])
+
+
+# ---- Flask integration ----
+
+def init_flask(app, app_name='flask'):
+    """Record per-route latency and in-flight requests on a Flask app."""
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_t0 = time.perf_counter()
+        HTTP_IN_FLIGHT.inc(app=app_name)
+
+    @app.after_request
+    def _metrics_observe(resp):
+        t0 = g.pop('_metrics_t0', None)
+        if t0 is not None:
+            HTTP_IN_FLIGHT.dec(app=app_name)
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_LATENCY.observe(time.perf_counter() - t0, app=app_name, method=request.method,
+                                 route=route, status=resp.status_code)
+        return resp
+
+    @app.teardown_request
+    def _metrics_teardown(exc=None):
+        # after_request is skipped when a view raises; keep the gauge balanced
+        if g.pop('_metrics_t0', None) is not None:
+            HTTP_IN_FLIGHT.dec(app=app_name)
+
+    return app
@@ -0,0 +1,63 @@
+# model_router.py - choose the model tier for a chat message
+#
+# Cheap heuristics only (regexes, word and history counts; no model call):
+#   fast   explicit task commands, one-line task edits/lookups, short small talk
+#   large  planning, compound requests, long messages or conversations,
+#          references back into the conversation, anything unclassified
+# classify() returns (tier, reason); the reason labels llm_routes_total.
+import re
+from typing import Dict, List, Tuple
+
+import local_commands
+
+FAST, LARGE = 'fast', 'large'
+
+LONG_MESSAGE_CHARS = 400
+LONG_HISTORY_TURNS = 8
+LONG_HISTORY_CHARS = 3000
+
+_PLANNING_RE = re.compile(
+    r'\b(plan|planning|schedule|timetable|roadmap|prioriti[sz]e|organi[sz]e|allocate|'
+    r'revision strategy|study strategy|this week|next week|weekend|semester|until my exam|before my exam)\b',
+    re.I,
+)
+_COMPOUND_RE = re.compile(r'\b(and then|then|after that|also|as well as)\b|;|\n', re.I)
+_TASK_VERB_RE = re.compile(
+    r'^\s*(please\s+)?(add|create|new|list|show|find|search|mark|complete|finish|start|done|'
+    r'set|change|rename|update|delete|remove)\b',
+    re.I,
+)
+_SMALL_TALK_RE = re.compile(
+    r'^\s*(hi|hey|hello|yo|thanks|thank you|thx|ok|okay|cool|great|nice|good (morning|afternoon|evening|night)|'
+    r'bye|see you|how are you|what\'?s up|who are you|lol)\b',
+    re.I,
+)
+# pronouns that point back into the conversation ("move it to friday", "the second one")
+_REFERENCE_RE = re.compile(r'\b(it|that|those|them|this one|that one|the (first|second|third|last|previous) one)\b', re.I)
+
+
+def classify(user_message: str, history: List[Dict[str, str]] = None) -> Tuple[str, str]:
+    """(tier, reason) for one message; reasons are short metric-safe labels."""
+    text = (user_message or '').strip()
+    history = history or []
+    words = len(text.split())
+
+    step = local_commands.parse_command(text)
+    if step is not None and step['action'] != 'generate_plan':
+        return FAST, 'command'
+    if _PLANNING_RE.search(text):
+        return LARGE, 'planning'
+    if len(text) > LONG_MESSAGE_CHARS:
+        return LARGE, 'long_message'
+    history_chars = sum(len(t.get('user', '')) + len(t.get('assistant', '')) for t in history)
+    if len(history) > LONG_HISTORY_TURNS or history_chars > LONG_HISTORY_CHARS:
+        return LARGE, 'long_history'
+    if _TASK_VERB_RE.match(text) and _COMPOUND_RE.search(text):
+        return LARGE, 'compound'
+    if history and _REFERENCE_RE.search(text):
+        return LARGE, 'reference'
+    if _TASK_VERB_RE.match(text) and words <= 25:
+        return FAST, 'task_edit'
+    if _SMALL_TALK_RE.match(text) and words <= 12:
+        return FAST, 'small_talk'
+    return LARGE, 'unclassified'
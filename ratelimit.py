@@ -0,0 +1,97 @@
+# ratelimit.py - per-user token buckets for the LLM-backed chat endpoints
+#
+# Buckets live in a small SQLite file (data/ratelimit.db, WAL) so every worker
+# process - Flask threads, uvicorn workers, the combined asgi.py service -
+# draws from the same balance. Each check is one UPSERT ... RETURNING that
+# refills by elapsed time and spends a token atomically.
+#
+# Two buckets: 'llm' for messages that will reach the model, 'local' for ones
+# answered without it (cached replies, model not configured).
+import math
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1').lower() not in ('0', 'false', 'no')
+RATE_LIMIT_DB = Path(os.getenv('RATE_LIMIT_DB') or Path(__file__).resolve().parent / 'data' / 'ratelimit.db')
+
+# bucket name -> (capacity, refill tokens per second)
+BUCKETS = {
+    'llm': (int(os.getenv('LLM_RATE_BURST', '10')), float(os.getenv('LLM_RATE_PER_MIN', '10')) / 60.0),
+    'local': (int(os.getenv('LOCAL_RATE_BURST', '60')), float(os.getenv('LOCAL_RATE_PER_MIN', '120')) / 60.0),
+}
+# rows idle this long are full again anyway and can be deleted
+IDLE_SECONDS = 3600
+PRUNE_EVERY = 500
+
+_TAKE_SQL = """
+INSERT INTO rate_buckets (key, tokens, updated, allowed) VALUES (:key, :cap - :cost, :now, 1)
+ON CONFLICT(key) DO UPDATE SET
+    allowed = min(:cap, tokens + (:now - updated) * :rate) >= :cost,
+    tokens = min(:cap, tokens + (:now - updated) * :rate)
+             - CASE WHEN min(:cap, tokens + (:now - updated) * :rate) >= :cost THEN :cost ELSE 0 END,
+    updated = :now
+RETURNING tokens, allowed
+"""
+
+
+class RateLimiter:
+    def __init__(self, path=RATE_LIMIT_DB, buckets=None, enabled=RATE_LIMIT_ENABLED):
+        self.path = Path(path)
+        self.buckets = dict(buckets or BUCKETS)
+        self.enabled = enabled
+        self._local = threading.local()
+        self._calls = 0
+
+    def _conn(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(self.path), timeout=2, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS rate_buckets ('
+                ' key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, allowed INTEGER NOT NULL DEFAULT 1'
+                ') WITHOUT ROWID'
+            )
+            self._local.db = db
+        return db
+
+    def take(self, bucket, ident, cost=1):
+        """
+        Spend `cost` tokens from `bucket` for `ident`.
+
+        Returns (allowed, retry_after_seconds). Fails open (allowed) if the
+        limiter database is unavailable.
+        """
+        if not self.enabled or not ident:
+            return True, 0
+        capacity, rate = self.buckets[bucket]
+        cost = min(cost, capacity)
+        now = time.time()
+        try:
+            db = self._conn()
+            tokens, allowed = db.execute(
+                _TAKE_SQL, {'key': f'{bucket}:{ident}', 'cap': capacity, 'rate': rate, 'cost': cost, 'now': now}
+            ).fetchone()
+            self._calls += 1
+            if self._calls % PRUNE_EVERY == 0:
+                db.execute('DELETE FROM rate_buckets WHERE updated < ?', (now - IDLE_SECONDS,))
+        except sqlite3.Error as e:
+            print('ratelimit: check failed, allowing request:', e)
+            return True, 0
+        if allowed:
+            return True, 0
+        retry = math.ceil((cost - tokens) / rate) if rate > 0 else IDLE_SECONDS
+        return False, max(1, retry)
+
+    async def take_async(self, bucket, ident, cost=1):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.take, bucket, ident, cost)
+
+
+LIMITER = RateLimiter()
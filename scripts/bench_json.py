@@ -0,0 +1,80 @@
+"""Benchmark JSON encoding + compression for large task lists.
+
+Compares the stdlib encoder with orjson (when installed) and reports the
+payload size raw / gzip / brotli for a synthetic 10k-task response.
+
+    python scripts/bench_json.py [--tasks 10000] [--repeat 20]
+"""
+import argparse
+import gzip
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import serialization
+
+
+def make_tasks(n):
+    rnd = random.Random(42)
+    prios = ["low", "medium", "high"]
+    statuses = ["pending", "in_progress", "done"]
+    return [
+        {
+            "id": i,
+            "user_email": "student@example.com",
+            "title": f"Task {i}: read chapter {rnd.randint(1, 30)} of DBMS notes",
+            "detail": "Summarise key points and solve the exercises at the end of the chapter.",
+            "priority": rnd.choice(prios),
+            "hours": round(rnd.uniform(0.5, 6), 2),
+            "status": rnd.choice(statuses),
+            "created_at": 1732000000000 + i,
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tasks", type=int, default=10000)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    payload = {"tasks": make_tasks(args.tasks)}
+    encoders = {"stdlib json": lambda: json.dumps(payload).encode("utf-8")}
+    if serialization.ORJSON_AVAILABLE:
+        import orjson
+        encoders["orjson"] = lambda: orjson.dumps(payload)
+
+    print(f"{args.tasks} tasks, best of {args.repeat}")
+    print(f"{'encoder':<14}{'encode ms':>12}{'bytes':>12}")
+    body = b""
+    for name, fn in encoders.items():
+        secs, body = _time(fn, args.repeat)
+        print(f"{name:<14}{secs * 1000:>12.2f}{len(body):>12}")
+
+    print()
+    print(f"{'compression':<14}{'ms':>12}{'bytes':>12}{'ratio':>8}")
+    codecs = {"gzip-6": lambda: gzip.compress(body, compresslevel=serialization.GZIP_LEVEL)}
+    if serialization.BROTLI_AVAILABLE:
+        codecs["brotli-5"] = lambda: serialization.brotli.compress(body, quality=serialization.BROTLI_QUALITY)
+    for name, fn in codecs.items():
+        secs, out = _time(fn, max(1, args.repeat // 4))
+        print(f"{name:<14}{secs * 1000:>12.2f}{len(out):>12}{len(body) / len(out):>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
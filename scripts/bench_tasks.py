@@ -0,0 +1,218 @@
+"""Microbenchmarks for tools.py / storage.py as the task table grows, with a regression gate.
+
+Each size gets a fresh tasks.db in a temp directory, seeded with synthetic
+tasks through storage.save_tasks. Every tool and storage function is then
+timed (median and best of --repeat runs, capped at --max-seconds per
+function), and its peak Python allocation is measured with tracemalloc in a
+separate run. The growth column is the exponent between neighbouring sizes
+(1.0 is linear, about 2.0 is quadratic).
+
+    python scripts/bench_tasks.py --sizes 100,1000,10000 --save data/bench_tasks.json
+    python scripts/bench_tasks.py --sizes 100,1000,10000 --baseline data/bench_tasks.json --threshold 0.25
+    python scripts/bench_tasks.py --sizes 100000,1000000 --repeat 3   # slow: minutes per size
+
+With --baseline, the exit status is 1 when a function got slower than the
+baseline median by more than --threshold (or its peak memory grew by more than
+--mem-threshold). Differences under --min-ms are treated as noise. Compare runs
+from the same machine only.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# exporting spans would only add noise to the timings
+os.environ["TRACE_EXPORT"] = ""
+
+import storage
+import tools
+
+WORDS = ("DBMS", "OS", "networks", "compilers", "algorithms", "statistics", "physics", "thesis", "lab", "project")
+
+
+def make_tasks(n, seed=42):
+    """n synthetic tasks: ~60% pending, 25% in progress, 15% done; deadlines over the next 90 days."""
+    rnd = random.Random(seed)
+    today = date.today()
+    statuses = ["pending"] * 12 + ["in_progress"] * 5 + ["done"] * 3
+    return [
+        {
+            "id": i,
+            "title": f"{rnd.choice(WORDS)} chapter {rnd.randint(1, 30)} revision {i}",
+            "deadline": str(today + timedelta(days=rnd.randint(-5, 90))),
+            "estimated_hours": round(rnd.uniform(0.5, 6), 1),
+            "priority": rnd.choice(("low", "medium", "high")),
+            "status": rnd.choice(statuses),
+            "owner": None,
+            "detail": "Summarise the key points and solve the exercises.",
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def benchmarks(n, rnd):
+    """(name, callable) pairs; writes touch random existing rows so the table size stays ~n."""
+    def pick():
+        return rnd.randint(1, n)
+
+    return [
+        ("tools.list_tasks", lambda: tools.list_tasks()),
+        ("tools.list_tasks(pending)", lambda: tools.list_tasks("pending")),
+        ("tools.generate_plan", lambda: tools.generate_plan(3, 7)),
+        ("tools.get_today_view", lambda: tools.get_today_view(3)),
+        ("tools.search_tasks", lambda: tools.search_tasks("dbms chapter", limit=10)),
+        ("tools.create_task", lambda: tools.create_task("Benchmark task", "2030-01-01", 1, "low")),
+        ("tools.update_task_status", lambda: tools.update_task_status(pick(), rnd.choice(("pending", "in_progress")))),
+        ("storage.load_tasks", storage.load_tasks),
+        ("storage.load_active_tasks", storage.load_active_tasks),
+        ("storage.insert_task", lambda: storage.insert_task({"title": "Benchmark row", "estimated_hours": 1})),
+        ("storage.update_task", lambda: storage.update_task(pick(), priority=rnd.choice(("low", "high")))),
+        ("storage.get_tasks_version", storage.get_tasks_version),
+    ]
+
+
+def _time(fn, repeat, max_seconds):
+    fn()  # warm caches / first-use init_db
+    runs = []
+    start = time.perf_counter()
+    while len(runs) < repeat and (not runs or time.perf_counter() - start < max_seconds):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return runs
+
+
+def _peak_kb(fn):
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def run_size(n, args):
+    with tempfile.TemporaryDirectory(prefix="bench-tasks-") as tmp:
+        storage.DB_PATH = Path(tmp) / "tasks.db"
+        rows = make_tasks(n, args.seed)
+        t0 = time.perf_counter()
+        storage.save_tasks(rows)
+        seed_s = time.perf_counter() - t0
+        del rows
+        results = {"storage.save_tasks(seed)": {"median_ms": round(seed_s * 1000, 3), "min_ms": round(seed_s * 1000, 3), "runs": 1}}
+        rnd = random.Random(args.seed)
+        for name, fn in benchmarks(n, rnd):
+            if args.only and not any(s in name for s in args.only):
+                continue
+            runs = _time(fn, args.repeat, args.max_seconds)
+            results[name] = {
+                "median_ms": round(statistics.median(runs) * 1000, 3),
+                "min_ms": round(min(runs) * 1000, 3),
+                "runs": len(runs),
+                "peak_kb": _peak_kb(fn) if args.memory else None,
+            }
+            print(f"  {name:<28}{results[name]['median_ms']:>12.3f} ms", flush=True)
+    return results
+
+
+def _growth(results, sizes, name, i):
+    if i == 0:
+        return ""
+    a, b = results[str(sizes[i - 1])].get(name), results[str(sizes[i])].get(name)
+    if not a or not b or a["median_ms"] <= 0 or b["median_ms"] <= 0:
+        return ""
+    k = math.log(b["median_ms"] / a["median_ms"]) / math.log(sizes[i] / sizes[i - 1])
+    return f"n^{k:.2f}" + (" !" if k > 1.5 else "")
+
+
+def print_table(report):
+    sizes = report["sizes"]
+    results = report["results"]
+    print()
+    print(f"{'function':<28}{'rows':>10}{'median ms':>12}{'best ms':>12}{'peak KiB':>12}{'growth':>10}")
+    names = list(dict.fromkeys(k for s in sizes for k in results[str(s)]))
+    for name in names:
+        for i, n in enumerate(sizes):
+            r = results[str(n)].get(name)
+            if r is None:
+                continue
+            peak = f"{r['peak_kb']:.1f}" if r.get("peak_kb") is not None else "-"
+            print(f"{name:<28}{n:>10}{r['median_ms']:>12.3f}{r['min_ms']:>12.3f}{peak:>12}{_growth(results, sizes, name, i):>10}")
+
+
+def regressions(report, baseline, threshold, mem_threshold, min_ms):
+    """Human-readable regressions of `report` against `baseline` (same size and function only)."""
+    found = []
+    for size, funcs in report["results"].items():
+        for name, r in funcs.items():
+            b = baseline.get("results", {}).get(size, {}).get(name)
+            if not b or name.endswith("(seed)"):
+                continue
+            now, before = r["median_ms"], b["median_ms"]
+            if before > 0 and now > before * (1 + threshold) and now - before >= min_ms:
+                found.append(f"{name} @ {size} rows: {before:.3f} -> {now:.3f} ms ({(now / before - 1) * 100:+.0f}%)")
+            pk, bpk = r.get("peak_kb"), b.get("peak_kb")
+            if pk is not None and bpk and pk > bpk * (1 + mem_threshold) and pk - bpk >= 64:
+                found.append(f"{name} @ {size} rows: peak {bpk:.0f} -> {pk:.0f} KiB ({(pk / bpk - 1) * 100:+.0f}%)")
+    return found
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default="100,1000,10000", help="comma-separated row counts (up to 1000000)")
+    ap.add_argument("--repeat", type=int, default=20, help="timed runs per function")
+    ap.add_argument("--max-seconds", type=float, default=5, help="stop repeating a function after this long")
+    ap.add_argument("--only", action="append", help="substring filter on function names (repeatable)")
+    ap.add_argument("--no-memory", dest="memory", action="store_false", help="skip tracemalloc peaks")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--save", help="write results as JSON (use as a later --baseline)")
+    ap.add_argument("--baseline", help="earlier --save output to gate against")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed median slowdown, e.g. 0.25 = +25%%")
+    ap.add_argument("--mem-threshold", type=float, default=0.25, help="allowed peak memory growth")
+    ap.add_argument("--min-ms", type=float, default=0.05, help="ignore slowdowns smaller than this")
+    args = ap.parse_args()
+
+    sizes = sorted({int(s) for s in args.sizes.split(",") if s.strip()})
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sizes": sizes,
+        "results": {},
+    }
+    for n in sizes:
+        print(f"{n} rows", flush=True)
+        report["results"][str(n)] = run_size(n, args)
+    print_table(report)
+
+    if args.save:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.save).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print("\nwrote", args.save)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        found = regressions(report, baseline, args.threshold, args.mem_threshold, args.min_ms)
+        print(f"\ncompared with {args.baseline} ({baseline.get('created_at', '?')}):")
+        if found:
+            for line in found:
+                print("  REGRESSION", line)
+            sys.exit(1)
+        print(f"  no regressions over {args.threshold * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
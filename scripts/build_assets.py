@@ -0,0 +1,193 @@
+"""Build fingerprinted, precompressed static assets into web/dist.
+
+    python scripts/build_assets.py [--frame-width 960] [--grid 4x4] [--quality 70]
+
+- images, css and js are written as name.<hash>.ext and served with
+  `Cache-Control: immutable` (see static_assets.py)
+- the Img/male0001..0300.png scroll animation is packed into WebP sprite
+  sheets; other PNG/JPEG images are re-encoded as WebP (needs Pillow)
+- css/js/html/svg get .gz and .br siblings (.br needs the brotli package)
+- HTML pages keep their names (revalidated on every load) with references
+  rewritten to the fingerprinted files
+- manifest.json maps each source path to its built path
+
+Both servers serve web/dist instead of web/ once it exists. Without Pillow
+the frames and images are copied as-is and script.js keeps loading PNGs.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import posixpath
+import re
+import shutil
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import serialization
+import static_assets
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except Exception:
+    Image = None
+    PIL_AVAILABLE = False
+
+WEB = ROOT / "web"
+
+TEXT_EXTS = {".css", ".js", ".html", ".svg"}
+IMAGE_EXTS = {".png", ".jpg", ".jpeg"}
+COPY_EXTS = {".gif", ".webp", ".ico", ".svg", ".woff", ".woff2"}
+COMPRESS_EXTS = {".css", ".js", ".html", ".svg"}
+
+FRAME_RE = re.compile(r"^Img/male(\d{4})\.png$")
+# quoted / url() references to local assets inside html, css and js
+REF_RE = re.compile(r"""(?<=["'(])(?P<ref>[^"'()\s<>]+?\.(?:png|jpe?g|gif|svg|webp|ico|css|js|woff2?))(?=[?#"')])""")
+
+
+def fingerprint(rel, data):
+    stem, ext = posixpath.splitext(rel)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def source_files():
+    skip = {static_assets.DIST_DIRNAME, "__pycache__"}
+    for path in sorted(WEB.rglob("*")):
+        rel = path.relative_to(WEB).as_posix()
+        if not path.is_file() or rel.split("/")[0] in skip:
+            continue
+        ext = path.suffix.lower()
+        if ext in TEXT_EXTS | IMAGE_EXTS | COPY_EXTS:
+            yield rel, ext
+
+
+def rewrite_refs(text, rel, manifest):
+    base = posixpath.dirname(rel)
+
+    def repl(m):
+        ref = m.group("ref")
+        if ref.startswith(("http:", "https:", "//", "data:")):
+            return ref
+        key = posixpath.normpath(ref.lstrip("/") if ref.startswith("/") else posixpath.join(base, ref))
+        built = manifest.get(key)
+        if not built:
+            return ref
+        return "/" + built if ref.startswith("/") else posixpath.relpath(built, base or ".")
+
+    return REF_RE.sub(repl, text)
+
+
+def write(out, rel, data):
+    path = out / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    if posixpath.splitext(rel)[1].lower() in COMPRESS_EXTS:
+        gz = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(gz) < len(data):
+            path.with_name(path.name + ".gz").write_bytes(gz)
+        if serialization.BROTLI_AVAILABLE:
+            br = serialization.brotli.compress(data, quality=11)
+            if len(br) < len(data):
+                path.with_name(path.name + ".br").write_bytes(br)
+
+
+def encode_webp(img, quality):
+    import io
+    buf = io.BytesIO()
+    img.save(buf, "WEBP", quality=quality, method=6)
+    return buf.getvalue()
+
+
+def build_frames(frames, out, args):
+    """Pack the animation frames into WebP sprite sheets; returns the frames manifest entry."""
+    cols, rows = (int(x) for x in args.grid.lower().split("x"))
+    with Image.open(WEB / frames[0]) as first:
+        width = args.frame_width
+        height = round(first.height * width / first.width)
+    sheets = []
+    per_sheet = cols * rows
+    for start in range(0, len(frames), per_sheet):
+        chunk = frames[start:start + per_sheet]
+        sheet = Image.new("RGB", (cols * width, rows * height))
+        for i, rel in enumerate(chunk):
+            with Image.open(WEB / rel) as frame:
+                tile = frame.convert("RGBA").convert("RGB").resize((width, height), Image.LANCZOS)
+            sheet.paste(tile, ((i % cols) * width, (i // cols) * height))
+        data = encode_webp(sheet, args.quality)
+        built = fingerprint(f"Img/frames/male-sheet-{start // per_sheet:02d}.webp", data)
+        write(out, built, data)
+        sheets.append(built)
+    return {"count": len(frames), "width": width, "height": height, "cols": cols, "rows": rows, "sheets": sheets}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frame-width", type=int, default=960)
+    ap.add_argument("--grid", default="4x4", help="frames per sprite sheet, COLSxROWS")
+    ap.add_argument("--quality", type=int, default=70, help="WebP quality for sheets and images")
+    args = ap.parse_args()
+
+    dist = WEB / static_assets.DIST_DIRNAME
+    out = WEB / (static_assets.DIST_DIRNAME + ".tmp")
+    shutil.rmtree(out, ignore_errors=True)
+
+    files = list(source_files())
+    frames = [rel for rel, _ in files if FRAME_RE.match(rel)]
+    manifest = {}
+    src_bytes = sum((WEB / rel).stat().st_size for rel, _ in files)
+
+    frames_entry = None
+    if frames and PIL_AVAILABLE:
+        frames_entry = build_frames(frames, out, args)
+    else:
+        # no Pillow: copy the frames unhashed so script.js's PNG fallback still works
+        for rel in frames:
+            write(out, rel, (WEB / rel).read_bytes())
+
+    # binary assets first, then css/js (which may reference them), then html
+    order = {**{e: 0 for e in IMAGE_EXTS | COPY_EXTS}, ".css": 1, ".js": 2, ".html": 3}
+    for rel, ext in sorted(files, key=lambda f: order[f[1]]):
+        if rel in frames:
+            continue
+        data = (WEB / rel).read_bytes()
+        if ext in IMAGE_EXTS and PIL_AVAILABLE:
+            with Image.open(WEB / rel) as img:
+                img = img.convert("RGBA") if img.mode in ("P", "LA", "RGBA") else img.convert("RGB")
+                data = encode_webp(img, args.quality)
+            built = fingerprint(posixpath.splitext(rel)[0] + ".webp", data)
+        elif ext in TEXT_EXTS:
+            source = data.decode("utf-8")
+            text = rewrite_refs(source, rel, manifest)
+            if ext == ".html" and frames_entry and "script.js" in source:
+                inline = "<script>window.__ASSETS=" + json.dumps({"frames": frames_entry}) + ";</script>"
+                text = text.replace("</head>", inline + "\n</head>", 1)
+            data = text.encode("utf-8")
+            built = rel if ext == ".html" else fingerprint(rel, data)
+        else:
+            built = fingerprint(rel, data)
+        write(out, built, data)
+        manifest[rel] = built
+
+    (out / static_assets.MANIFEST_NAME).write_text(
+        json.dumps({"files": manifest, "frames": frames_entry}, indent=2), encoding="utf-8"
+    )
+    shutil.rmtree(dist, ignore_errors=True)
+    out.rename(dist)
+
+    built_files = [p for p in dist.rglob("*") if p.is_file() and p.suffix not in (".gz", ".br")]
+    out_bytes = sum(p.stat().st_size for p in built_files)
+    print(f"{len(files)} source files, {src_bytes / 1e6:.1f} MB -> {len(built_files)} built files, {out_bytes / 1e6:.1f} MB")
+    if frames:
+        how = f"{len(frames_entry['sheets'])} WebP sheets" if frames_entry else "copied as PNG (install Pillow to pack)"
+        print(f"animation: {len(frames)} frames -> {how}")
+    if not serialization.BROTLI_AVAILABLE:
+        print("brotli not installed: only .gz variants were written")
+    print(f"wrote {dist}")
+
+
+if __name__ == "__main__":
+    main()
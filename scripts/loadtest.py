@@ -0,0 +1,387 @@
+"""Load generator for the chat and task endpoints, with a percentile report.
+
+Drives a weighted mix of scenarios against a running server (asgi.py serves
+every route; app.py or web/server.py alone serve a subset). Prefer the fake
+model and no rate limits, so the numbers measure the servers, not Gemini:
+
+    LLM_PROVIDER=fake RATE_LIMIT_ENABLED=0 uvicorn asgi:app --port 8000
+    python scripts/loadtest.py --url http://127.0.0.1:8000 --duration 30 --concurrency 20
+    python scripts/loadtest.py --rate 50 --mix chat=2,ws_chat=2,tasks_list=4,tasks_create=1,tasks_update=1 \\
+        --json data/loadtest.json --markdown data/loadtest.md --baseline data/loadtest-main.json
+
+Scenarios: chat (POST /api/chat), message (POST /api/message), ws_chat (one
+request/reply on a pooled /ws/chat socket), tasks_list (GET /api/tasks),
+tasks_create (POST /api/tasks), tasks_update (PATCH /api/tasks/<id>).
+
+Without --rate, --concurrency workers each send the next request as soon as the
+last one finishes (closed loop). With --rate, requests start on a Poisson
+schedule (open loop). Latency is then measured from the scheduled start, so
+queueing behind a slow server is counted instead of hidden. At most
+--concurrency requests are in flight either way.
+
+Reports p50/p95/p99/max latency, throughput and errors per scenario. ws_chat
+also reports time to the first frame as ws_chat.first_frame. Needs httpx, plus
+websockets for ws_chat (both in requirements.txt).
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+SCENARIOS = ("chat", "message", "ws_chat", "tasks_list", "tasks_create", "tasks_update")
+DEFAULT_MIX = "chat=3,ws_chat=2,tasks_list=4,tasks_create=1,tasks_update=1"
+
+# a spread of the intents the router and caches distinguish
+MESSAGES = [
+    "hi",
+    "thanks!",
+    "list tasks",
+    "list pending tasks",
+    "add task: title=Load test {n}, deadline=2030-01-01, hours=1, priority=low",
+    "done {task}",
+    "find dbms",
+    "plan: daily_hours=2 num_days=3",
+    "Please create a 3-day study plan with 2 hours/day",
+    "How should I revise for the DBMS exam {n}?",
+    "What is the difference between a process and a thread?",
+    "add a task to read chapter {n} of the OS book and then list my tasks",
+]
+
+
+def parse_mix(text):
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise SystemExit("empty --mix")
+    return mix
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list (None when empty)."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Stats:
+    def __init__(self):
+        self.latency = defaultdict(list)   # scenario -> seconds (successful requests)
+        self.errors = defaultdict(Counter)  # scenario -> {kind: n}
+        self.recording = False
+
+    def ok(self, name, seconds):
+        if self.recording:
+            self.latency[name].append(seconds)
+
+    def error(self, name, kind):
+        if self.recording:
+            self.errors[name][kind] += 1
+
+    def report(self, elapsed):
+        scenarios = {}
+        for name in sorted(set(self.latency) | set(self.errors)):
+            lat = sorted(self.latency[name])
+            errors = dict(self.errors[name])
+            count = len(lat) + sum(errors.values())
+
+            def ms(v):
+                return None if v is None else round(v * 1000, 2)
+
+            scenarios[name] = {
+                "requests": count,
+                "ok": len(lat),
+                "errors": errors,
+                "error_rate": round(sum(errors.values()) / count, 4) if count else 0.0,
+                "throughput_rps": round(len(lat) / elapsed, 2) if elapsed else 0.0,
+                "mean_ms": ms(sum(lat) / len(lat)) if lat else None,
+                "p50_ms": ms(percentile(lat, 0.50)),
+                "p95_ms": ms(percentile(lat, 0.95)),
+                "p99_ms": ms(percentile(lat, 0.99)),
+                "max_ms": ms(lat[-1]) if lat else None,
+            }
+        # ws_chat.first_frame duplicates ws_chat requests, so it is left out of the totals
+        real = [s for n, s in scenarios.items() if "." not in n]
+        requests = sum(s["requests"] for s in real)
+        failed = sum(sum(s["errors"].values()) for s in real)
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "totals": {
+                "requests": requests,
+                "ok": requests - failed,
+                "errors": failed,
+                "error_rate": round(failed / requests, 4) if requests else 0.0,
+                "throughput_rps": round((requests - failed) / elapsed, 2) if elapsed else 0.0,
+            },
+            "scenarios": scenarios,
+        }
+
+
+class WsPool:
+    """Idle /ws/chat sockets; each request borrows one, so one request is in flight per socket."""
+
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.idle = []
+        self.all = []
+
+    async def acquire(self):
+        if self.idle:
+            return self.idle.pop()
+        ws = await asyncio.wait_for(websockets.connect(self.url, max_size=None), self.timeout)
+        self.all.append(ws)
+        return ws
+
+    def release(self, ws, healthy):
+        if healthy:
+            self.idle.append(ws)
+        else:
+            self.all.remove(ws)
+            asyncio.ensure_future(ws.close())
+
+    async def close(self):
+        await asyncio.gather(*(ws.close() for ws in self.all), return_exceptions=True)
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.mix = parse_mix(args.mix)
+        self.names = list(self.mix)
+        self.weights = [self.mix[n] for n in self.names]
+        self.users = [f"loadtest-{i}@example.com" for i in range(args.users)]
+        self.task_ids = []
+        self.seq = 0
+        self.stats = Stats()
+        ws_url = args.url.replace("http://", "ws://", 1).replace("https://", "wss://", 1).rstrip("/")
+        self.ws_pools = {}
+        self.ws_base = ws_url + "/ws/chat"
+
+    def _message(self):
+        self.seq += 1
+        text = self.rng.choice(MESSAGES)
+        task = self.rng.choice(self.task_ids) if self.task_ids else 1
+        return text.replace("{n}", str(self.seq % 50)).replace("{task}", str(task))
+
+    def _ws_pool(self, user):
+        pool = self.ws_pools.get(user)
+        if pool is None:
+            pool = self.ws_pools[user] = WsPool(f"{self.ws_base}?user={user}", self.args.timeout)
+        return pool
+
+    async def _http(self, client, name, method, path, **kwargs):
+        resp = await client.request(method, path, **kwargs)
+        if resp.status_code >= 400:
+            return f"http_{resp.status_code}"
+        if name in ("chat", "message") and "error" in resp.json():
+            return "agent_error"
+        if name == "tasks_create":
+            task = resp.json().get("task") or {}
+            if task.get("id") is not None:
+                self.task_ids.append(task["id"])
+                del self.task_ids[:-1000]
+        return None
+
+    async def _ws_chat(self, user, start):
+        pool = self._ws_pool(user)
+        ws = await pool.acquire()
+        healthy = False
+        try:
+            rid = f"lt{self.seq}-{self.rng.randrange(1 << 30)}"
+            await ws.send(json.dumps({"id": rid, "message": self._message()}))
+            first = None
+            while True:
+                frame = json.loads(await ws.recv())
+                if frame.get("type") == "ping":
+                    await ws.send(json.dumps({"type": "pong", "ts": frame.get("ts")}))
+                    continue
+                if frame.get("id") != rid:
+                    continue
+                if first is None:
+                    first = time.perf_counter()
+                    self.stats.ok("ws_chat.first_frame", first - start)
+                if "error" in frame:
+                    healthy = True
+                    return "rate_limited" if frame["error"] == "rate_limited" else "agent_error"
+                if "reply" in frame:
+                    healthy = True
+                    return None
+        finally:
+            pool.release(ws, healthy)
+
+    async def one(self, client, name, start):
+        user = self.rng.choice(self.users)
+        try:
+            if name == "chat":
+                call = self._http(client, name, "POST", "/api/chat", json={"message": self._message(), "user": user})
+            elif name == "message":
+                call = self._http(client, name, "POST", "/api/message", json={"message": self._message()})
+            elif name == "ws_chat":
+                call = self._ws_chat(user, start)
+            elif name == "tasks_list":
+                call = self._http(client, name, "GET", "/api/tasks", params={"user": user})
+            elif name == "tasks_create":
+                call = self._http(client, name, "POST", "/api/tasks", json={
+                    "user": user, "title": f"Load test task {self.seq}", "priority": "low", "hours": 1})
+            elif not self.task_ids:
+                # nothing to update yet: create one instead so the mix keeps its write share
+                name = "tasks_create"
+                call = self._http(client, name, "POST", "/api/tasks", json={"user": user, "title": "Load test task"})
+            else:
+                status = self.rng.choice(("pending", "in_progress", "done"))
+                call = self._http(client, name, "PATCH", f"/api/tasks/{self.rng.choice(self.task_ids)}",
+                                  json={"status": status})
+            failure = await asyncio.wait_for(call, self.args.timeout)
+        except asyncio.TimeoutError:
+            failure = "timeout"
+        except Exception as e:
+            failure = type(e).__name__
+        if failure == "http_429":
+            failure = "rate_limited"
+        if failure:
+            self.stats.error(name, failure)
+        else:
+            self.stats.ok(name, time.perf_counter() - start)
+
+    def _pick(self):
+        return self.rng.choices(self.names, self.weights)[0]
+
+    async def _closed_loop(self, client, stop_at):
+        async def worker():
+            while time.perf_counter() < stop_at:
+                await self.one(client, self._pick(), time.perf_counter())
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+
+    async def _open_loop(self, client, stop_at):
+        slots = asyncio.Semaphore(self.args.concurrency)
+        pending = set()
+
+        async def fire(name, scheduled):
+            async with slots:
+                await self.one(client, name, scheduled)
+
+        next_at = time.perf_counter()
+        while next_at < stop_at:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(fire(self._pick(), next_at))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            next_at += self.rng.expovariate(self.args.rate)
+        if pending:
+            await asyncio.wait(pending)
+
+    async def run(self):
+        args = self.args
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+            loop = self._open_loop if args.rate else self._closed_loop
+            if args.warmup > 0:
+                await loop(client, time.perf_counter() + args.warmup)
+            self.stats.recording = True
+            t0 = time.perf_counter()
+            await loop(client, t0 + args.duration)
+            elapsed = time.perf_counter() - t0
+        for pool in self.ws_pools.values():
+            await pool.close()
+        report = self.stats.report(elapsed)
+        report["config"] = {
+            "url": args.url, "mode": f"open ({args.rate}/s)" if args.rate else "closed",
+            "concurrency": args.concurrency, "duration_s": args.duration, "warmup_s": args.warmup,
+            "users": args.users, "mix": self.mix, "timeout_s": args.timeout, "seed": args.seed,
+        }
+        report["started_at"] = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - elapsed))
+        return report
+
+
+def _delta(now, before):
+    if now is None or not before:
+        return ""
+    return f" ({(now - before) / before * 100:+.0f}%)"
+
+
+def to_markdown(report, baseline=None):
+    cfg, tot = report["config"], report["totals"]
+    base = (baseline or {}).get("scenarios", {})
+    lines = [
+        f"## Load test: {cfg['url']}",
+        "",
+        f"{cfg['mode']} loop, concurrency {cfg['concurrency']}, {report['elapsed_s']}s measured "
+        f"(+{cfg['warmup_s']}s warmup), {cfg['users']} users, started {report['started_at']}",
+        "",
+        f"**{tot['requests']} requests, {tot['throughput_rps']} ok/s, error rate {tot['error_rate'] * 100:.2f}%**",
+        "",
+        "| scenario | requests | ok/s | p50 ms | p95 ms | p99 ms | max ms | errors |",
+        "|---|---:|---:|---:|---:|---:|---:|---|",
+    ]
+    for name, s in report["scenarios"].items():
+        b = base.get(name, {})
+        errors = ", ".join(f"{k}: {v}" for k, v in sorted(s["errors"].items())) or "-"
+        cells = [
+            name, str(s["requests"]),
+            f"{s['throughput_rps']}{_delta(s['throughput_rps'], b.get('throughput_rps'))}",
+            *(f"{s[k]}{_delta(s[k], b.get(k))}" if s[k] is not None else "-"
+              for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms")),
+            errors,
+        ]
+        lines.append("| " + " | ".join(cells) + " |")
+    if baseline:
+        lines += ["", f"Changes in brackets are relative to the baseline from {baseline.get('started_at', '?')}."]
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--duration", type=float, default=30, help="measured seconds")
+    ap.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before the run")
+    ap.add_argument("--concurrency", type=int, default=20, help="workers, or max in flight with --rate")
+    ap.add_argument("--rate", type=float, default=0, help="open loop: mean requests per second")
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="scenario=weight,...")
+    ap.add_argument("--users", type=int, default=10, help="distinct synthetic users")
+    ap.add_argument("--timeout", type=float, default=30, help="per-request timeout (s)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="write the report as JSON here")
+    ap.add_argument("--markdown", help="write the Markdown report here")
+    ap.add_argument("--baseline", help="earlier --json report to compare against")
+    args = ap.parse_args()
+
+    if httpx is None:
+        raise SystemExit("scripts/loadtest.py needs httpx (pip install httpx)")
+    if "ws_chat" in parse_mix(args.mix) and websockets is None:
+        raise SystemExit("the ws_chat scenario needs websockets (pip install websockets), or drop it from --mix")
+
+    report = asyncio.run(LoadTest(args).run())
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")) if args.baseline else None
+    markdown = to_markdown(report, baseline)
+    print(markdown)
+    for path, text in ((args.json, json.dumps(report, indent=2)), (args.markdown, markdown)):
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            Path(path).write_text(text, encoding="utf-8")
+            print("wrote", path)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,9 @@ import pathlib
 repo_root = pathlib.Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(repo_root))
 
-# Ensure agent won't raise at import due to missing API key
-os.environ.setdefault("GOOGLE_API_KEY", "DUMMY_KEY_FOR_LOCAL_TEST")
+# Answer from the offline fake model (llm_fake.py) instead of the network
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY", "fixed:0.05")
 
 try:
     agent = importlib.import_module("agent")
@@ -17,18 +18,6 @@ except Exception as e:
     sys.exit(1)
 
 
-def _stub_call_llm(user_message, history):
-    # Simulate the LLM returning a generate_plan action
-    return {
-        "action": "generate_plan",
-        "params": {"daily_hours": 2, "num_days": 3},
-        "assistant_message": "Here's a generated study plan:",
-    }
-
-
-# Monkeypatch the LLM caller to avoid external network calls
-agent._call_llm = _stub_call_llm
-
 
 def main():
     prompt = "Please create a 3-day study plan with 2 hours/day"
@@ -0,0 +1,206 @@
+import random
+import sys
+import threading
+import time
+
+# Ensure repo root is on path
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import metrics
+from llm_fake import DeadlineExceeded, FakeModel, ServiceUnavailable
+from llm_resilience import CircuitBreaker, CircuitOpen, LLMTimeout, ResilientCaller
+
+
+class FakeClock:
+    """Shared fake time: the caller's backoff sleeps and the fake model's latency advance it instantly."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.backoffs = []
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            return self.now
+
+    def advance(self, seconds):
+        with self.lock:
+            self.now += seconds
+
+    def sleep(self, seconds):
+        self.backoffs.append(seconds)
+        self.advance(seconds)
+
+
+def make(clock, sequence=(), retries=2, timeout=10, deadline=60, breaker=None, **model_kwargs):
+    model = FakeModel(latency='fixed:0.5', sleep=clock.advance, seed=model_kwargs.pop('seed', 1), **model_kwargs)
+    model.sequence = [dict(r) for r in sequence]
+    caller = ResilientCaller(timeout=timeout, deadline=deadline, retries=retries, retry_base=0.5, retry_max=4,
+                             hedge=False, breaker=breaker or CircuitBreaker(min_calls=1000, clock=clock),
+                             sleep=clock.sleep, clock=clock)
+    return model, caller
+
+
+def call_with(model):
+    return lambda timeout: model.generate_content('User: hello\nAssistant:', request_options={'timeout': timeout})
+
+
+OK = {'action': 'chat_only', 'params': {}, 'assistant_message': 'ok'}
+
+
+def test_retry_backoff():
+    clock = FakeClock()
+    model, caller = make(clock, sequence=[{'error': 'unavailable'}, {'error': 'unavailable'}, OK], retries=2)
+    before = metrics.LLM_RETRIES.get(reason='ServiceUnavailable')
+    random.seed(3)
+    resp = caller(call_with(model))
+    backoffs = clock.backoffs
+    print('retry/backoff: calls', model.calls, 'backoffs', [round(b, 3) for b in backoffs])
+    assert '"ok"' in resp.text
+    assert model.calls == 3
+    assert metrics.LLM_RETRIES.get(reason='ServiceUnavailable') - before == 2
+    # full jitter: attempt n sleeps within [0, min(retry_max, retry_base * 2^n)]
+    assert len(backoffs) == 2 and 0 <= backoffs[0] <= 0.5 and 0 <= backoffs[1] <= 1.0
+
+
+def test_retries_exhausted():
+    clock = FakeClock()
+    model, caller = make(clock, sequence=[{'error': 'unavailable'}] * 3, retries=1)
+    try:
+        caller(call_with(model))
+        raise AssertionError('expected ServiceUnavailable')
+    except ServiceUnavailable:
+        pass
+    print('retries exhausted: calls', model.calls)
+    assert model.calls == 2
+
+
+def test_non_retryable():
+    clock = FakeClock()
+    _, caller = make(clock, retries=3)
+    calls = []
+
+    def bad(timeout):
+        calls.append(timeout)
+        raise ValueError('bad request')
+
+    try:
+        caller(bad)
+        raise AssertionError('expected ValueError')
+    except ValueError:
+        pass
+    print('non-retryable: calls', len(calls))
+    assert len(calls) == 1
+
+
+def test_deadline_exhausted():
+    # every call hangs until its timeout; retries are plentiful, the 25s deadline is not
+    clock = FakeClock()
+    model, caller = make(clock, retries=10, timeout=10, deadline=25, timeout_rate=1.0)
+    start = clock()
+    try:
+        caller(call_with(model))
+        raise AssertionError('expected a timeout')
+    except (DeadlineExceeded, LLMTimeout):
+        pass
+    elapsed = clock() - start
+    print(f'deadline: calls {model.calls}, fake elapsed {elapsed:.2f}s')
+    assert elapsed <= 25
+    assert 2 <= model.calls <= 4
+
+
+def test_seeded_error_rate():
+    # a seeded fault rate gives the same draws, hence the same retry count, every run
+    runs = []
+    for _ in range(2):
+        clock = FakeClock()
+        model, caller = make(clock, retries=3, error_rate=0.3, seed=11)
+        before = metrics.LLM_RETRIES.get(reason='ServiceUnavailable')
+        ok = 0
+        for _ in range(30):
+            try:
+                caller(call_with(model))
+                ok += 1
+            except ServiceUnavailable:
+                pass
+        retries = metrics.LLM_RETRIES.get(reason='ServiceUnavailable') - before
+        runs.append((model.calls, retries, ok))
+        # every attempt after the first of each request was a counted retry
+        assert retries == model.calls - 30
+    print('seeded error_rate: (calls, retries, ok) per run', runs)
+    assert runs[0] == runs[1]
+    assert runs[0][2] >= 28
+
+
+def test_hedging():
+    # real time here: the hedge fires from a wait() on the first request
+    slow = FakeModel(latency='fixed:0.5', seed=1)
+    fast = FakeModel(latency='fixed:0', seed=1)
+    order = iter([slow, fast])
+    caller = ResilientCaller(timeout=5, deadline=10, retries=0, hedge=True, hedge_delay=0.05,
+                             breaker=CircuitBreaker(min_calls=1000))
+    sent, won = metrics.LLM_HEDGED.get(result='sent'), metrics.LLM_HEDGED.get(result='won')
+    t0 = time.monotonic()
+    caller(lambda timeout: next(order).generate_content('User: hi\nAssistant:', request_options={'timeout': timeout}))
+    elapsed = time.monotonic() - t0
+    print(f'hedging: answered in {elapsed:.3f}s')
+    assert metrics.LLM_HEDGED.get(result='sent') - sent == 1
+    assert metrics.LLM_HEDGED.get(result='won') - won == 1
+    assert elapsed < 0.4
+
+
+def test_breaker_transitions():
+    clock = FakeClock()
+    breaker = CircuitBreaker(error_rate=0.5, min_calls=4, window=60, cooldown=30, clock=clock)
+    model, caller = make(clock, retries=0, breaker=breaker, error_rate=1.0)
+    for _ in range(4):
+        try:
+            caller(call_with(model))
+        except ServiceUnavailable:
+            pass
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.would_allow()
+    calls = model.calls
+    try:
+        caller(call_with(model))
+        raise AssertionError('expected CircuitOpen')
+    except CircuitOpen:
+        pass
+    assert model.calls == calls  # failed fast, the model was not called
+    seen = [breaker.state]
+
+    # cooldown over: would_allow says yes without using up the half-open probe
+    clock.advance(30)
+    assert breaker.would_allow() and breaker.state == CircuitBreaker.OPEN
+    # the probe fails: straight back to open
+    try:
+        caller(call_with(model))
+    except ServiceUnavailable:
+        pass
+    seen.append(breaker.state)
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.would_allow()
+
+    # next cooldown: one probe at a time while half-open, and a good one closes the circuit
+    clock.advance(30)
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    seen.append(breaker.state)
+    assert not breaker.would_allow() and not breaker.allow()
+    breaker.record(True)
+    seen.append(breaker.state)
+    model.error_rate = 0
+    caller(call_with(model))
+    print('breaker:', ' -> '.join(seen))
+    assert seen == ['open', 'open', 'half_open', 'closed']
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.would_allow()
+
+
+if __name__ == '__main__':
+    test_retry_backoff()
+    test_retries_exhausted()
+    test_non_retryable()
+    test_deadline_exhausted()
+    test_seeded_error_rate()
+    test_hedging()
+    test_breaker_transitions()
+    print('all resilience checks passed')
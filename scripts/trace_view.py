@@ -0,0 +1,177 @@
+"""Print span trees and critical-path breakdowns from exported traces.
+
+Reads the TRACE_EXPORT=jsonl (one span per line) or TRACE_EXPORT=otlp
+(one OTLP/JSON request per line) file written by tracing.py.
+
+    python scripts/trace_view.py [data/traces.jsonl] [--last 5] [--slowest 3] [--trace ID] [--summary]
+
+The critical path is built backwards from each span's end: the child that
+finished last, then the last child that finished before it started, and so
+on, recursively. Each step shows its self time (duration minus the critical
+children), so the column adds up to the root's wall-clock time.
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def _otlp_spans(doc):
+    for rs in doc.get("resourceSpans", []):
+        for ss in rs.get("scopeSpans", []):
+            for s in ss.get("spans", []):
+                start = int(s["startTimeUnixNano"]) / 1e9
+                end = int(s["endTimeUnixNano"]) / 1e9
+                attrs = {a["key"]: next(iter(a["value"].values()), None) for a in s.get("attributes", [])}
+                yield {
+                    "trace_id": s["traceId"],
+                    "span_id": s["spanId"],
+                    "parent_id": s.get("parentSpanId") or None,
+                    "name": s["name"],
+                    "start": start,
+                    "duration_ms": (end - start) * 1000,
+                    "status": "error" if s.get("status", {}).get("code") == 2 else "ok",
+                    "error": s.get("status", {}).get("message"),
+                    "attrs": attrs,
+                }
+
+
+def load(path):
+    traces = defaultdict(list)
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                doc = json.loads(line)
+            except ValueError:
+                continue
+            spans = _otlp_spans(doc) if "resourceSpans" in doc else [doc]
+            for s in spans:
+                traces[s["trace_id"]].append(s)
+    return traces
+
+
+def _tree(spans):
+    ids = {s["span_id"] for s in spans}
+    children = defaultdict(list)
+    roots = []
+    for s in sorted(spans, key=lambda s: s["start"]):
+        # a remote parent (from traceparent) isn't in the file: treat as root
+        if s.get("parent_id") in ids:
+            children[s["parent_id"]].append(s)
+        else:
+            roots.append(s)
+    return roots, children
+
+
+def _end(s):
+    return s["start"] + s["duration_ms"] / 1000
+
+
+def critical_path(node, children, depth=0):
+    """[(span, self_ms, depth)] in call order along the critical path under `node`."""
+    chain = []
+    cursor = _end(node)
+    for child in sorted(children.get(node["span_id"], []), key=_end, reverse=True):
+        if _end(child) <= cursor + 1e-6:
+            chain.append(child)
+            cursor = child["start"]
+    chain.reverse()
+    self_ms = max(0.0, node["duration_ms"] - sum(c["duration_ms"] for c in chain))
+    path = [(node, self_ms, depth)]
+    for child in chain:
+        path.extend(critical_path(child, children, depth + 1))
+    return path
+
+
+def _union_ms(spans):
+    ivs = sorted((s["start"], _end(s)) for s in spans)
+    total, cur_s, cur_e = 0.0, None, None
+    for s, e in ivs:
+        if cur_e is None or s > cur_e:
+            if cur_e is not None:
+                total += cur_e - cur_s
+            cur_s, cur_e = s, e
+        else:
+            cur_e = max(cur_e, e)
+    if cur_e is not None:
+        total += cur_e - cur_s
+    return total * 1000
+
+
+def print_trace(trace_id, spans):
+    roots, children = _tree(spans)
+    total = max((_end(s) for s in spans), default=0) - min((s["start"] for s in spans), default=0)
+    print(f"trace {trace_id}  {len(spans)} spans  {total * 1000:.1f} ms")
+
+    def walk(s, depth):
+        flag = "  !" + (s.get("error") or "error") if s.get("status") == "error" else ""
+        attrs = ", ".join(f"{k}={v}" for k, v in (s.get("attrs") or {}).items())
+        print(f"  {'  ' * depth}{s['name']:<{44 - 2 * depth}} {s['duration_ms']:>9.2f} ms  {attrs}{flag}")
+        for c in children.get(s["span_id"], []):
+            walk(c, depth + 1)
+
+    for r in roots:
+        walk(r, 0)
+    for r in roots:
+        path = critical_path(r, children)
+        print("  critical path (self time):")
+        for node, self_ms, depth in path:
+            share = 100 * self_ms / r["duration_ms"] if r["duration_ms"] else 0
+            print(f"    {'  ' * depth}{node['name']:<{44 - 2 * depth}} {self_ms:>9.2f} ms  {share:5.1f}%")
+    print()
+
+
+def print_summary(traces):
+    """Self time per span name across all traces (where time goes on average)."""
+    per_name = defaultdict(list)
+    for spans in traces.values():
+        _, children = _tree(spans)
+        for s in spans:
+            kids = children.get(s["span_id"], [])
+            per_name[s["name"]].append(max(0.0, s["duration_ms"] - (_union_ms(kids) if kids else 0.0)))
+    print(f"{'span':<44}{'count':>7}{'self p50':>11}{'self p95':>11}{'self total':>13}")
+    for name, vals in sorted(per_name.items(), key=lambda kv: -sum(kv[1])):
+        vals.sort()
+        p50 = vals[len(vals) // 2]
+        p95 = vals[min(len(vals) - 1, int(len(vals) * 0.95))]
+        print(f"{name:<44}{len(vals):>7}{p50:>9.2f}ms{p95:>9.2f}ms{sum(vals):>11.1f}ms")
+
+
+def main():
+    import tracing
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("file", nargs="?", default=str(tracing.TRACE_FILE))
+    ap.add_argument("--last", type=int, default=5, help="show the N most recent traces")
+    ap.add_argument("--slowest", type=int, default=0, help="show the N slowest traces instead")
+    ap.add_argument("--trace", help="show a single trace id")
+    ap.add_argument("--summary", action="store_true", help="aggregate self time per span name")
+    args = ap.parse_args()
+
+    if not Path(args.file).exists():
+        sys.exit(f"no trace file at {args.file} (run the server with TRACE_EXPORT=jsonl)")
+    traces = load(args.file)
+    if args.summary:
+        print_summary(traces)
+        return
+    if args.trace:
+        selected = [args.trace] if args.trace in traces else []
+    else:
+        key = (lambda t: -sum(s["duration_ms"] for s in traces[t] if not s.get("parent_id"))) if args.slowest \
+            else (lambda t: -min(s["start"] for s in traces[t]))
+        selected = sorted(traces, key=key)[: args.slowest or args.last]
+    if not selected:
+        sys.exit("no matching traces")
+    for tid in selected:
+        print_trace(tid, traces[tid])
+
+
+if __name__ == "__main__":
+    main()
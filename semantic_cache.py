@@ -0,0 +1,155 @@
+# semantic_cache.py - near-duplicate lookup for chat_only replies
+#
+# RESPONSE_CACHE in agent.py only hits on the exact message (plus recent turns).
+# This cache also catches paraphrases ("how should I study for DBMS?" vs "how do
+# I study DBMS") without an embedding model: each message becomes a sparse,
+# L2-normalised vector of hashed features - content words, adjacent word pairs
+# and character trigrams of each word - and entries are found through a
+# per-scope inverted index, so a lookup only touches entries sharing a feature
+# (well under a millisecond for a few hundred entries per user).
+#
+# Word order is weak in these vectors, so "is 2NF harder than 3NF?" scores
+# 0.92 against "is 3NF harder than 2NF?". Each entry therefore also keeps the
+# ordered entities of its message (tokens with a digit, ALL-CAPS acronyms) and
+# only matches a message with the same sequence.
+#
+# Entries are scoped (one scope per user / client), expire after
+# SEMANTIC_CACHE_TTL and the whole cache is LRU-bounded by SEMANTIC_CACHE_SIZE.
+# The agent only stores and serves chat_only replies; see agent.process_user_message.
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+
+import metrics
+
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE', '1').lower() not in ('0', 'false', 'no')
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.92'))
+SEMANTIC_CACHE_SIZE = int(os.getenv('SEMANTIC_CACHE_SIZE', '5000'))
+SEMANTIC_CACHE_TTL = float(os.getenv('SEMANTIC_CACHE_TTL', '86400'))
+FEATURE_BUCKETS = 1 << 20
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+")
+# filler words that don't change what is being asked; question words and negations are kept
+STOPWORDS = frozenset((
+    'a an the i me my im you your we our to for of in on at by with about into from is are am was were be '
+    'been do does did should would could can will shall may might must please just really so some any this that '
+    'it its and or but if then also get got'
+).split())
+
+
+def _features(text):
+    words = [w for w in _WORD_RE.findall((text or '').lower()) if w not in STOPWORDS]
+    feats = defaultdict(float)
+    for w in words:
+        feats['w:' + w] += 1.0
+        padded = f'^{w}$'
+        for i in range(len(padded) - 2):
+            feats['c:' + padded[i:i + 3]] += 0.3
+    for a, b in zip(words, words[1:]):
+        feats[f'b:{a} {b}'] += 0.5
+    return feats
+
+
+def entities(text):
+    """Ordered numbers / acronyms in `text` ("2NF", "10", "DBMS"), lowercased."""
+    return tuple(t.lower() for t in _TOKEN_RE.findall(text or '')
+                 if any(c.isdigit() for c in t) or (len(t) > 1 and t.isupper()))
+
+
+def vectorize(text):
+    """{bucket: weight} unit vector for `text` (empty dict for no content words)."""
+    vec = defaultdict(float)
+    for f, w in _features(text).items():
+        vec[zlib.crc32(f.encode('utf-8')) & (FEATURE_BUCKETS - 1)] += w
+    norm = math.sqrt(sum(w * w for w in vec.values()))
+    return {k: w / norm for k, w in vec.items()} if norm else {}
+
+
+def similarity(a, b):
+    """Cosine similarity of the two messages' vectors (ignores entities())."""
+    va, vb = vectorize(a), vectorize(b)
+    if len(vb) < len(va):
+        va, vb = vb, va
+    return sum(w * vb.get(k, 0.0) for k, w in va.items())
+
+
+class SemanticCache:
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_SIZE,
+                 ttl=SEMANTIC_CACHE_TTL, enabled=SEMANTIC_CACHE_ENABLED, name='semantic'):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.name = name
+        self.entries = OrderedDict()          # id -> (scope, vec, reply, expires, entities)
+        self.postings = defaultdict(dict)     # (scope, bucket) -> {id: weight}
+        self.lock = threading.Lock()
+        self._next_id = 0
+
+    def _remove(self, eid):
+        scope, vec = self.entries.pop(eid)[:2]
+        for k in vec:
+            plist = self.postings.get((scope, k))
+            if plist is not None:
+                plist.pop(eid, None)
+                if not plist:
+                    del self.postings[(scope, k)]
+
+    def peek(self, scope, text):
+        """Like get() but not counted in the hit/miss metrics."""
+        return self.get(scope, text, record=False)
+
+    def get(self, scope, text, record=True):
+        """Cached reply for the most similar earlier message in `scope`, or None."""
+        if not self.enabled or scope is None:
+            return None
+        vec = vectorize(text)
+        ents = entities(text)
+        reply = None
+        if vec:
+            now = time.time()
+            with self.lock:
+                scores = defaultdict(float)
+                for k, w in vec.items():
+                    plist = self.postings.get((scope, k))
+                    if plist:
+                        for eid, w2 in plist.items():
+                            scores[eid] += w * w2
+                best, best_score = None, self.threshold
+                for eid, score in scores.items():
+                    if score >= best_score and self.entries[eid][4] == ents:
+                        best, best_score = eid, score
+                if best is not None:
+                    if self.entries[best][3] < now:
+                        self._remove(best)
+                    else:
+                        self.entries.move_to_end(best)
+                        reply = self.entries[best][2]
+        if record:
+            metrics.record_cache(self.name, reply is not None)
+        return reply
+
+    def put(self, scope, text, reply):
+        if not self.enabled or scope is None or not reply:
+            return
+        vec = vectorize(text)
+        if not vec:
+            return
+        with self.lock:
+            eid = self._next_id
+            self._next_id += 1
+            self.entries[eid] = (scope, vec, reply, time.time() + self.ttl, entities(text))
+            for k, w in vec.items():
+                self.postings[(scope, k)][eid] = w
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def clear(self, scope=None):
+        with self.lock:
+            for eid in [e for e, v in self.entries.items() if scope is None or v[0] == scope]:
+                self._remove(eid)
@@ -0,0 +1,216 @@
+# serialization.py - fast JSON encoding + response compression shared by both servers
+import gzip
+import json
+import os
+from typing import Any, Optional, Tuple
+
+# Optional fast backends. Fall back to the stdlib when they are not installed.
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except Exception:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except Exception:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+# JSON_BACKEND=stdlib forces the stdlib encoder (useful for benchmarking/debugging)
+JSON_BACKEND = "orjson" if ORJSON_AVAILABLE and os.getenv("JSON_BACKEND", "orjson") != "stdlib" else "stdlib"
+
+# Responses smaller than this are sent as-is; compressing them costs more than it saves.
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _default(o: Any) -> Any:
+    # mirror Flask's lenient default: anything unknown is sent as its string form
+    if hasattr(o, "keys"):
+        return dict(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    return str(o)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Encode `obj` as compact UTF-8 JSON bytes."""
+    if JSON_BACKEND == "orjson":
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    return dumps_bytes(obj).decode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    if JSON_BACKEND == "orjson":
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode("utf-8")
+    return json.loads(data)
+
+
+def parse_accept_encoding(accept_encoding: Optional[str]) -> dict:
+    """Map each coding in an Accept-Encoding header to its q-value."""
+    offered = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip().lower()] = q
+    return offered
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick 'br' or 'gzip' from an Accept-Encoding header (None if neither is acceptable)."""
+    offered = parse_accept_encoding(accept_encoding)
+    if BROTLI_AVAILABLE and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress_body(body: bytes, accept_encoding: Optional[str], min_size: int = COMPRESS_MIN_SIZE) -> Tuple[bytes, Optional[str]]:
+    """Return (body, content_encoding). Bodies under `min_size` are returned unchanged."""
+    if len(body) < min_size:
+        return body, None
+    enc = choose_encoding(accept_encoding)
+    if enc == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if enc == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def _weaken(etag: str) -> str:
+    # a compressed representation is no longer byte-identical to the strong tag
+    return etag if etag.startswith("W/") else "W/" + etag
+
+
+# ---- Flask integration ----
+
+def init_flask(app):
+    """Install the fast JSON provider and JSON response compression on a Flask app."""
+    from flask.json.provider import DefaultJSONProvider
+
+    class FastJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            return dumps(obj)
+
+        def loads(self, s, **kwargs):
+            return loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(dumps_bytes(obj), mimetype="application/json")
+
+    app.json = FastJSONProvider(app)
+
+    @app.after_request
+    def _compress_json(resp):
+        from flask import request
+        if (
+            resp.status_code != 200
+            or resp.direct_passthrough
+            or resp.is_streamed
+            or resp.mimetype != "application/json"
+            or "Content-Encoding" in resp.headers
+        ):
+            return resp
+        body, enc = compress_body(resp.get_data(), request.headers.get("Accept-Encoding"))
+        resp.vary.add("Accept-Encoding")
+        if enc:
+            resp.set_data(body)
+            resp.headers["Content-Encoding"] = enc
+            if resp.headers.get("ETag"):
+                resp.headers["ETag"] = _weaken(resp.headers["ETag"])
+        return resp
+
+    return app
+
+
+# ---- ASGI (FastAPI/Starlette) integration ----
+
+def fast_json_response_class():
+    """Return a Starlette JSONResponse subclass that renders with `dumps_bytes`."""
+    from fastapi.responses import JSONResponse
+
+    class FastJSONResponse(JSONResponse):
+        def render(self, content: Any) -> bytes:
+            return dumps_bytes(content)
+
+    return FastJSONResponse
+
+
+class JSONCompressionMiddleware:
+    """ASGI middleware compressing single-body JSON responses above COMPRESS_MIN_SIZE.
+
+    Streaming responses, static files and WebSockets pass through untouched.
+    """
+
+    def __init__(self, app, min_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = None
+        for k, v in scope.get("headers", []):
+            if k == b"accept-encoding":
+                accept = v.decode("latin-1")
+                break
+        if not choose_encoding(accept):
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def wrapped_send(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = dict((k.lower(), v) for k, v in message.get("headers", []))
+                ctype = headers.get(b"content-type", b"")
+                if message["status"] != 200 or not ctype.startswith(b"application/json") or b"content-encoding" in headers:
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+            if passthrough or start is None:
+                await send(message)
+                return
+            if message.get("more_body"):
+                # streamed body: give up on compression and flush what we held back
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            body, enc = compress_body(message.get("body", b""), accept, self.min_size)
+            headers = [(k, v) for k, v in start.get("headers", []) if k.lower() not in (b"content-length", b"etag")]
+            for k, v in start.get("headers", []):
+                if k.lower() == b"etag":
+                    headers.append((k, _weaken(v.decode("latin-1")).encode("latin-1") if enc else v))
+            headers.append((b"content-length", str(len(body)).encode("latin-1")))
+            headers.append((b"vary", b"Accept-Encoding"))
+            if enc:
+                headers.append((b"content-encoding", enc.encode("latin-1")))
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, wrapped_send)
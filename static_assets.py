@@ -0,0 +1,115 @@
+# static_assets.py - serve web/ (or the built web/dist) with precompressed variants + cache headers
+#
+# `python scripts/build_assets.py` writes web/dist: fingerprinted copies
+# (name.<10 hex>.ext) of every image/css/js, .gz/.br siblings for text assets
+# and WebP sprite sheets for the scroll animation. Both servers serve web/dist
+# once it exists and fall back to the raw web/ folder otherwise.
+import mimetypes
+import os
+import re
+from pathlib import Path
+from typing import Optional, Tuple
+
+from serialization import parse_accept_encoding
+
+DIST_DIRNAME = "dist"
+MANIFEST_NAME = "manifest.json"
+
+# name.<hash>.ext as produced by scripts/build_assets.py
+FINGERPRINT_RE = re.compile(r"\.[0-9a-f]{10}\.[A-Za-z0-9]+$")
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# everything else (HTML entry points, unbuilt files) is revalidated via ETag/Last-Modified
+REVALIDATE_CACHE = "no-cache"
+
+# precompressed sibling suffixes, in order of preference
+VARIANTS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def static_root(web_root) -> Path:
+    """web/dist when a build is present (STATIC_ROOT env overrides), else web/ itself."""
+    override = os.getenv("STATIC_ROOT")
+    if override:
+        return Path(override)
+    dist = Path(web_root) / DIST_DIRNAME
+    return dist if (dist / MANIFEST_NAME).exists() else Path(web_root)
+
+
+def is_fingerprinted(path: str) -> bool:
+    return bool(FINGERPRINT_RE.search(path))
+
+
+def cache_control_for(path: str) -> str:
+    return IMMUTABLE_CACHE if is_fingerprinted(path) else REVALIDATE_CACHE
+
+
+def guess_type(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def pick_variant(root, path: str, accept_encoding: Optional[str]) -> Tuple[str, Optional[str], bool]:
+    """
+    Choose the file to send for `path` under `root`.
+
+    Returns (relative_path, content_encoding, has_variants); has_variants tells
+    the caller to add `Vary: Accept-Encoding` even when the plain file is sent.
+    """
+    base = Path(root) / path
+    present = [(enc, suffix) for enc, suffix in VARIANTS if base.with_name(base.name + suffix).is_file()]
+    if not present:
+        return path, None, False
+    offered = parse_accept_encoding(accept_encoding)
+    for enc, suffix in present:
+        if offered.get(enc, 0) > 0:
+            return path + suffix, enc, True
+    return path, None, True
+
+
+# ---- Flask integration ----
+
+def send_flask(root, path: str):
+    """send_from_directory with precompressed variant selection and cache headers."""
+    from flask import request, send_from_directory
+
+    target, enc, varies = pick_variant(root, path, request.headers.get("Accept-Encoding"))
+    resp = send_from_directory(str(root), target, mimetype=guess_type(path))
+    if enc:
+        resp.headers["Content-Encoding"] = enc
+    if varies:
+        resp.vary.add("Accept-Encoding")
+    resp.headers["Cache-Control"] = cache_control_for(path)
+    return resp
+
+
+def init_flask(app):
+    """Replace Flask's static view with one that serves precompressed, cache-tagged files."""
+    root = app.static_folder
+
+    def static(filename):
+        return send_flask(root, filename)
+
+    app.view_functions["static"] = static
+    return app
+
+
+# ---- ASGI (FastAPI/Starlette) integration ----
+
+def precompressed_static_files(directory, **kwargs):
+    """Return a StaticFiles app that prefers .br/.gz siblings and sets Cache-Control."""
+    from starlette.datastructures import Headers
+    from starlette.staticfiles import StaticFiles
+
+    class PrecompressedStaticFiles(StaticFiles):
+        async def get_response(self, path, scope):
+            target, enc, varies = pick_variant(self.directory, path, Headers(scope=scope).get("accept-encoding"))
+            resp = await super().get_response(target, scope)
+            if enc and resp.status_code in (200, 304):
+                resp.headers["content-encoding"] = enc
+                resp.headers["content-type"] = guess_type(path)
+            if varies:
+                resp.headers["vary"] = "Accept-Encoding"
+            if resp.status_code in (200, 304):
+                resp.headers["cache-control"] = cache_control_for(path)
+            return resp
+
+    return PrecompressedStaticFiles(directory=directory, **kwargs)
@@ -1,16 +1,46 @@
+import os
 import sqlite3
+import re
+import threading
+import time
 from pathlib import Path
 import json
 
+import metrics
+from tracing import traced
+
 DB_PATH = Path("tasks.db")
 
+# Done tasks older than this many days move from `tasks` (hot) to `tasks_archive` (cold).
+# 0 archives as soon as a task is marked done.
+ARCHIVE_RETENTION_DAYS = float(os.getenv("ARCHIVE_RETENTION_DAYS", "7"))
+# How often the background compactor runs (seconds).
+ARCHIVE_COMPACT_INTERVAL = int(os.getenv("ARCHIVE_COMPACT_INTERVAL", "900"))
+
 def _conn():
     # use check_same_thread=False for threads; for heavier usage use a connection pool/ORM
     c = sqlite3.connect(str(DB_PATH), timeout=5, isolation_level=None)
     c.row_factory = sqlite3.Row
-    return c
+    # statement timings -> sqlite_query_duration_seconds{db="tasks"} on /metrics
+    return metrics.timed_connection(c, "tasks")
+
+# databases whose schema this process has already set up (DB_PATH can be swapped, e.g. by benchmarks)
+_initialized = set()
+_init_lock = threading.Lock()
 
 def init_db():
+    """Create / migrate the schema once per database file per process; later calls are a set lookup."""
+    key = str(DB_PATH)
+    if key in _initialized and DB_PATH.exists():
+        return
+    with _init_lock:
+        if key in _initialized and DB_PATH.exists():
+            return
+        _create_schema()
+        _initialized.add(key)
+
+@traced("storage.init_db")
+def _create_schema():
     conn = _conn()
     cur = conn.cursor()
     # enable WAL for better concurrency
@@ -23,20 +53,226 @@ def init_db():
       estimated_hours REAL DEFAULT 0,
       priority TEXT DEFAULT 'medium',
       status TEXT DEFAULT 'pending',
-      owner TEXT
+      owner TEXT,
+      detail TEXT
+    )
+    """)
+    # older databases were created before the `detail` column existed
+    cols = [r["name"] for r in cur.execute("PRAGMA table_info(tasks)").fetchall()]
+    if "detail" not in cols:
+        cur.execute("ALTER TABLE tasks ADD COLUMN detail TEXT")
+    # cheap version counter bumped on every write; used for ETags / conditional GETs
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS meta (
+      key TEXT PRIMARY KEY,
+      value INTEGER NOT NULL DEFAULT 0
     )
     """)
+    for op in ("INSERT", "UPDATE", "DELETE"):
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS tasks_version_{op.lower()} AFTER {op} ON tasks
+        BEGIN
+          INSERT INTO meta (key, value) VALUES ('tasks_version', 1)
+          ON CONFLICT(key) DO UPDATE SET value = value + 1;
+        END
+        """)
+    ensure_task_fts(conn)
+    ensure_task_archive(conn)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tasks_archive_owner ON tasks_archive(owner, id)")
     conn.commit()
     conn.close()
 
-def load_tasks():
+# id for a new task: never reuse ids of tasks that were moved to the archive
+NEXT_TASK_ID_SQL = "(SELECT COALESCE(MAX(m), 0) + 1 FROM (SELECT MAX(id) AS m FROM tasks UNION ALL SELECT MAX(id) FROM tasks_archive))"
+
+def ensure_task_archive(conn):
+    """
+    Set up hot/cold storage for a `tasks` table: a `completed_at` column (ms epoch)
+    stamped by triggers when a task becomes done, and a `tasks_archive` table that
+    mirrors the task columns plus `archived_at`. Shared by app.py's database.
+    """
+    info = conn.execute("PRAGMA table_info(tasks)").fetchall()
+    now_ms = "CAST(strftime('%s', 'now') AS INTEGER) * 1000"
+    if "completed_at" not in [r[1] for r in info]:
+        conn.execute("ALTER TABLE tasks ADD COLUMN completed_at INTEGER")
+        # tasks already done count as completed now, so they get the full retention period
+        conn.execute(f"UPDATE tasks SET completed_at = {now_ms} WHERE status = 'done' AND completed_at IS NULL")
+        info = conn.execute("PRAGMA table_info(tasks)").fetchall()
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tasks_completed_at_insert AFTER INSERT ON tasks
+    WHEN NEW.status = 'done' AND NEW.completed_at IS NULL BEGIN
+      UPDATE tasks SET completed_at = {now_ms} WHERE id = NEW.id;
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS tasks_completed_at_update AFTER UPDATE OF status ON tasks
+    WHEN (NEW.status IS 'done') != (OLD.status IS 'done') BEGIN
+      UPDATE tasks SET completed_at = CASE WHEN NEW.status = 'done' THEN {now_ms} END WHERE id = NEW.id;
+    END
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS tasks_archive (id INTEGER PRIMARY KEY, archived_at INTEGER)")
+    have = {r[1] for r in conn.execute("PRAGMA table_info(tasks_archive)").fetchall()}
+    for r in info:
+        if r[1] not in have:
+            conn.execute(f'ALTER TABLE tasks_archive ADD COLUMN "{r[1]}" {r[2]}')
+
+@traced("storage.archive_done_tasks")
+def archive_done_tasks(conn, retention_days=None):
+    """
+    Move done tasks completed more than `retention_days` ago (default
+    ARCHIVE_RETENTION_DAYS) from `tasks` to `tasks_archive` in one transaction.
+    Returns the number of tasks moved.
+    """
+    if retention_days is None:
+        retention_days = ARCHIVE_RETENTION_DAYS
+    now = int(time.time() * 1000)
+    cutoff = now - int(float(retention_days) * 86400 * 1000)
+    cols = ", ".join(f'"{r[1]}"' for r in conn.execute("PRAGMA table_info(tasks)").fetchall())
+    own_txn = not conn.in_transaction
+    if own_txn:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            f"INSERT INTO tasks_archive ({cols}, archived_at) SELECT {cols}, ? FROM tasks "
+            "WHERE status = 'done' AND COALESCE(completed_at, 0) <= ?",
+            (now, cutoff),
+        )
+        moved = conn.execute(
+            "DELETE FROM tasks WHERE status = 'done' AND COALESCE(completed_at, 0) <= ?", (cutoff,)
+        ).rowcount
+        if own_txn:
+            conn.commit()
+    except Exception:
+        if own_txn:
+            conn.rollback()
+        raise
+    return moved
+
+@traced("storage.compact_archive")
+def compact_archive(retention_days=None):
+    """Archive old done tasks in the task store. Returns the number moved."""
+    init_db()
+    conn = _conn()
+    try:
+        return archive_done_tasks(conn, retention_days)
+    finally:
+        conn.close()
+
+_compactor_started = False
+
+def start_archive_compactor(extra_jobs=(), interval_seconds=None):
+    """
+    Start (once per process) a daemon thread that periodically runs
+    `compact_archive` plus any `extra_jobs` callables (e.g. app.py's database).
+    """
+    global _compactor_started
+    if _compactor_started:
+        return
+    _compactor_started = True
+    interval = interval_seconds or ARCHIVE_COMPACT_INTERVAL
+    jobs = [compact_archive, *extra_jobs]
+
+    def loop():
+        while True:
+            for job in jobs:
+                try:
+                    moved = job()
+                    if moved:
+                        print(f"ARCHIVE: {getattr(job, '__name__', job)} moved {moved} done tasks")
+                except Exception as e:
+                    print("ARCHIVE: compaction failed:", type(e).__name__, e)
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name="archive-compactor", daemon=True).start()
+
+def ensure_task_fts(conn):
+    """
+    Create the `tasks_fts` FTS5 index over tasks(title, detail) plus the triggers
+    that keep it in sync. Works for any `tasks` table with id/title/detail columns,
+    so app.py reuses it for data/chronoken.db. Existing rows are indexed once.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='tasks_fts'").fetchone()
+    if exists:
+        return
+    conn.execute("""
+    CREATE VIRTUAL TABLE tasks_fts USING fts5(
+      title, detail,
+      content='tasks', content_rowid='id',
+      tokenize='unicode61 remove_diacritics 2',
+      prefix='2 3'
+    )
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+      INSERT INTO tasks_fts (rowid, title, detail) VALUES (NEW.id, NEW.title, NEW.detail);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+      INSERT INTO tasks_fts (tasks_fts, rowid, title, detail) VALUES ('delete', OLD.id, OLD.title, OLD.detail);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, detail ON tasks BEGIN
+      INSERT INTO tasks_fts (tasks_fts, rowid, title, detail) VALUES ('delete', OLD.id, OLD.title, OLD.detail);
+      INSERT INTO tasks_fts (rowid, title, detail) VALUES (NEW.id, NEW.title, NEW.detail);
+    END
+    """)
+    conn.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+def build_fts_query(text):
+    """
+    Turn free text ("find my DBMS tasks") into a safe FTS5 MATCH expression:
+    every word becomes a quoted prefix term, all terms ANDed. Returns "" if
+    there is nothing searchable.
+    """
+    words = re.findall(r"\w+", (text or "").lower())
+    # drop conversational filler ("find my ... tasks") unless nothing else is left
+    words = [w for w in words if w not in _SEARCH_STOPWORDS] or words
+    return " ".join(f'"{w}"*' for w in words)
+
+_SEARCH_STOPWORDS = {"a", "an", "the", "my", "me", "all", "of", "for", "to", "find", "show", "search", "task", "tasks"}
+
+TASK_COLUMNS = "id, title, deadline, estimated_hours, priority, status, owner, detail"
+
+@traced("storage.load_tasks")
+def load_tasks(status=None):
+    """Tasks in the hot table (archived tasks excluded), optionally filtered by status."""
+    init_db()
+    conn = _conn()
+    if status:
+        cur = conn.execute(f"SELECT {TASK_COLUMNS} FROM tasks WHERE status = ? ORDER BY id", (status,))
+    else:
+        cur = conn.execute(f"SELECT {TASK_COLUMNS} FROM tasks ORDER BY id")
+    rows = [dict(r) for r in cur.fetchall()]
+    conn.close()
+    return rows
+
+@traced("storage.load_active_tasks")
+def load_active_tasks():
+    """Tasks that still need work (status != 'done'); the planners' hot path."""
     init_db()
     conn = _conn()
-    cur = conn.execute("SELECT id, title, deadline, estimated_hours, priority, status, owner FROM tasks ORDER BY id")
+    cur = conn.execute(f"SELECT {TASK_COLUMNS} FROM tasks WHERE status != 'done' ORDER BY id")
     rows = [dict(r) for r in cur.fetchall()]
     conn.close()
     return rows
 
+@traced("storage.load_archived_tasks")
+def load_archived_tasks(limit=None, offset=0):
+    """Archived (done) tasks, most recently archived first."""
+    init_db()
+    conn = _conn()
+    sql = f"SELECT {TASK_COLUMNS} FROM tasks_archive ORDER BY archived_at DESC, id DESC"
+    params = ()
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params = (int(limit), int(offset))
+    rows = [dict(r) for r in conn.execute(sql, params).fetchall()]
+    conn.close()
+    return rows
+
+@traced("storage.save_tasks")
 def save_tasks(tasks):
     """
     Overwrite table contents with provided list (keeps compatibility with existing callers).
@@ -46,31 +282,144 @@ def save_tasks(tasks):
     conn = _conn()
     cur = conn.cursor()
     with conn:
+        # autocommit connection: open an explicit transaction so the rewrite is atomic
+        cur.execute("BEGIN")
         cur.execute("DELETE FROM tasks")
         for t in tasks:
             cur.execute(
-                "INSERT INTO tasks (id, title, deadline, estimated_hours, priority, status, owner) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (
-                    t.get("id"),
-                    t.get("title"),
-                    t.get("deadline"),
-                    float(t.get("estimated_hours", 0)),
-                    t.get("priority", "medium"),
-                    t.get("status", "pending"),
-                    t.get("owner"),
-                ),
+                "INSERT INTO tasks (id, title, deadline, estimated_hours, priority, status, owner, detail) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                _task_row(t),
             )
     conn.close()
 
+def _task_row(t):
+    return (
+        t.get("id"),
+        t.get("title"),
+        t.get("deadline"),
+        float(t.get("estimated_hours", 0)),
+        t.get("priority", "medium"),
+        t.get("status", "pending"),
+        t.get("owner"),
+        t.get("detail"),
+    )
+
+def _insert_row(conn, task):
+    row = _task_row(task)
+    if row[0] is None:
+        cur = conn.execute(
+            f"INSERT INTO tasks (id, title, deadline, estimated_hours, priority, status, owner, detail) VALUES ({NEXT_TASK_ID_SQL}, ?, ?, ?, ?, ?, ?, ?)",
+            row[1:],
+        )
+    else:
+        cur = conn.execute(
+            "INSERT INTO tasks (id, title, deadline, estimated_hours, priority, status, owner, detail) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            row,
+        )
+    return dict(task, id=cur.lastrowid)
+
+UPDATABLE_FIELDS = {"title", "deadline", "estimated_hours", "priority", "status", "owner", "detail"}
+
+def _update_row(conn, task_id, fields):
+    fields = {k: v for k, v in fields.items() if k in UPDATABLE_FIELDS}
+    if not fields:
+        return False
+    set_clause = ", ".join(f"{k} = ?" for k in fields)
+    cur = conn.execute(f"UPDATE tasks SET {set_clause} WHERE id = ?", (*fields.values(), int(task_id)))
+    return cur.rowcount > 0
+
+@traced("storage.insert_task")
+def insert_task(task):
+    """Insert a single task row and return it with its assigned id."""
+    init_db()
+    conn = _conn()
+    out = _insert_row(conn, task)
+    conn.close()
+    return out
+
+@traced("storage.update_task")
+def update_task(task_id, **fields):
+    """Update the given columns of one task. Returns True if a row was changed."""
+    if not any(k in UPDATABLE_FIELDS for k in fields):
+        return False
+    init_db()
+    conn = _conn()
+    changed = _update_row(conn, task_id, fields)
+    conn.close()
+    return changed
+
+@traced("storage.write_batch")
+def write_batch(ops):
+    """
+    Apply several task writes in one transaction, in order:
+      ("insert", task)              -> the task with its assigned id
+      ("update", task_id, fields)   -> True if a row was changed
+    Returns one result per op. Nothing is written if any op raises.
+    """
+    init_db()
+    conn = _conn()
+    results = []
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for op in ops:
+            if op[0] == "insert":
+                results.append(_insert_row(conn, op[1]))
+            elif op[0] == "update":
+                results.append(_update_row(conn, op[1], op[2]))
+            else:
+                raise ValueError(f"unknown batch op {op[0]!r}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return results
+
+@traced("storage.search_tasks")
+def search_tasks(query, limit=20, offset=0, status=None):
+    """
+    Full-text search over task title/detail using the FTS5 index.
+    Prefix matching per word, ranked by bm25 (title weighted above detail).
+    Returns (rows, has_more).
+    """
+    match = build_fts_query(query)
+    if not match:
+        return [], False
+    init_db()
+    conn = _conn()
+    sql = (
+        f"SELECT {', '.join('t.' + c.strip() for c in TASK_COLUMNS.split(','))} "
+        "FROM tasks_fts JOIN tasks t ON t.id = tasks_fts.rowid "
+        "WHERE tasks_fts MATCH ?"
+    )
+    params = [match]
+    if status:
+        sql += " AND t.status = ?"
+        params.append(status.lower())
+    sql += " ORDER BY bm25(tasks_fts, 10.0, 1.0) LIMIT ? OFFSET ?"
+    params += [int(limit) + 1, int(offset)]
+    rows = [dict(r) for r in conn.execute(sql, params).fetchall()]
+    conn.close()
+    return rows[:limit], len(rows) > limit
+
+@traced("storage.get_next_task_id")
 def get_next_task_id():
     init_db()
     conn = _conn()
-    cur = conn.execute("SELECT MAX(id) as m FROM tasks")
+    cur = conn.execute(f"SELECT {NEXT_TASK_ID_SQL} AS m")
     row = cur.fetchone()
     conn.close()
-    if not row or row["m"] is None:
-        return 1
-    return int(row["m"] + 1)
+    return int(row["m"])
+
+@traced("storage.get_tasks_version")
+def get_tasks_version():
+    """Return the current tasks version counter (0 if the table was never written); one SELECT."""
+    init_db()
+    conn = _conn()
+    row = conn.execute("SELECT value FROM meta WHERE key = 'tasks_version'").fetchone()
+    conn.close()
+    return int(row["value"]) if row else 0
 
 def export_tasks_json(out_path=None):
     """Utility: export current DB tasks to a JSON file for backup/testing."""
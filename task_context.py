@@ -0,0 +1,85 @@
+# task_context.py - compact digest of open tasks for the model prompt
+#
+# With the digest in the prompt the model can turn "mark the DBMS assignment
+# done" into update_task_status with the right id in one call, instead of a
+# list_tasks turn first. One line per open task, most urgent first, cut to
+# TASK_CONTEXT_TOKENS (estimated at ~4 characters per token):
+#
+#   Open tasks (id | title | due | status) - use these ids instead of calling list_tasks:
+#   12 | DBMS assignment | 2025-11-25 | in_progress
+#   ...
+#   (+37 more not shown; use search_tasks to find them)
+#
+# The digest is rebuilt only when storage's tasks_version counter moves, which
+# the triggers in storage.init_db do on every task write and archive move.
+import os
+import threading
+
+import metrics
+import storage
+
+TASK_CONTEXT_TOKENS = int(os.getenv('TASK_CONTEXT_TOKENS', '300'))
+TASK_CONTEXT_TITLE_CHARS = int(os.getenv('TASK_CONTEXT_TITLE_CHARS', '48'))
+CHARS_PER_TOKEN = 4
+
+HEADER = 'Open tasks (id | title | due | status) - use these ids instead of calling list_tasks:'
+_PRIORITY_RANK = {'high': 0, 'medium': 1, 'low': 2}
+
+
+def urgency(task):
+    """Sort key: open before done, then earliest deadline, then priority, then id."""
+    return (task.get('status') == 'done', str(task.get('deadline') or '9999-12-31'),
+            _PRIORITY_RANK.get(task.get('priority'), 1), task.get('id') or 0)
+
+
+def _short(title, limit):
+    title = ' '.join(str(title or '').replace('|', '/').split())
+    return title if len(title) <= limit else title[:limit - 1].rstrip() + '…'
+
+
+def build_digest(tasks, max_tokens=TASK_CONTEXT_TOKENS, title_chars=TASK_CONTEXT_TITLE_CHARS):
+    """The digest text for `tasks` (open ones only), or '' when there are none or the budget is 0."""
+    open_tasks = sorted((t for t in tasks if t.get('status') != 'done'), key=urgency)
+    if not open_tasks or max_tokens <= 0:
+        return ''
+    budget = max_tokens * CHARS_PER_TOKEN - len(HEADER) - 60  # room for the "+K more" line
+    lines = [HEADER]
+    for i, t in enumerate(open_tasks):
+        line = f"{t['id']} | {_short(t.get('title'), title_chars)} | {t.get('deadline') or '-'} | {t.get('status')}"
+        if len(line) + 1 > budget:
+            lines.append(f'(+{len(open_tasks) - i} more not shown; use search_tasks to find them)')
+            break
+        budget -= len(line) + 1
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+class TaskContext:
+    def __init__(self, max_tokens=TASK_CONTEXT_TOKENS, name='task_context'):
+        self.max_tokens = max_tokens
+        self.name = name
+        self.lock = threading.Lock()
+        self._version = None
+        self._text = ''
+
+    @property
+    def enabled(self):
+        return self.max_tokens > 0
+
+    def version(self):
+        """Current tasks version (0 when disabled, so callers can key caches on it unconditionally)."""
+        return storage.get_tasks_version() if self.enabled else 0
+
+    def get(self):
+        """The digest for the current task list; rebuilt only after task writes."""
+        if not self.enabled:
+            return ''
+        version = storage.get_tasks_version()
+        with self.lock:
+            hit = version == self._version
+            if not hit:
+                self._text = build_digest(storage.load_active_tasks(), self.max_tokens)
+                self._version = version
+            text = self._text
+        metrics.record_cache(self.name, hit)
+        return text
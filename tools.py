@@ -1,9 +1,19 @@
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 
-from storage import load_tasks, save_tasks, get_next_task_id
-
-
+import storage
+from tracing import traced
+from storage import (
+    load_tasks,
+    load_active_tasks,
+    load_archived_tasks,
+    insert_task,
+    update_task,
+    search_tasks as _search_tasks,
+)
+
+
+@traced("tools.create_task")
 def create_task(
     title: str,
     deadline: str,
@@ -17,10 +27,12 @@ def create_task(
     deadline: 'YYYY-MM-DD'
     priority: 'low' | 'medium' | 'high'
     """
-    tasks = load_tasks()
+    return insert_task(_new_task(title, deadline, estimated_hours, priority, owner))
 
-    new_task = {
-        "id": get_next_task_id(tasks),
+
+def _new_task(title, deadline, estimated_hours, priority="medium", owner=None) -> Dict[str, Any]:
+    return {
+        "id": None,                    # assigned by the database
         "title": title,
         "deadline": deadline,          # store as string
         "estimated_hours": float(estimated_hours),
@@ -29,42 +41,88 @@ def create_task(
         "owner": owner,
     }
 
-    tasks.append(new_task)
-    save_tasks(tasks)
-    return new_task
 
-
-def list_tasks(status: Optional[str] = None) -> List[Dict[str, Any]]:
+@traced("tools.list_tasks")
+def list_tasks(status: Optional[str] = None, include_archived: bool = False) -> List[Dict[str, Any]]:
     """
-    List all tasks, optionally filtered by status.
+    List tasks, optionally filtered by status.
     status: 'pending' | 'in_progress' | 'done' or None
+
+    Archived (long-finished) tasks are only read when asked for, either with
+    include_archived=True or by listing status='done'.
     """
-    tasks = load_tasks()
-    if status:
-        status = status.lower()
-        tasks = [t for t in tasks if t["status"] == status]
+    status = status.lower() if status else None
+    tasks = load_tasks(status=status)
+    if include_archived or status == "done":
+        tasks += load_archived_tasks()
     return tasks
 
 
+@traced("tools.update_task_status")
 def update_task_status(task_id: int, new_status: str) -> bool:
     """
     Update the status of a task. Returns True if successful.
     new_status: 'pending' | 'in_progress' | 'done'
     """
-    tasks = load_tasks()
-    found = False
-
-    for t in tasks:
-        if t["id"] == int(task_id):
-            t["status"] = new_status.lower()
-            found = True
-            break
-
-    if found:
-        save_tasks(tasks)
-    return found
+    try:
+        task_id = int(task_id)
+    except (TypeError, ValueError):
+        return False
+    ok = update_task(task_id, status=new_status.lower())
+    if ok and new_status.lower() == "done" and storage.ARCHIVE_RETENTION_DAYS <= 0:
+        storage.compact_archive(retention_days=0)
+    return ok
+
+
+@traced("tools.apply_task_writes")
+def apply_task_writes(steps: List[Dict[str, Any]]) -> List[Any]:
+    """
+    Run several create_task / update_task_status steps ({"action", "params"})
+    in one transaction, in order. Returns, per step, the created task or
+    whether the status update matched a task.
+    """
+    results: List[Any] = [None] * len(steps)
+    ops, slots, finished = [], [], False
+    for i, step in enumerate(steps):
+        p = step.get("params") or {}
+        if step["action"] == "create_task":
+            ops.append(("insert", _new_task(
+                p.get("title", "Untitled task"),
+                p.get("deadline", "2099-12-31"),
+                p.get("estimated_hours", 1),
+                p.get("priority", "medium"),
+                p.get("owner"),
+            )))
+        elif step["action"] == "update_task_status":
+            try:
+                task_id = int(p.get("task_id"))
+            except (TypeError, ValueError):
+                results[i] = False
+                continue
+            status = str(p.get("new_status", "pending")).lower()
+            finished = finished or status == "done"
+            ops.append(("update", task_id, {"status": status}))
+        else:
+            raise ValueError(f"not a task write: {step['action']}")
+        slots.append(i)
+    for i, res in zip(slots, storage.write_batch(ops) if ops else []):
+        results[i] = res
+    if finished and storage.ARCHIVE_RETENTION_DAYS <= 0:
+        storage.compact_archive(retention_days=0)
+    return results
+
+
+@traced("tools.search_tasks")
+def search_tasks(query: str, limit: int = 10, offset: int = 0, status: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Full-text search over task titles/details (prefix match, best matches first).
+    Returns {"tasks": [...], "has_more": bool} for paging.
+    """
+    rows, has_more = _search_tasks(query, limit=int(limit), offset=int(offset), status=status)
+    return {"tasks": rows, "has_more": has_more}
 
 
+@traced("tools.generate_plan")
 def generate_plan(daily_hours: float = 3.0, num_days: int = 7) -> Dict[str, Any]:
     """
     Simple greedy study plan:
@@ -73,9 +131,12 @@ def generate_plan(daily_hours: float = 3.0, num_days: int = 7) -> Dict[str, Any]
     - Fills each day up to daily_hours
     - Does NOT permanently modify task estimated_hours in storage
     """
-    tasks = load_tasks()
+    return _plan_for(load_active_tasks(), daily_hours, num_days)
+
+
+def _plan_for(active_tasks: List[Dict[str, Any]], daily_hours: float, num_days: int) -> Dict[str, Any]:
     # Work on a copy so we don't change actual stored hours
-    task_copies = [t.copy() for t in tasks if t["status"] != "done"]
+    task_copies = [t.copy() for t in active_tasks if t["status"] != "done"]
 
     priority_order = {"high": 0, "medium": 1, "low": 2}
 
@@ -114,6 +175,7 @@ def generate_plan(daily_hours: float = 3.0, num_days: int = 7) -> Dict[str, Any]
             remaining -= slot_hours
 
     return plan
+@traced("tools.get_today_view")
 def get_today_view(daily_hours: float = 3.0) -> Dict[str, Any]:
     """
     Build a 'today view' dashboard:
@@ -121,7 +183,7 @@ def get_today_view(daily_hours: float = 3.0) -> Dict[str, Any]:
     - a few upcoming tasks
     - a simple plan for today based on available hours
     """
-    tasks = load_tasks()
+    active_tasks = load_active_tasks()
     today_date = datetime.today().date()
     today_str = str(today_date)
 
@@ -135,9 +197,6 @@ def get_today_view(daily_hours: float = 3.0) -> Dict[str, Any]:
             # invalid date goes far in the future
             return datetime.max.date()
 
-    # Tasks not done
-    active_tasks = [t for t in tasks if t["status"] != "done"]
-
     # Tasks due today
     due_today = [
         t for t in active_tasks
@@ -164,8 +223,8 @@ def get_today_view(daily_hours: float = 3.0) -> Dict[str, Any]:
     # Limit upcoming list to avoid huge output
     upcoming = upcoming[:5]
 
-    # Use existing generate_plan to build a 1-day plan
-    full_plan = generate_plan(daily_hours=daily_hours, num_days=1)
+    # Build a 1-day plan from the tasks already loaded
+    full_plan = _plan_for(active_tasks, daily_hours, 1)
     today_plan = full_plan.get(today_str, [])
 
     return {
@@ -0,0 +1,321 @@
+# tracing.py - lightweight span tracing for the request -> agent -> tools -> storage path
+#
+# Off unless TRACE_EXPORT is set:
+#   TRACE_EXPORT=jsonl  one JSON object per span in TRACE_FILE (default data/traces.jsonl)
+#   TRACE_EXPORT=otlp   one OTLP/JSON ExportTraceServiceRequest per trace (default data/traces.otlp.jsonl)
+# Spans nest through contextvars, so they follow the request across function
+# calls and asyncio tasks; use run_in_executor() below to carry them into
+# worker threads. Finished traces are queued and written by a daemon thread.
+# `python scripts/trace_view.py` prints per-trace critical-path breakdowns.
+import contextvars
+import functools
+import json
+import os
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+TRACE_EXPORT = (os.getenv('TRACE_EXPORT') or '').lower()
+TRACING_ENABLED = TRACE_EXPORT in ('jsonl', 'otlp')
+_default_file = 'traces.otlp.jsonl' if TRACE_EXPORT == 'otlp' else 'traces.jsonl'
+TRACE_FILE = Path(os.getenv('TRACE_FILE') or Path(__file__).resolve().parent / 'data' / _default_file)
+# fraction of new traces recorded (traces continued from a caller's id are always kept)
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '1.0'))
+SERVICE_NAME = 'chronoken'
+MAX_QUEUED_TRACES = 1000
+
+TRACE_HEADER = 'x-trace-id'
+_TRACEPARENT_RE = re.compile(r'^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+_TRACE_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+_current = contextvars.ContextVar('trace_span', default=None)
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'start', 'end', 'attrs', 'status', 'error')
+
+    def __init__(self, trace, name, parent_id, attrs):
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.end = None
+        self.attrs = attrs
+        self.status = 'ok'
+        self.error = None
+
+    @property
+    def trace_id(self):
+        return self.trace.trace_id
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': round(self.start, 6),
+            'duration_ms': round((self.end - self.start) * 1000, 3),
+            'status': self.status,
+            'error': self.error,
+            'attrs': self.attrs,
+        }
+
+
+class _Trace:
+    __slots__ = ('trace_id', 'spans', 'open')
+
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []
+        self.open = 0
+
+
+def normalize_trace_id(value):
+    """A client-supplied trace id as 32 lowercase hex chars, or None if it isn't one."""
+    tid = str(value or '').strip().lower().replace('-', '')
+    return tid if _TRACE_ID_RE.match(tid) else None
+
+
+def parse_trace_header(headers_get):
+    """Trace id (and remote parent span id) from traceparent / X-Trace-Id, via a header getter."""
+    tp = (headers_get('traceparent') or '').strip().lower()
+    m = _TRACEPARENT_RE.match(tp)
+    if m:
+        return m.group(1), m.group(2)
+    return normalize_trace_id(headers_get(TRACE_HEADER)), None
+
+
+def current_trace_id():
+    span = _current.get()
+    return span.trace_id if span is not None else None
+
+
+def annotate(**attrs):
+    """Add attributes to the active span (no-op without one)."""
+    span = _current.get()
+    if span is not None:
+        span.attrs.update(attrs)
+
+
+def begin(name, trace_id=None, parent_id=None, **attrs):
+    """Start a span (a new trace when none is active). Returns a handle for end(), or None."""
+    if not TRACING_ENABLED:
+        return None
+    parent = _current.get()
+    if parent is not None:
+        trace, parent_id = parent.trace, parent.span_id
+    else:
+        if trace_id is None and TRACE_SAMPLE_RATE < 1.0 and random.random() >= TRACE_SAMPLE_RATE:
+            return None
+        trace = _Trace(trace_id or secrets.token_hex(16))
+    span = Span(trace, name, parent_id, attrs)
+    trace.open += 1
+    return span, _current.set(span)
+
+
+def end(handle, error=None):
+    if handle is None:
+        return
+    span, token = handle
+    span.end = time.time()
+    if error is not None:
+        span.status = 'error'
+        span.error = f'{type(error).__name__}: {error}'[:500]
+    try:
+        _current.reset(token)
+    except ValueError:
+        # ended from a different context (e.g. Flask teardown after a copy); just restore the parent
+        _current.set(None)
+    trace = span.trace
+    trace.spans.append(span)
+    trace.open -= 1
+    if trace.open == 0:
+        _EXPORTER.submit(trace)
+
+
+@contextmanager
+def span(name, trace_id=None, **attrs):
+    """`with span('tools.generate_plan', days=7) as s:` - s is None when tracing is off."""
+    handle = begin(name, trace_id=trace_id, **attrs)
+    try:
+        yield handle[0] if handle else None
+    except BaseException as e:
+        end(handle, e)
+        handle = None
+        raise
+    finally:
+        end(handle)
+
+
+def traced(name=None):
+    """Decorator: run the function inside a span (no-op when tracing is off)."""
+    def deco(fn):
+        span_name = name or f'{fn.__module__}.{fn.__name__}'
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACING_ENABLED:
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+async def run_in_executor(loop, fn, *args):
+    """loop.run_in_executor(None, fn, *args) that keeps the current span as parent."""
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(None, functools.partial(ctx.run, fn, *args))
+
+
+# ---- export ----
+
+def _otlp_value(v):
+    if isinstance(v, bool):
+        return {'boolValue': v}
+    if isinstance(v, int):
+        return {'intValue': str(v)}
+    if isinstance(v, float):
+        return {'doubleValue': v}
+    return {'stringValue': str(v)}
+
+
+def _otlp_request(trace):
+    spans = []
+    for s in trace.spans:
+        spans.append({
+            'traceId': trace.trace_id,
+            'spanId': s.span_id,
+            'parentSpanId': s.parent_id or '',
+            'name': s.name,
+            'kind': 1,
+            'startTimeUnixNano': str(int(s.start * 1e9)),
+            'endTimeUnixNano': str(int(s.end * 1e9)),
+            'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in s.attrs.items()],
+            'status': {'code': 2, 'message': s.error} if s.status == 'error' else {'code': 1},
+        })
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+        'scopeSpans': [{'scope': {'name': 'chronoken.tracing'}, 'spans': spans}],
+    }]}
+
+
+class _Exporter:
+    def __init__(self, path, fmt):
+        self.path = Path(path)
+        self.fmt = fmt
+        self.queue = queue.Queue(maxsize=MAX_QUEUED_TRACES)
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, trace):
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='trace-export', daemon=True)
+                    self._thread.start()
+
+    def _lines(self, trace):
+        if self.fmt == 'otlp':
+            return [json.dumps(_otlp_request(trace), default=str)]
+        return [json.dumps(s.to_dict(), default=str) for s in sorted(trace.spans, key=lambda s: s.start)]
+
+    def _run(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.path, 'a', encoding='utf-8') as fh:
+                    for trace in batch:
+                        fh.write('\n'.join(self._lines(trace)) + '\n')
+            except Exception as e:
+                print('tracing: export failed:', e)
+
+
+_EXPORTER = _Exporter(TRACE_FILE, TRACE_EXPORT)
+
+
+# ---- HTTP integration ----
+
+def init_flask(app):
+    """Root span per request; continues traceparent / X-Trace-Id and echoes X-Trace-Id."""
+    if not TRACING_ENABLED:
+        return app
+    from flask import g, request
+
+    @app.before_request
+    def _trace_start():
+        trace_id, parent_id = parse_trace_header(request.headers.get)
+        g._trace = begin(f'http {request.method}', trace_id=trace_id, parent_id=parent_id,
+                         path=request.path, method=request.method)
+
+    @app.after_request
+    def _trace_header(resp):
+        handle = g.get('_trace')
+        if handle:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            handle[0].name = f'http {request.method} {route}'
+            handle[0].set(status=resp.status_code)
+            resp.headers['X-Trace-Id'] = handle[0].trace_id
+        return resp
+
+    @app.teardown_request
+    def _trace_end(exc=None):
+        end(g.pop('_trace', None), exc)
+
+    return app
+
+
+class ASGITracingMiddleware:
+    """Root span per HTTP request for ASGI apps (WebSocket messages are traced by the handler)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not TRACING_ENABLED or scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+        trace_id, parent_id = parse_trace_header(headers.get)
+        method = scope.get('method', '')
+        handle = begin(f'http {method}', trace_id=trace_id, parent_id=parent_id, path=scope.get('path', ''), method=method)
+
+        async def traced_send(message):
+            if handle and message['type'] == 'http.response.start':
+                handle[0].set(status=message['status'])
+                message = {**message, 'headers': list(message.get('headers', [])) + [(b'x-trace-id', handle[0].trace_id.encode())]}
+            await send(message)
+
+        error = None
+        try:
+            await self.app(scope, receive, traced_send)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if handle:
+                route = scope.get('route')
+                handle[0].name = f'http {method} {getattr(route, "path", None) or scope.get("path", "")}'
+            end(handle, error)
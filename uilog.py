@@ -0,0 +1,215 @@
+# uilog.py - cheap ingestion for frontend error reports (/api/log)
+#
+# Requests only touch memory: a per-client token bucket, optional sampling and
+# an aggregation dict keyed by error fingerprint. A daemon thread flushes the
+# aggregated entries in batches to data/ui_errors.log, rotating by size and age.
+# The first occurrence of a fingerprint is written in full; repeats within
+# UI_LOG_DEDUP_WINDOW are written as {fingerprint, count} summary lines.
+import atexit
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+UI_LOG_MAX_BYTES = int(os.getenv('UI_LOG_MAX_BYTES', str(5 * 1024 * 1024)))
+UI_LOG_BACKUPS = int(os.getenv('UI_LOG_BACKUPS', '3'))
+UI_LOG_ROTATE_SECONDS = int(os.getenv('UI_LOG_ROTATE_SECONDS', str(24 * 3600)))
+# fraction of *new* fingerprints kept; repeats of pending ones are always counted
+UI_LOG_SAMPLE_RATE = float(os.getenv('UI_LOG_SAMPLE_RATE', '1.0'))
+# per-client token bucket: sustained reports/second and burst size
+UI_LOG_RATE = float(os.getenv('UI_LOG_RATE', '1'))
+UI_LOG_BURST = int(os.getenv('UI_LOG_BURST', '20'))
+UI_LOG_DEDUP_WINDOW = int(os.getenv('UI_LOG_DEDUP_WINDOW', '300'))
+FLUSH_INTERVAL = 2.0
+# distinct fingerprints held in memory between flushes; further new ones are dropped
+MAX_PENDING = 500
+MAX_CLIENTS = 10000
+MAX_SEEN = 2000
+# field caps so one report can't pin megabytes in the queue
+FIELD_LIMITS = {'message': 1000, 'stack': 4000, 'url': 500}
+EXTRA_LIMIT = 2000
+
+
+def fingerprint(payload):
+    """Stable id for an error: message + top stack frame + page path."""
+    stack = str(payload.get('stack') or '').strip().splitlines()
+    top = stack[1].strip() if len(stack) > 1 else (stack[0].strip() if stack else '')
+    page = str(payload.get('url') or '').split('?', 1)[0].split('#', 1)[0]
+    raw = '\n'.join((str(payload.get('message') or ''), top, page))
+    return hashlib.sha1(raw.encode('utf-8', 'replace')).hexdigest()[:16]
+
+
+def _trim(payload):
+    out = {}
+    for key, limit in FIELD_LIMITS.items():
+        if payload.get(key) is not None:
+            out[key] = str(payload[key])[:limit]
+    extra = payload.get('extra')
+    if extra is not None:
+        try:
+            text = json.dumps(extra, ensure_ascii=False, default=str)
+        except Exception:
+            text = str(extra)
+        out['extra'] = extra if len(text) <= EXTRA_LIMIT else text[:EXTRA_LIMIT]
+    return out
+
+
+class UIErrorLog:
+    def __init__(self, path, max_bytes=UI_LOG_MAX_BYTES, backups=UI_LOG_BACKUPS,
+                 rotate_seconds=UI_LOG_ROTATE_SECONDS, sample_rate=UI_LOG_SAMPLE_RATE,
+                 rate=UI_LOG_RATE, burst=UI_LOG_BURST, flush_interval=FLUSH_INTERVAL,
+                 echo=True):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.rotate_seconds = rotate_seconds
+        self.sample_rate = sample_rate
+        self.rate = rate
+        self.burst = burst
+        self.flush_interval = flush_interval
+        self.echo = echo
+        self._lock = threading.Lock()
+        self._pending = {}              # fingerprint -> aggregated entry
+        self._buckets = OrderedDict()   # client -> (tokens, last_ts)
+        self._seen = OrderedDict()      # fingerprint -> last time written in full
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._opened_at = None
+        self.counters = {'accepted': 0, 'deduped': 0, 'rate_limited': 0, 'sampled_out': 0, 'dropped': 0, 'written': 0}
+
+    # ---- request side (memory only) ----
+
+    def _take_token(self, client, now):
+        tokens, last = self._buckets.pop(client, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+        ok = tokens >= 1.0
+        self._buckets[client] = (tokens - 1.0 if ok else tokens, now)
+        while len(self._buckets) > MAX_CLIENTS:
+            self._buckets.popitem(last=False)
+        return ok
+
+    def retry_after(self, client):
+        """Seconds until `client` has a token again (for Retry-After)."""
+        with self._lock:
+            tokens, _ = self._buckets.get(client, (float(self.burst), 0))
+        return max(1, int((1.0 - tokens) / self.rate + 0.999)) if self.rate > 0 else 60
+
+    def submit(self, client, payload, remote=None):
+        """
+        Record one report. Returns 'accepted', 'deduped', 'rate_limited',
+        'sampled_out' or 'dropped'; never touches the disk.
+        """
+        now = time.time()
+        fp = fingerprint(payload)
+        with self._lock:
+            if not self._take_token(client, now):
+                status = 'rate_limited'
+            elif fp in self._pending:
+                entry = self._pending[fp]
+                entry['count'] += 1
+                entry['last'] = int(now * 1000)
+                status = 'deduped'
+            elif self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                status = 'sampled_out'
+            elif len(self._pending) >= MAX_PENDING:
+                status = 'dropped'
+            else:
+                self._pending[fp] = {
+                    'fingerprint': fp,
+                    'count': 1,
+                    'first': int(now * 1000),
+                    'last': int(now * 1000),
+                    'remote': remote,
+                    'payload': _trim(payload),
+                }
+                status = 'accepted'
+            self.counters[status] += 1
+            full = len(self._pending) >= MAX_PENDING
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+        return status
+
+    # ---- writer thread ----
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='ui-error-log', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print('ui error log flush failed:', e)
+
+    def _rotate_if_needed(self, now):
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            self._opened_at = now
+            return
+        if self._opened_at is None:
+            self._opened_at = self.path.stat().st_mtime
+        if size < self.max_bytes and now - self._opened_at < self.rotate_seconds:
+            return
+        for i in range(self.backups - 1, 0, -1):
+            src = self.path.with_name(f'{self.path.name}.{i}')
+            if src.exists():
+                os.replace(src, self.path.with_name(f'{self.path.name}.{i + 1}'))
+        if self.backups > 0:
+            os.replace(self.path, self.path.with_name(f'{self.path.name}.1'))
+        else:
+            self.path.unlink()
+        self._opened_at = now
+
+    def flush(self):
+        """Write everything aggregated since the last flush (one append per batch)."""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        now = time.time()
+        lines = []
+        for fp, entry in batch.items():
+            last_full = self._seen.pop(fp, None)
+            if last_full is not None and now - last_full < UI_LOG_DEDUP_WINDOW:
+                # known error: just the counts
+                lines.append({'when': entry['last'], 'fingerprint': fp, 'count': entry['count'], 'repeat': True})
+                self._seen[fp] = last_full
+            else:
+                lines.append({'when': entry['first'], **entry})
+                self._seen[fp] = now
+            while len(self._seen) > MAX_SEEN:
+                self._seen.popitem(last=False)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._rotate_if_needed(now)
+        with open(self.path, 'a', encoding='utf-8') as fh:
+            fh.write(''.join(json.dumps(line, ensure_ascii=False, default=str) + '\n' for line in lines))
+        total = sum(e['count'] for e in batch.values())
+        with self._lock:
+            self.counters['written'] += len(lines)
+        if self.echo:
+            # one console line per batch instead of per report
+            print(f'UI ERROR LOG: {total} report(s), {len(lines)} distinct -> {self.path.name}')
+        return len(lines)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, pending=len(self._pending), clients=len(self._buckets))
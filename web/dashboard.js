@@ -10,6 +10,8 @@ document.addEventListener("DOMContentLoaded", () => {
   _errorOverlay.appendChild(_errClose); _errorOverlay.appendChild(_errPre); document.body.appendChild(_errorOverlay);
   _errClose.addEventListener('click', ()=>{ _errorOverlay.style.display='none'; });
   function showErrorOverlay(msg){ _errPre.textContent = msg; _errorOverlay.style.display = 'block'; }
+  // smallest server-resized avatar that still looks sharp at 2x (falls back to the stored URL)
+  function avatarSrc(user, size){ return (user.avatar_urls && user.avatar_urls[String(size)]) || user.avatar; }
   // send the first UI error (dev-only) to the server log endpoint for easier debugging
   let _firstUiErrorSent = false;
   function _sendFirstUiError(payload){
@@ -420,11 +422,39 @@ document.addEventListener("DOMContentLoaded", () => {
     const cb = document.getElementById("completeBar");
     const fb = document.getElementById("focusBar");
     if(tf) tf.textContent = `${focused}h`;
-    const completed = state.missions.filter(m=>m.status==="done").length;
-    const pct = Math.round((completed / Math.max(1, state.missions.length))*100);
+    // Prefer the server's incrementally maintained stats; count locally until they arrive
+    let pct;
+    if(state.serverStats && state.serverStats.total > 0){
+      pct = state.serverStats.completion_pct;
+    } else {
+      const completed = state.missions.filter(m=>m.status==="done").length;
+      pct = Math.round((completed / Math.max(1, state.missions.length))*100);
+    }
     if(cp) cp.textContent = pct+"%";
     if(cb) cb.style.width = pct + "%";
     if(fb) fb.style.width = Math.min(100, (focused*12)) + "%";
+    scheduleStatsRefresh();
+  }
+
+  // Debounced GET /api/stats (O(1) on the server, 304 when nothing changed)
+  let statsTimer = null;
+  function scheduleStatsRefresh(){
+    clearTimeout(statsTimer);
+    statsTimer = setTimeout(async ()=>{
+      try{
+        const r = await fetch('/api/stats?user=me', { credentials: 'same-origin' });
+        if(!r.ok) return;
+        const j = await r.json();
+        const prev = state.serverStats;
+        state.serverStats = j.stats || null;
+        if(state.serverStats && (!prev || prev.completion_pct !== state.serverStats.completion_pct)){
+          const cp = document.getElementById("completePct");
+          const cb = document.getElementById("completeBar");
+          if(cp) cp.textContent = state.serverStats.completion_pct + "%";
+          if(cb) cb.style.width = state.serverStats.completion_pct + "%";
+        }
+      }catch(e){}
+    }, 400);
   }
 
   // INITIAL RENDERS
@@ -445,7 +475,7 @@ document.addEventListener("DOMContentLoaded", () => {
               const nameEl = document.querySelector('.sidebar .profile .name');
               const mutedEl = document.querySelector('.sidebar .profile .muted');
               if(nameEl) nameEl.textContent = meJson.user.name || meJson.user.email || nameEl.textContent;
-              if(avatar && meJson.user.avatar) avatar.src = meJson.user.avatar;
+              if(avatar && meJson.user.avatar) avatar.src = avatarSrc(meJson.user, 128);
               if(mutedEl) mutedEl.textContent = 'Member • Logged in';
             }catch(e){}
             try{ localStorage.setItem('user', userId); }catch(_){}
@@ -611,7 +641,7 @@ document.addEventListener("DOMContentLoaded", () => {
           const me = await meResp.json().catch(()=>({}));
           if(me && me.user){
             if(nameEl) nameEl.textContent = me.user.name || me.user.email;
-            if(preview && me.user.avatar) preview.src = me.user.avatar;
+            if(preview && me.user.avatar) preview.src = avatarSrc(me.user, 128);
             if(mutedEl) mutedEl.textContent = 'Member • Logged in';
           }
         }
@@ -645,7 +675,7 @@ document.addEventListener("DOMContentLoaded", () => {
       const r = await fetch('/api/avatar', { method: 'POST', body: fd, credentials: 'same-origin' });
       const j = await r.json();
       if(!r.ok){ alert('Upload failed: ' + (j.error||JSON.stringify(j))); profileSave.disabled = false; return; }
-      try{ const avatarImg = document.querySelector('.sidebar .profile .avatar'); if(avatarImg && j.user && j.user.avatar) avatarImg.src = j.user.avatar; }catch(e){}
+      try{ const avatarImg = document.querySelector('.sidebar .profile .avatar'); if(avatarImg && j.user && j.user.avatar) avatarImg.src = avatarSrc(j.user, 128); }catch(e){}
       if(profileModal){ profileModal.style.display='none'; profileModal.setAttribute('aria-hidden','true'); }
     }catch(e){ alert('Upload error: ' + e.message); }
     finally{ profileSave.disabled = false; }
@@ -726,11 +756,9 @@ document.addEventListener("DOMContentLoaded", () => {
     appendChatBubble('ken', 'Generating timetable for next ' + num_days + ' days...');
     startSpinner();
     try{
-      const resp = await fetch('/api/generate_timetable', {
-        method: 'POST',
-        headers: {'Content-Type':'application/json'},
-        body: JSON.stringify({daily_hours, num_days})
-      });
+      // GET so the browser revalidates with If-None-Match and reuses unchanged plans (304)
+      const qs = new URLSearchParams({daily_hours: String(daily_hours), num_days: String(num_days)});
+      const resp = await fetch('/api/plan?' + qs.toString(), { credentials: 'same-origin' });
       const data = await resp.json();
       if(!data.ok){
         appendChatBubble('ken', 'Failed to generate timetable: ' + (data.error||JSON.stringify(data)));
@@ -755,8 +783,25 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   }
 
-  // Replace simulated chat with a WebSocket-backed chat (falls back to POST)
+  // Replace simulated chat with a WebSocket-backed chat (falls back to POST).
+  // One socket carries several requests at once: each is sent with an id and
+  // every frame of its reply echoes that id. Frames with a `type` are heartbeats
+  // or server pushes.
   let wsChat = null;
+  let wsReqSeq = 0;
+
+  function onWsControl(ev){
+    let d;
+    try{ d = JSON.parse(ev.data); }catch(_){ return; }
+    if(d.type === 'ping'){ try{ wsChat && wsChat.send(JSON.stringify({type:'pong'})); }catch(_){} return; }
+    if(d.type === 'tasks_changed' && d.task){
+      const t = d.task;
+      const m = {id:t.id,title:t.title,hours:t.hours||1,priority:t.priority||'medium',status:t.status||'pending'};
+      const idx = state.missions.findIndex(x=>String(x.id)===String(t.id));
+      if(idx!==-1) state.missions[idx] = Object.assign(state.missions[idx], m); else state.missions.unshift(m);
+      renderMissionsList(); renderToday(); updateAnalytics();
+    }
+  }
   const API_BASE = (window.__API_BASE__ && String(window.__API_BASE__).trim()) || (location.protocol + '//' + location.host) || 'http://127.0.0.1:8000';
 
   function ensureWs(){
@@ -768,6 +813,7 @@ document.addEventListener("DOMContentLoaded", () => {
         const wsScheme = base.startsWith('https') ? 'wss://' : (base.startsWith('http') ? 'ws://' : (location.protocol === 'https:' ? 'wss://' : 'ws://'));
         const hostPart = base.replace(/^https?:\/\//, '');
         wsChat = new WebSocket(wsScheme + hostPart + '/ws/chat');
+        wsChat.addEventListener('message', onWsControl);
       }catch(e){ wsChat = null; return reject(e); }
       let settled = false;
       const onOpen = ()=>{ if(settled) return; settled = true; cleanup(); resolve(wsChat); };
@@ -831,9 +877,11 @@ document.addEventListener("DOMContentLoaded", () => {
     let partial = '';
     try{
       const ws = await ensureWs();
+      const reqId = 'c' + (++wsReqSeq);
       const onMessage = (ev)=>{
         try{
           const d = JSON.parse(ev.data);
+          if(d.type || (d.id && d.id !== reqId)) return;
           if(d.partial){
             partial += d.partial;
             assistantEl.classList.remove('typing');
@@ -855,7 +903,7 @@ document.addEventListener("DOMContentLoaded", () => {
         }catch(err){ console.warn('ws parse err', err, ev.data); }
       };
       ws.addEventListener('message', onMessage);
-      ws.send(JSON.stringify({message: text}));
+      ws.send(JSON.stringify({id: reqId, message: text}));
     }catch(err){
       try{
         const r = await fetch(API_BASE + '/api/chat', {method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({message: text})});
@@ -927,12 +975,31 @@ document.addEventListener("DOMContentLoaded", () => {
     sp.style.minWidth = Math.max(200, rect.width) + 'px';
   }
 
+  // Server-side full-text search (FTS5); falls back to local title matching if the request fails
+  let searchTimer = null;
+  let searchSeq = 0;
   function showSearchSuggestions(q){
+    clearTimeout(searchTimer);
+    if(!q || q.trim().length < 1){ ensureSearchPopup().style.display='none'; return; }
+    const seq = ++searchSeq;
+    searchTimer = setTimeout(async ()=>{
+      let matches = null;
+      try{
+        const r = await fetch('/api/tasks/search?limit=8&q=' + encodeURIComponent(q.trim()), { credentials: 'same-origin' });
+        if(r.ok){ const j = await r.json(); matches = j.tasks || []; }
+      }catch(e){}
+      if(seq !== searchSeq) return; // a newer keystroke superseded this lookup
+      if(matches === null){
+        const term = q.trim().toLowerCase();
+        matches = state.missions.filter(m => (m.title||'').toLowerCase().includes(term)).slice(0,8);
+      }
+      renderSearchSuggestions(matches);
+    }, 120);
+  }
+
+  function renderSearchSuggestions(matches){
     const sp = ensureSearchPopup();
     sp.innerHTML = '';
-    if(!q || q.trim().length < 1){ sp.style.display='none'; return; }
-    const term = q.trim().toLowerCase();
-    const matches = state.missions.filter(m => (m.title||'').toLowerCase().includes(term)).slice(0,8);
     if(matches.length === 0){ sp.style.display='none'; return; }
     matches.forEach(m=>{
       const r = document.createElement('div');
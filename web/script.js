@@ -392,17 +392,45 @@ function files(index) {
   return data.split("\n")[index];
 }
 
-const frameCount = 300;
+// scripts/build_assets.py packs the frames into WebP sprite sheets and
+// injects window.__ASSETS.frames; without a build we load the raw PNGs.
+const frameAtlas = (window.__ASSETS && window.__ASSETS.frames) || null;
+const frameCount = frameAtlas ? frameAtlas.count : 300;
 
 const images = [];
 const imageSeq = {
   frame: 1,
 };
 
-for (let i = 0; i < frameCount; i++) {
-  const img = new Image();
-  img.src = files(i);
-  images.push(img);
+if (frameAtlas) {
+  frameAtlas.sheets.forEach(function (src) {
+    const img = new Image();
+    img.src = src;
+    images.push(img);
+  });
+} else {
+  for (let i = 0; i < frameCount; i++) {
+    const img = new Image();
+    img.src = files(i);
+    images.push(img);
+  }
+}
+
+// image + source rectangle for a frame (a whole PNG, or one cell of a sheet)
+function frameSource(index) {
+  if (!frameAtlas) {
+    const img = images[index];
+    return { img: img, sx: 0, sy: 0, sw: img.width, sh: img.height };
+  }
+  const perSheet = frameAtlas.cols * frameAtlas.rows;
+  const cell = index % perSheet;
+  return {
+    img: images[Math.floor(index / perSheet)],
+    sx: (cell % frameAtlas.cols) * frameAtlas.width,
+    sy: Math.floor(cell / frameAtlas.cols) * frameAtlas.height,
+    sw: frameAtlas.width,
+    sh: frameAtlas.height,
+  };
 }
 
 if(window.gsap && typeof gsap.to === 'function' && window.ScrollTrigger){
@@ -423,30 +451,31 @@ if(window.gsap && typeof gsap.to === 'function' && window.ScrollTrigger){
   console.warn('Skipping image sequence animation because GSAP/ScrollTrigger not available');
 }
 
-images[1].onload = render;
+images[frameAtlas ? 0 : 1].onload = render;
 
 function render() {
-  scaleImage(images[imageSeq.frame], context);
+  scaleImage(frameSource(imageSeq.frame), context);
 }
 
-function scaleImage(img, ctx) {
+function scaleImage(src, ctx) {
+  if (!src.img || !src.img.complete || !src.sw) return;
   var canvas = ctx.canvas;
-  var hRatio = canvas.width / img.width;
-  var vRatio = canvas.height / img.height;
+  var hRatio = canvas.width / src.sw;
+  var vRatio = canvas.height / src.sh;
   var ratio = Math.max(hRatio, vRatio);
-  var centerShift_x = (canvas.width - img.width * ratio) / 2;
-  var centerShift_y = (canvas.height - img.height * ratio) / 2;
+  var centerShift_x = (canvas.width - src.sw * ratio) / 2;
+  var centerShift_y = (canvas.height - src.sh * ratio) / 2;
   ctx.clearRect(0, 0, canvas.width, canvas.height);
   ctx.drawImage(
-    img,
-    0,
-    0,
-    img.width,
-    img.height,
+    src.img,
+    src.sx,
+    src.sy,
+    src.sw,
+    src.sh,
     centerShift_x,
     centerShift_y,
-    img.width * ratio,
-    img.height * ratio
+    src.sw * ratio,
+    src.sh * ratio
   );
 }
 if(window.gsap && typeof gsap.to === 'function' && window.ScrollTrigger){
@@ -1,15 +1,25 @@
 import os
 import json
 import asyncio
+import hashlib
 from pathlib import Path
-from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, Response, BackgroundTasks
+from fastapi import FastAPI, Request, WebSocket, Response, BackgroundTasks
 from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
+from serialization import fast_json_response_class, JSONCompressionMiddleware
+import appdb
+import static_assets
+import ratelimit
+import metrics
+import tracing
+import wsmanager
+from tools import generate_plan
+from storage import start_archive_compactor
+
 # Try to import agent
 try:
-    from agent import handle_user_message
+    from agent import handle_user_message, needs_llm
     AGENT_AVAILABLE = True
 except Exception as e:
     print(f"Warning: could not import agent.handle_user_message: {e}")
@@ -104,7 +114,13 @@ def load_creds_object(email: str):
         print(f"Warning: failed to load creds for {email}: {e}")
         return None
 
-app = FastAPI()
+app = FastAPI(default_response_class=fast_json_response_class())
+# gzip/brotli for JSON bodies above COMPRESS_MIN_SIZE
+app.add_middleware(JSONCompressionMiddleware)
+# route latency histograms, in-flight requests and WebSocket connection gauges
+app.add_middleware(metrics.ASGIMetricsMiddleware, app_name='fastapi')
+# root span per HTTP request when TRACE_EXPORT is set; WebSocket messages are traced in the handler
+app.add_middleware(tracing.ASGITracingMiddleware)
 
 # Enable CORS for local dev
 app.add_middleware(
@@ -115,15 +131,17 @@ app.add_middleware(
 )
 
 WEB_ROOT = Path(__file__).parent
+# built web/dist when present (scripts/build_assets.py), else web/ itself
+STATIC_ROOT = static_assets.static_root(WEB_ROOT)
 # Serve static assets at /static to avoid catching websocket scopes
-app.mount("/static", StaticFiles(directory=WEB_ROOT), name="static")
+app.mount("/static", static_assets.precompressed_static_files(STATIC_ROOT), name="static")
 
 
 @app.get('/')
 async def root_index():
-    idx = WEB_ROOT / 'index.html'
+    idx = STATIC_ROOT / 'index.html'
     if idx.exists():
-        return FileResponse(idx)
+        return FileResponse(idx, headers={'Cache-Control': static_assets.REVALIDATE_CACHE})
     return HTMLResponse('<h1>Index not found</h1>', status_code=404)
 
 # Path to persisted credentials (email -> serialized credentials json)
@@ -133,21 +151,77 @@ CREDS_PATH = WEB_ROOT / 'credentials.json'
 async def health():
     return {'status': 'ok'}
 
+
+@app.get('/metrics')
+async def metrics_endpoint():
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+def _client_ip(conn):
+    return 'ip:' + (conn.client.host if conn.client else 'unknown')
+
+
+def _client_ident(conn):
+    """Rate-limit and semantic-cache key: the signed-in user, else the client address."""
+    return _session_user(conn) or _client_ip(conn)
+
+
+# The only trusted identity here is app.py's signed Flask session cookie (same
+# SECRET_KEY); ?user= and body fields are whatever the client chose to send.
+SESSION_SECRET = os.environ.get('SECRET_KEY') or 'dev-secret-chronoken'
+SESSION_MAX_AGE = 31 * 86400  # Flask's default PERMANENT_SESSION_LIFETIME
+try:
+    from itsdangerous import URLSafeTimedSerializer
+    from flask.json.tag import TaggedJSONSerializer
+    _SESSION_SERIALIZER = URLSafeTimedSerializer(
+        SESSION_SECRET, salt='cookie-session', serializer=TaggedJSONSerializer(),
+        signer_kwargs={'key_derivation': 'hmac', 'digest_method': hashlib.sha1},
+    )
+except Exception:
+    _SESSION_SERIALIZER = None
+
+
+def _session_user(conn):
+    """Signed-in email from the Flask session cookie, or None (missing, tampered or expired)."""
+    raw = conn.cookies.get('session')
+    if not raw or _SESSION_SERIALIZER is None:
+        return None
+    try:
+        data = _SESSION_SERIALIZER.loads(raw, max_age=SESSION_MAX_AGE)
+    except Exception:
+        return None
+    return data.get('user_email') if isinstance(data, dict) else None
+
+
+async def _take_chat_token(message, ident):
+    """Charge the 'llm' or 'local' bucket for one chat message -> (allowed, retry_after, bucket)."""
+    # needs_llm reads the tasks version from SQLite: keep it off the event loop
+    llm = await tracing.run_in_executor(asyncio.get_running_loop(), needs_llm, message, [], ident)
+    bucket = 'llm' if llm else 'local'
+    allowed, retry_after = await ratelimit.LIMITER.take_async(bucket, ident)
+    return allowed, retry_after, bucket
+
+
 @app.post('/api/chat')
 async def api_chat(req: Request):
     data = await req.json()
     message = data.get('message')
-    user = data.get('user')
     if not message:
         return JSONResponse({'error': 'message required'}, status_code=400)
 
     if not AGENT_AVAILABLE:
         return {'reply': f'(agent missing) Echo: {message}'}
 
+    # body.user is unauthenticated, so it never picks the bucket
+    ident = _client_ident(req)
+    allowed, retry_after, bucket = await _take_chat_token(message, ident)
+    if not allowed:
+        return JSONResponse({'error': 'rate_limited', 'bucket': bucket, 'retry_after': retry_after},
+                            status_code=429, headers={'Retry-After': str(retry_after)})
+
     # Call the agent synchronously in a thread
     try:
         loop = asyncio.get_running_loop()
-        reply = await loop.run_in_executor(None, handle_user_message, message, [])
+        reply = await tracing.run_in_executor(loop, handle_user_message, message, [], ident)
         return {'reply': reply}
     except Exception as e:
         return JSONResponse({'error': str(e)}, status_code=500)
@@ -240,66 +314,195 @@ async def api_send_welcome(req: Request, background_tasks: BackgroundTasks):
         return JSONResponse({'error': str(e)}, status_code=500)
 
 
-    @app.post('/api/generate_timetable')
-    async def api_generate_timetable(req: Request):
-        """Generate a simple timetable/plan using the server-side planner (tools.generate_plan).
-        Accepts JSON: {daily_hours: number, num_days: int}
-        """
-        data = await req.json()
-        try:
-            daily_hours = float(data.get('daily_hours', 3.0))
-        except Exception:
-            daily_hours = 3.0
-        try:
-            num_days = int(data.get('num_days', 7))
-        except Exception:
-            num_days = 7
+# --- Task / plan API (async; SQLite work runs on a bounded DB thread pool) ---
+# Same data/chronoken.db tables as the Flask app (see appdb.py). These REST routes
+# take the user explicitly (?user= / body.user); only pushes, chat rate limits
+# and the /ws/chat identity use the signed session cookie (_session_user).
+DB = appdb.DBPool()
 
-        try:
-            plan = generate_plan(daily_hours=daily_hours, num_days=num_days)
-            return {'ok': True, 'plan': plan}
-        except Exception as e:
-            return JSONResponse({'error': str(e)}, status_code=500)
 
-# Simple WebSocket chat endpoint that replies with a single reply per incoming message
-@app.websocket('/ws/chat')
-async def websocket_chat(ws: WebSocket):
-    await ws.accept()
+@app.on_event('startup')
+async def _init_app_db():
+    await DB.run(appdb.init_schema)
+    # also covers asgi.py, whose lifespan events come here; once per process
+    start_archive_compactor(extra_jobs=[appdb.compact_archive])
+
+
+def _paging(params, default_limit, max_limit):
     try:
-        while True:
-            raw = await ws.receive_text()
-            try:
-                payload = json.loads(raw)
-            except Exception:
-                payload = {'message': raw}
+        limit = max(1, min(int(params.get('limit', default_limit)), max_limit))
+        offset = max(0, int(params.get('offset', 0)))
+    except (TypeError, ValueError):
+        return None
+    return limit, offset
+
+
+@app.get('/api/tasks')
+async def api_list_tasks(request: Request):
+    """GET /api/tasks?user=EMAIL[&archived=1&limit=&offset=] -> {tasks}"""
+    q = request.query_params
+    user = q.get('user')
+    if not user:
+        return {'tasks': []}
+    paging = _paging(q, 100, 1000)
+    if paging is None:
+        return JSONResponse({'error': 'invalid_paging'}, status_code=400)
+    archived = q.get('archived') in ('1', 'true', 'yes')
+    tasks = await DB.run(appdb.list_user_tasks, user, archived=archived, limit=paging[0], offset=paging[1])
+    return {'tasks': tasks}
+
+
+@app.post('/api/tasks')
+async def api_create_task(req: Request):
+    """POST {user, title, detail, priority, hours, deadline?} -> {task}"""
+    body = await req.json()
+    try:
+        hours = float(body.get('hours') or 1)
+    except Exception:
+        hours = 1
+    task = await DB.run(
+        appdb.create_user_task,
+        body.get('user') or 'guest',
+        title=body.get('title') or body.get('message') or 'Untitled',
+        detail=body.get('detail') or '',
+        priority=body.get('priority') or 'medium',
+        hours=hours,
+        deadline=body.get('deadline') or None,
+    )
+    # let the user's other open tabs refresh without polling
+    wsmanager.notify(task['user_email'], {'type': 'tasks_changed', 'task': task})
+    return {'task': task}
+
+
+@app.api_route('/api/tasks/{task_id:int}', methods=['PUT', 'PATCH'])
+async def api_update_task(task_id: int, req: Request):
+    """Update title, detail, priority, hours, status, deadline -> {task} or 404."""
+    body = await req.json()
+    updates = {k: body[k] for k in appdb.TASK_FIELDS if k in body}
+    if not updates:
+        return JSONResponse({'error': 'no_fields'}, status_code=400)
+    try:
+        task = await DB.run(appdb.update_user_task, task_id, updates)
+    except Exception as e:
+        return JSONResponse({'error': 'update_failed', 'detail': str(e)}, status_code=500)
+    if not task:
+        return JSONResponse({'error': 'not_found'}, status_code=404)
+    wsmanager.notify(task['user_email'], {'type': 'tasks_changed', 'task': task})
+    return {'task': task}
+
+
+@app.get('/api/tasks/search')
+async def api_search_tasks(request: Request):
+    """GET /api/tasks/search?user=EMAIL&q=dbms[&limit=&offset=] -> {tasks, has_more}"""
+    q = request.query_params
+    user = q.get('user')
+    if not user:
+        return {'tasks': [], 'has_more': False}
+    paging = _paging(q, 20, 100)
+    if paging is None:
+        return JSONResponse({'error': 'invalid_paging'}, status_code=400)
+    tasks, has_more = await DB.run(appdb.search_user_tasks, user, q.get('q'), paging[0], paging[1])
+    return {'tasks': tasks, 'has_more': has_more}
+
+
+@app.get('/api/stats')
+async def api_stats(request: Request):
+    """GET /api/stats?user=EMAIL -> {stats} from the task_stats aggregates."""
+    user = request.query_params.get('user')
+    if not user:
+        return {'stats': None}
+    from datetime import date
+    stats = await DB.run(appdb.read_task_stats, user, date.today().isoformat())
+    return {'stats': stats}
+
+
+def _plan_params(params):
+    try:
+        daily_hours = float(params.get('daily_hours', 3.0))
+    except Exception:
+        daily_hours = 3.0
+    try:
+        num_days = int(params.get('num_days', 7))
+    except Exception:
+        num_days = 7
+    return daily_hours, num_days
 
-            message = payload.get('message')
-            if not message:
-                await ws.send_text(json.dumps({'error':'message required'}))
-                continue
 
-            if not AGENT_AVAILABLE:
-                await ws.send_text(json.dumps({'reply': f'(agent missing) Echo: {message}'}))
-                continue
+@app.get('/api/plan')
+async def api_plan(request: Request):
+    """GET /api/plan?daily_hours=3&num_days=7 -> {ok, plan} from tools.generate_plan."""
+    daily_hours, num_days = _plan_params(request.query_params)
+    try:
+        plan = await DB.call(generate_plan, daily_hours=daily_hours, num_days=num_days)
+        return {'ok': True, 'plan': plan}
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
 
-            # call agent in thread so we don't block the event loop
-            loop = asyncio.get_running_loop()
-            try:
-                # run the full reply in a thread then stream it in chunks to simulate streaming
-                reply = await loop.run_in_executor(None, handle_user_message, message, [])
-                # stream in small chunks to give frontend a progressive feel
-                chunk_size = 60
-                for i in range(0, len(reply), chunk_size):
-                    part = reply[i:i+chunk_size]
-                    await ws.send_text(json.dumps({'partial': part}))
-                    await asyncio.sleep(0.02)
-                # final marker
-                await ws.send_text(json.dumps({'reply': reply}))
-            except Exception as e:
-                await ws.send_text(json.dumps({'error': str(e)}))
-    except WebSocketDisconnect:
+
+@app.post('/api/generate_timetable')
+async def api_generate_timetable(req: Request):
+    """Generate a simple timetable/plan using the server-side planner (tools.generate_plan).
+    Accepts JSON: {daily_hours: number, num_days: int}
+    """
+    data = await req.json()
+    daily_hours, num_days = _plan_params(data)
+    try:
+        # the planner reads SQLite synchronously; keep it off the event loop
+        plan = await DB.call(generate_plan, daily_hours=daily_hours, num_days=num_days)
+        return {'ok': True, 'plan': plan}
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def _ws_chat_request(conn, rid, payload):
+    """One chat request on a /ws/chat socket: partial frames, then a final reply or error, all tagged with `rid`."""
+    message = payload.get('message')
+    if not message:
+        await conn.send({'id': rid, 'error': 'message required'})
+        return
+
+    if not AGENT_AVAILABLE:
+        await conn.send({'id': rid, 'reply': f'(agent missing) Echo: {message}'})
+        return
+
+    ident = conn.user or _client_ip(conn.ws)
+    allowed, retry_after, bucket = await _take_chat_token(message, ident)
+    if not allowed:
+        await conn.send({'id': rid, 'error': 'rate_limited', 'bucket': bucket, 'retry_after': retry_after})
         return
 
+    # call agent in thread so we don't block the event loop
+    loop = asyncio.get_running_loop()
+    # one trace per message; clients may pass their own trace_id to correlate
+    with tracing.span('ws /ws/chat message', trace_id=tracing.normalize_trace_id(payload.get('trace_id')), request_id=rid) as sp:
+        trace = {'trace_id': sp.trace_id} if sp else {}
+        try:
+            # run the full reply in a thread then stream it in chunks to simulate streaming
+            reply = await tracing.run_in_executor(loop, handle_user_message, message, [], ident)
+            # stream in small chunks to give frontend a progressive feel
+            chunk_size = 60
+            for i in range(0, len(reply), chunk_size):
+                if not await conn.send({'id': rid, 'partial': reply[i:i+chunk_size]}):
+                    return
+                await asyncio.sleep(0.02)
+            # final marker
+            await conn.send({'id': rid, 'reply': reply, **trace})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await conn.send({'id': rid, 'error': str(e), **trace})
+
+
+# Multiplexed chat socket: each {id, message} runs concurrently (up to WS_MAX_INFLIGHT
+# per socket) and every frame it produces carries that id. See wsmanager.py for the protocol.
+WS_MANAGER = wsmanager.ConnectionManager(_ws_chat_request)
+
+
+@app.websocket('/ws/chat')
+async def websocket_chat(ws: WebSocket):
+    # push frames (tasks_changed) go to the signed-in user only; anonymous sockets get none
+    await WS_MANAGER.serve(ws, user=_session_user(ws))
+
 
 # --- Google OAuth endpoints (server-side) ---
 def get_client_secrets_path():
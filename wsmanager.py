@@ -0,0 +1,264 @@
+# wsmanager.py - WebSocket connection manager for /ws/chat
+#
+# Protocol (JSON text frames):
+#   client -> {"id": "c1", "message": "...", "trace_id"?}            a chat request
+#             {"type": "cancel", "id": "c1"}                          stop streaming a request
+#             {"type": "ping"} / {"type": "pong"}
+#   server -> {"id": "c1", "partial": "..."} ... {"id": "c1", "reply": "..."} | {"id": "c1", "error": "..."}
+#             {"type": "ping", "ts": ...}                             heartbeat; answer with pong
+#             {"type": "...", ...}                                    server push (push/broadcast)
+# Requests without an id get one assigned by the server and echoed back.
+# Pushes go by Connection.user, which the server sets from an authenticated
+# identity at accept time; nothing the client sends can change it.
+#
+# Each socket runs up to WS_MAX_INFLIGHT requests concurrently. All frames go
+# through a bounded per-connection send queue drained by one writer task, so a
+# slow client applies backpressure to its own requests (and is dropped after
+# WS_SEND_TIMEOUT) without stalling anyone else.
+import asyncio
+import itertools
+import json
+import os
+import time
+import weakref
+
+import metrics
+from serialization import dumps
+
+WS_MAX_CONNECTIONS = int(os.getenv('WS_MAX_CONNECTIONS', '500'))
+WS_MAX_INFLIGHT = int(os.getenv('WS_MAX_INFLIGHT', '4'))
+WS_SEND_QUEUE = int(os.getenv('WS_SEND_QUEUE', '256'))
+WS_SEND_TIMEOUT = float(os.getenv('WS_SEND_TIMEOUT', '10'))
+WS_HEARTBEAT_INTERVAL = float(os.getenv('WS_HEARTBEAT_INTERVAL', '25'))
+WS_IDLE_TIMEOUT = float(os.getenv('WS_IDLE_TIMEOUT', '120'))
+MAX_FRAME_CHARS = 64 * 1024
+
+# close codes
+CLOSE_GOING_AWAY = 1001
+CLOSE_POLICY = 1008
+CLOSE_TRY_AGAIN = 1013
+
+_CLOSE = object()
+
+
+class Connection:
+    _ids = itertools.count(1)
+
+    def __init__(self, ws, user=None, max_inflight=WS_MAX_INFLIGHT, queue_size=WS_SEND_QUEUE):
+        self.ws = ws
+        self.user = user
+        self.conn_id = next(self._ids)
+        self.max_inflight = max_inflight
+        self.inflight = {}
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._req_ids = itertools.count(1)
+
+    def next_request_id(self):
+        return f's{next(self._req_ids)}'
+
+    async def send(self, payload):
+        """Queue a frame, waiting while the queue is full; False once the connection is gone."""
+        if self.closed:
+            return False
+        try:
+            await asyncio.wait_for(self._queue.put(payload), WS_SEND_TIMEOUT)
+            return True
+        except asyncio.TimeoutError:
+            # the client stopped reading: drop it rather than buffer without bound
+            metrics.WS_REJECTED.inc(reason='backpressure')
+            await self.close(CLOSE_POLICY, 'send queue full')
+            return False
+
+    def send_nowait(self, payload):
+        """Best-effort frame (heartbeats, pushes): dropped if the queue is full."""
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def writer(self):
+        while True:
+            payload = await self._queue.get()
+            if payload is _CLOSE:
+                return
+            await self.ws.send_text(payload if isinstance(payload, str) else dumps(payload))
+
+    async def heartbeat(self, interval=WS_HEARTBEAT_INTERVAL, idle_timeout=WS_IDLE_TIMEOUT):
+        while not self.closed:
+            await asyncio.sleep(interval)
+            if time.monotonic() - self.last_seen > idle_timeout:
+                metrics.WS_REJECTED.inc(reason='idle')
+                await self.close(CLOSE_GOING_AWAY, 'idle timeout')
+                return
+            self.send_nowait({'type': 'ping', 'ts': int(time.time() * 1000)})
+
+    def cancel(self, request_id):
+        task = self.inflight.pop(request_id, None)
+        if task is not None:
+            task.cancel()
+            return True
+        return False
+
+    async def close(self, code=1000, reason=''):
+        if self.closed:
+            return
+        self.closed = True
+        for task in list(self.inflight.values()):
+            task.cancel()
+        self.inflight.clear()
+        try:
+            self._queue.put_nowait(_CLOSE)
+        except asyncio.QueueFull:
+            pass
+        try:
+            await self.ws.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+
+class ConnectionManager:
+    """
+    Accepts sockets up to `max_connections` and dispatches each chat request to
+    `handler(conn, request_id, payload)` as its own task.
+    """
+
+    def __init__(self, handler, max_connections=WS_MAX_CONNECTIONS, max_inflight=WS_MAX_INFLIGHT):
+        self.handler = handler
+        self.max_connections = max_connections
+        self.max_inflight = max_inflight
+        self.connections = {}
+        self.rejected = 0
+        self.loop = None
+        _MANAGERS.add(self)
+
+    def by_user(self, user):
+        return [c for c in self.connections.values() if user is not None and c.user == user]
+
+    async def push(self, user, payload):
+        """Server push to every socket of `user`; returns how many accepted the frame."""
+        return sum(c.send_nowait(payload) for c in self.by_user(user))
+
+    def push_threadsafe(self, user, payload):
+        """push() from any thread (e.g. a WSGI worker); scheduled on the loop serving the sockets."""
+        loop = self.loop
+        if loop is None or loop.is_closed() or not self.by_user(user):
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            for c in self.by_user(user):
+                c.send_nowait(payload)
+        else:
+            loop.call_soon_threadsafe(lambda: [c.send_nowait(payload) for c in self.by_user(user)])
+
+    async def broadcast(self, payload):
+        return sum(c.send_nowait(payload) for c in list(self.connections.values()))
+
+    def stats(self):
+        return {
+            'connections': len(self.connections),
+            'inflight': sum(len(c.inflight) for c in self.connections.values()),
+            'rejected': self.rejected,
+        }
+
+    async def serve(self, ws, user=None):
+        self.loop = asyncio.get_running_loop()
+        await ws.accept()
+        if len(self.connections) >= self.max_connections:
+            self.rejected += 1
+            metrics.WS_REJECTED.inc(reason='capacity')
+            await ws.close(code=CLOSE_TRY_AGAIN, reason='server busy')
+            return
+        conn = Connection(ws, user=user, max_inflight=self.max_inflight)
+        self.connections[conn.conn_id] = conn
+        writer = asyncio.create_task(conn.writer())
+        heartbeat = asyncio.create_task(conn.heartbeat())
+        try:
+            await self._receive_loop(conn)
+        except Exception:
+            # WebSocketDisconnect or a transport error: just tear down
+            pass
+        finally:
+            await conn.close()
+            heartbeat.cancel()
+            self.connections.pop(conn.conn_id, None)
+            try:
+                await asyncio.wait_for(writer, 1)
+            except Exception:
+                writer.cancel()
+
+    async def _receive_loop(self, conn):
+        while not conn.closed:
+            message = await conn.ws.receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            raw = message.get('text')
+            if raw is None and message.get('bytes') is not None:
+                raw = message['bytes'].decode('utf-8', 'replace')
+            conn.last_seen = time.monotonic()
+            if raw is None:
+                continue
+            if len(raw) > MAX_FRAME_CHARS:
+                await conn.send({'error': 'frame too large'})
+                continue
+            try:
+                payload = json.loads(raw)
+            except Exception:
+                payload = {'message': raw}
+            if not isinstance(payload, dict):
+                payload = {'message': str(payload)}
+
+            kind = payload.get('type')
+            if kind == 'ping':
+                conn.send_nowait({'type': 'pong', 'ts': int(time.time() * 1000)})
+                continue
+            if kind == 'pong':
+                continue
+            if kind == 'cancel':
+                rid = str(payload.get('id') or '')
+                if conn.cancel(rid):
+                    await conn.send({'id': rid, 'error': 'cancelled'})
+                continue
+
+            rid = str(payload.get('id') or conn.next_request_id())
+            if rid in conn.inflight:
+                await conn.send({'id': rid, 'error': 'duplicate request id'})
+                continue
+            if len(conn.inflight) >= conn.max_inflight:
+                metrics.WS_REJECTED.inc(reason='inflight')
+                await conn.send({'id': rid, 'error': 'too many requests in flight', 'limit': conn.max_inflight})
+                continue
+            task = asyncio.create_task(self._run(conn, rid, payload))
+            conn.inflight[rid] = task
+
+    async def _run(self, conn, rid, payload):
+        metrics.WS_INFLIGHT.inc()
+        try:
+            await self.handler(conn, rid, payload)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            await conn.send({'id': rid, 'error': str(e)})
+        finally:
+            metrics.WS_INFLIGHT.dec()
+            conn.inflight.pop(rid, None)
+
+
+# every manager in this process, so code without a handle on one (app.py's
+# Flask routes under asgi.py) can still reach connected sockets
+_MANAGERS = weakref.WeakSet()
+
+
+def notify(user, payload):
+    """Push `payload` to `user`'s sockets on every manager in this process; safe from any thread."""
+    if not user:
+        return
+    for manager in list(_MANAGERS):
+        manager.push_threadsafe(user, payload)